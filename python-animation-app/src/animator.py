@@ -1,29 +1,206 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import os
+import queue
+import threading
+
+import numpy as np
+
+from compositor import Compositor
+from effects import DEFAULT_FPS, backdrop_for, to_array
+from ingest import load_source
+from recorder import open_writer
+from timeline import Timeline
+
+
+# Size of the frames an animation is rendered at, (width, height)
+DEFAULT_SIZE = (1280, 720)
+
+# Frame buffers shared by the render and encode stages; rendering waits
+# for a free one, so no more frames than this exist however long the
+# animation
+DEFAULT_FRAMES_IN_FLIGHT = 4
+
+# Images decoded ahead of the one being animated
+_LOAD_AHEAD = 2
+
+# Size the first image is loaded at to pick a GIF's colours from
+_PALETTE_SIZE = (256, 256)
+
+
 class Animator:
-    def __init__(self):
-        self.animations = []
+    """Turns a list of images and effects into an animation, streamed to a file
+
+    Each step is a clip on a Timeline: it shows an image with an effect
+    for its duration, then holds the last frame for its delay, and clips
+    added with a start time or a layer can overlap, the higher layers
+    drawn over the lower. Any moment can be drawn on its own with
+    render_frame(), since the timeline finds the clips showing at a time
+    and each effect computes its parameters for one frame directly. The
+    clips are stacked by a Compositor, which keeps the frame drawn last
+    and redraws only the parts whose clips moved or changed.
+
+    render_animation() runs the whole timeline as a pipeline: images are
+    loaded (fitted to their box, decoded small) a couple ahead on a
+    thread, each frame is composited and copied into one of a fixed set
+    of frame buffers, and an encoder thread streams the buffers to the
+    output and hands them back. When the encoder falls behind, rendering
+    waits for a buffer, so memory stays at DEFAULT_FRAMES_IN_FLIGHT frames
+    whatever the length of the animation. Holds cost nothing to render: a
+    frame no different from the one before is skipped, and the writer just
+    shows that one longer.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, fps=DEFAULT_FPS, background="white",
+                 frames_in_flight=DEFAULT_FRAMES_IN_FLIGHT):
+        self.timeline = Timeline()
+        self.size = size
+        self.fps = fps
+        self.background = background
+        self.frames_in_flight = frames_in_flight
+        self.blank = backdrop_for(np.empty((1, 1, 3), np.uint8), size, background)
+        self.compositor = Compositor(size, background)
 
     def create_animation(self, images, effects, durations, delays):
+        """Add a step per image path; durations and delays are lists or one value for all"""
         for i in range(len(images)):
-            animation_step = {
-                'image': images[i],
-                'effect': effects[i] if i < len(effects) else None,
-                'duration': durations[i] if i < len(durations) else None,
-                'delay': delays[i] if i < len(delays) else None
-            }
-            self.animations.append(animation_step)
-
-    def apply_effects(self):
-        for step in self.animations:
-            if step['effect']:
-                # Apply the effect to the image (pseudo-code)
-                step['image'] = step['effect'].apply(step['image'])
-
-    def render_animation(self):
-        # Render the animation (pseudo-code)
-        for step in self.animations:
-            # Display or save the image with the applied effect
-            self.display_image(step['image'], step['duration'], step['delay'])
-
-    def display_image(self, image, duration, delay):
-        # Logic to display the image for a certain duration with a delay
-        pass
\ No newline at end of file
+            self.timeline.add(images[i], _nth(durations, i), _nth(delays, i),
+                              effects[i] if i < len(effects) else None)
+
+    def render_frame(self, t, out=None, sources=None):
+        """Draw the animation as it is t seconds in, into out (a new array by default)
+
+        sources maps clip ids to their loaded images (or futures of them);
+        clips missing from it are loaded if the compositor hasn't got them.
+        """
+        layers = []
+        for clip in self.timeline.at(t):
+            centre = None
+            if clip.position is not None:
+                centre = (clip.position[0] + clip.size[0] / 2, clip.position[1] + clip.size[1] / 2)
+            layers.append((clip.index, partial(self._source, clip, sources),
+                           clip.params(t, self.fps), centre))
+        self.compositor.compose(layers)
+        if out is None:
+            return self.compositor.frame.copy()
+        out[...] = self.compositor.frame
+        return out
+
+    def frames(self, buffers=None):
+        """Lazily yield (frame_index, frame) for the whole animation
+
+        Frame indices skip over frames identical to the one before (holds),
+        which stays on screen until the next index. Each frame is drawn
+        into a buffer taken from the buffers queue when one is given
+        (blocking until one is free), or into a new array.
+        """
+        order = self.timeline.starting_order()
+        loads = {}
+        submitted = 0
+        last = None
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            for index in range(self.total_frames()):
+                # Sample the middle of the frame, clear of clip boundaries
+                t = (index + 0.5) / self.fps
+                clips = self.timeline.at(t)
+                state = tuple((clip.index, clip.frame(t, self.fps)[0]) for clip in clips)
+                if state == last:
+                    continue
+                last = state
+
+                # Keep the images of the clips showing and the next few to start
+                wanted = min(len(self.timeline.started(t)) + _LOAD_AHEAD, len(order))
+                for clip_id in order[submitted:wanted]:
+                    loads[int(clip_id)] = pool.submit(self._load, self.timeline[clip_id])
+                submitted = max(submitted, wanted)
+                for clip_id in [i for i in loads if self.timeline[i].end <= t]:
+                    del loads[clip_id]
+
+                frame = buffers.get() if buffers is not None else np.empty_like(self.blank)
+                self.render_frame(t, frame, loads)
+                yield index, frame
+
+    def total_frames(self):
+        """Length of the animation in frames, holds included"""
+        return int(round(self.timeline.end * self.fps))
+
+    def render_animation(self, output_path):
+        """Render the timeline to output_path (.gif, or a video format) and return the frame count"""
+        width, height = self.size
+        palette_image = None
+        if len(self.timeline) and os.path.splitext(output_path)[1].lower() == ".gif":
+            first = self.timeline[self.timeline.starting_order()[0]]
+            palette_image = load_source(first.image, *_PALETTE_SIZE)
+        buffers = queue.Queue()
+        for _ in range(self.frames_in_flight):
+            buffers.put(np.empty((height, width, 3), dtype=np.uint8))
+
+        encoder = _Encoder(open_writer(output_path, self.blank, self.fps, palette_image),
+                           self.fps, buffers, self.frames_in_flight)
+        try:
+            for index, frame in self.frames(buffers):
+                encoder.put(index, frame)
+        finally:
+            encoder.finish(self.total_frames())
+        return self.total_frames()
+
+    def _source(self, clip, sources):
+        """The clip's image from sources (waiting for it if still loading), or loaded now"""
+        image = sources.get(clip.index) if sources is not None else None
+        if image is None:
+            return self._load(clip)
+        return image if isinstance(image, np.ndarray) else image.result()
+
+    def _load(self, clip):
+        """The clip's image fitted to its box, or to the frame"""
+        width, height = clip.size if clip.size is not None else self.size
+        return to_array(load_source(clip.image, width, height))
+
+
+class _Encoder:
+    """The encode stage: a thread writing queued frames and recycling their buffers"""
+
+    def __init__(self, writer, fps, buffers, limit):
+        self.writer = writer
+        self.fps = fps
+        self.buffers = buffers
+        self.ready = queue.Queue(maxsize=limit)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, index, frame):
+        """Queue frame to be shown from frame index on"""
+        if self.error is not None:
+            raise self.error
+        self.ready.put((index, frame))
+
+    def finish(self, length):
+        """Close the output at frame length and wait for the thread"""
+        self.ready.put((length, None))
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        while True:
+            index, frame = self.ready.get()
+            try:
+                if self.error is None:
+                    if frame is None:
+                        self.writer.close(index / self.fps)
+                    else:
+                        box = (0, 0, frame.shape[1], frame.shape[0])
+                        self.writer.write(index / self.fps, box, frame)
+            except Exception as error:
+                self.error = error
+            if frame is None:
+                return
+            self.buffers.put(frame)
+
+
+def _nth(values, i):
+    """values[i] for a list (None past its end), or values itself for a single value"""
+    if isinstance(values, (list, tuple)):
+        return values[i] if i < len(values) else None
+    return values
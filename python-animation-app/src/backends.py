@@ -0,0 +1,173 @@
+import time
+
+import cv2
+import numpy as np
+
+from raster import rasterize, strokes_box
+from strokes import DISC, ELLIPSE, LINE, POLYGON
+
+
+class PillowBackend:
+    """Pixels exactly as ImageDraw draws them
+
+    Thin lines and discs go through the vectorized NumPy kernels, which
+    reproduce ImageDraw's output; other strokes are drawn with ImageDraw
+    itself. This is the reference look of every style. It can't
+    anti-alias.
+    """
+    name = "pil"
+    antialiases = False
+
+    def rasterize(self, canvas, strokes, part):
+        """Draw strokes[part] onto canvas; returns the touched box or None"""
+        return rasterize(canvas, strokes, part)
+
+
+class OpenCVBackend:
+    """Draws every stroke with OpenCV straight onto the canvas array
+
+    cv2.line, polylines, fillPoly, circle and ellipse write directly into
+    the contiguous uint8 canvas, with optional anti-aliasing. Shapes differ
+    from ImageDraw's by a pixel here and there.
+    """
+    name = "opencv"
+    antialiases = True
+
+    def __init__(self, antialias=False):
+        self.antialias = antialias
+        self.line_type = cv2.LINE_AA if antialias else cv2.LINE_8
+
+    def rasterize(self, canvas, strokes, part):
+        """Draw strokes[part] onto canvas; returns the touched box or None"""
+        if part.stop <= part.start:
+            return None
+        box = strokes_box(canvas, strokes, part, extra=2 if self.antialias else 1)
+        if box is None:
+            return None
+
+        line_type = self.line_type
+        points = strokes.points
+        for kind, start, count, color, size in zip(strokes.kinds[part].tolist(),
+                                                   strokes.starts[part].tolist(),
+                                                   strokes.counts[part].tolist(),
+                                                   strokes.colors[part].tolist(),
+                                                   strokes.widths[part].tolist()):
+            shape = points[start:start + count]
+            # cv2 thickness t paints about 2t - 1 pixels across, where
+            # ImageDraw width w paints about w - 1; match them roughly
+            thickness = max(1, (size + 1) // 2)
+            if kind == LINE:
+                if count == 2:
+                    (x0, y0), (x1, y1) = shape.tolist()
+                    cv2.line(canvas, (x0, y0), (x1, y1), color, thickness, line_type)
+                else:
+                    cv2.polylines(canvas, [shape], False, color, thickness, line_type)
+            elif kind == POLYGON:
+                cv2.fillPoly(canvas, [shape], color, line_type)
+            elif kind == DISC:
+                x, y = shape[0].tolist()
+                cv2.circle(canvas, (x, y), size, color, -1, line_type)
+            elif kind == ELLIPSE:
+                (x0, y0), (x1, y1) = shape.tolist()
+                cv2.ellipse(canvas, ((x0 + x1) // 2, (y0 + y1) // 2),
+                            ((x1 - x0) // 2, (y1 - y0) // 2), 0, 0, 360,
+                            color, thickness, line_type)
+        return box
+
+
+BACKENDS = {
+    "pil": PillowBackend,
+    "opencv": OpenCVBackend,
+}
+
+# Backend picked by benchmark_style, per (style, antialias)
+_fastest = {}
+
+
+def benchmark_image(width=400, height=300, seed=0):
+    """Synthetic test picture with smooth shading, edges and some texture"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.empty((height, width, 3), dtype=np.float32)
+    img[..., 0] = 128 + 100 * np.sin(x / 37.0)
+    img[..., 1] = 128 + 100 * np.cos(y / 23.0)
+    img[..., 2] = 255 * x / width
+    for _ in range(12):
+        cx, cy, r = rng.integers(0, width), rng.integers(0, height), rng.integers(10, 60)
+        img[(x - cx) ** 2 + (y - cy) ** 2 < r * r] = rng.integers(0, 256, size=3)
+    img += rng.normal(0, 8, size=img.shape)
+    return Image.fromarray(np.clip(img, 0, 255).astype(np.uint8))
+
+
+def candidates(antialias=False):
+    """Names of the backends that can draw with antialias as asked"""
+    return [name for name, backend in BACKENDS.items() if backend.antialiases or not antialias]
+
+
+def benchmark_style(style, detail=0.5, antialias=False, repeats=3, source=None):
+    """Time the candidate backends on one style; returns {name: best seconds}
+
+    The style's strokes are built once, with a private preprocessing
+    cache so the shared one keeps the user's images, and only
+    rasterizing them onto a fresh canvas is timed for each backend.
+    """
+    from engine import DrawingEngine
+    from preprocess import PreprocessCache
+
+    if source is None:
+        source = benchmark_image()
+    width, height = source.size
+    engine = DrawingEngine(width, height, seed=0, preprocess_cache=PreprocessCache())
+    engine.render(source, style, detail)
+    strokes = engine.strokes()
+    blank = np.full((height, width, 3), 255, dtype=np.uint8)
+    everything = slice(0, len(strokes) if strokes is not None else 0)
+
+    timings = {}
+    for name in candidates(antialias):
+        backend = get_backend(name, antialias=antialias)
+        best = None
+        for _ in range(repeats):
+            canvas = blank.copy()
+            start = time.perf_counter()
+            if strokes is not None:
+                backend.rasterize(canvas, strokes, everything)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+
+def fastest_backend(style, antialias=False):
+    """Name of the quickest backend for style, benchmarked once per process
+
+    With antialias, only backends that can anti-alias are considered.
+    """
+    key = (style, antialias)
+    if key not in _fastest:
+        timings = benchmark_style(style, antialias=antialias)
+        _fastest[key] = min(timings, key=timings.get)
+    return _fastest[key]
+
+
+def get_backend(name, style=None, antialias=False):
+    """Backend instance by name; "auto" benchmarks and picks one for style"""
+    if name == "auto":
+        name = fastest_backend(style, antialias)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown rasterization backend: {name}")
+    if name == "opencv":
+        return OpenCVBackend(antialias)
+    return BACKENDS[name]()
+
+
+if __name__ == "__main__":
+    from engine import STYLES
+
+    source = benchmark_image()
+    for style in STYLES:
+        timings = benchmark_style(style, source=source)
+        cells = "  ".join(f"{name} {seconds * 1000:7.1f} ms" for name, seconds in timings.items())
+        print(f"{style:12s} {cells}  -> {min(timings, key=timings.get)}")
@@ -0,0 +1,334 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from itertools import groupby
+
+import numpy as np
+from PIL import Image
+
+from backends import BACKENDS
+from checkpoint import Checkpoint, Checkpointer
+from ordering import ORDERS
+from plotter import PLOT_FORMATS, export_plot
+from engine import DrawingEngine, STYLES
+from ingest import DEFAULT_THUMBNAIL_DIR, ThumbnailCache, load_source, prefetch_sources
+from preprocess import content_key
+from result_cache import (DEFAULT_CACHE_BYTES, DEFAULT_CACHE_DIR, ResultCache,
+                          engine_result_key, result_key)
+from tiles import TILE_FORMATS, render_tiled
+from utils import ensure_directory_exists, validate_image_file
+
+
+# Same canvas the GUI draws on (800 x 600 window, bottom half)
+DEFAULT_WIDTH = 800
+DEFAULT_HEIGHT = 300
+
+
+def collect_images(source):
+    """Return image paths from a directory or a manifest file (one path per line)"""
+    if os.path.isdir(source):
+        names = sorted(os.listdir(source))
+        return [os.path.join(source, name) for name in names
+                if validate_image_file(name)]
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source) as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            # Relative manifest entries are resolved against the manifest itself
+            paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return paths
+
+
+def render_job(job):
+    """Render one image headlessly; runs inside a worker process
+
+    The source comes fitted in job["source"] when the caller loaded it
+    ahead, and is loaded here otherwise. With a result cache, a drawing
+    made before with the same source, settings and seed is read back
+    instead of drawn again.
+    """
+    start = time.perf_counter()
+    source = job.get("source")
+    if source is None:
+        source = load_source(job["input"], job["width"], job["height"])
+
+    cache = None
+    hit = None
+    if job["cache_dir"] and job["backend"] != "auto":
+        cache = ResultCache(job["cache_dir"], job["cache_bytes"])
+        key = result_key(content_key(np.asarray(source)), job["style"], job["detail"],
+                         job["seed"], job["width"], job["height"], backend=job["backend"],
+                         antialias=job["antialias"], order=job["order"])
+        hit = cache.get(key, with_strokes=bool(job["plot"]))
+        if hit is not None and job["plot"] and hit[2] is None:
+            hit = None  # plotting needs the strokes, which weren't cached
+
+    travel = None
+    resumed = False
+    if hit is not None:
+        pixels, total_steps, strokes = hit
+        Image.fromarray(pixels).save(job["output"])
+    else:
+        checkpointer = resume = None
+        if job["checkpoint"]:
+            # Pick up a killed run of this job, and checkpoint this one
+            checkpoint_path = job["output"] + ".checkpoint.npz"
+            checkpointer = Checkpointer(checkpoint_path, job["checkpoint"])
+            resume = Checkpoint.load(checkpoint_path)
+        engine = DrawingEngine(job["width"], job["height"], seed=job["seed"],
+                               backend=job["backend"], antialias=job["antialias"],
+                               order=job["order"], checkpointer=checkpointer)
+        total_steps = engine.render(source, job["style"], job["detail"], resume=resume)
+        resumed = engine.resumed
+        engine.image.save(job["output"])
+        if job["cache_dir"]:
+            cache = cache or ResultCache(job["cache_dir"], job["cache_bytes"])
+            cache.put(engine_result_key(engine, job["style"], job["detail"]), engine.pixels,
+                      total_steps, engine.strokes() if job["cache_strokes"] or job["plot"] else None)
+        strokes = engine.strokes() if job["plot"] else None
+
+    if job["plot"]:
+        travel = export_plot(strokes, os.path.splitext(job["output"])[0], job["plot"],
+                             job["width"], job["height"], job["plot_seconds"])
+
+    elapsed = time.perf_counter() - start
+    return {
+        "input": job["input"],
+        "output": job["output"],
+        "steps": total_steps,
+        "seconds": elapsed,
+        "cached": hit is not None,
+        "travel": travel,
+        "resumed": resumed,
+    }
+
+
+def render_image(group):
+    """Render every style of one image in turn; runs inside a worker process
+
+    group holds the image's jobs, in style order. Keeping them on one
+    worker lets the styles share the source and that worker's
+    PREPROCESS_CACHE, so the grey levels, blurs and edge maps the styles
+    have in common are computed once per image rather than once per job.
+    A style that fails is reported in its result ("error") and the rest
+    still run.
+    """
+    source = group[0].get("source")
+    if source is None:
+        source = load_source(group[0]["input"], group[0]["width"], group[0]["height"])
+    results = []
+    for job in group:
+        try:
+            results.append(render_job(dict(job, source=source)))
+        except Exception as e:
+            results.append({"input": job["input"], "output": job["output"], "error": str(e)})
+    return results
+
+
+def render_tiled_job(job, executor):
+    """Render one image at full resolution, spreading its tiles over executor"""
+    start = time.perf_counter()
+    total_steps = render_tiled(job["input"], job["output"], job["style"], job["detail"],
+                               seed=job["seed"], tile_size=job["tile"], executor=executor,
+                               backend=job["backend"], antialias=job["antialias"],
+                               order=job["order"])
+
+    elapsed = time.perf_counter() - start
+    return {
+        "input": job["input"],
+        "output": job["output"],
+        "steps": total_steps,
+        "seconds": elapsed,
+    }
+
+
+def build_jobs(paths, args):
+    """Create one job description per (image, style) pair"""
+    styles = STYLES if args.style == "all" else (args.style,)
+    jobs = []
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for style in styles:
+            jobs.append({
+                "input": path,
+                "output": os.path.join(args.output, f"{stem}_{style}.{args.format}"),
+                "style": style,
+                "detail": args.detail / 100.0,
+                "seed": args.seed,
+                "width": args.width,
+                "height": args.height,
+                "tile": args.tile,
+                "backend": args.backend,
+                "antialias": args.antialias,
+                "order": args.order,
+                "plot": args.plot or [],
+                "plot_seconds": args.plot_seconds,
+                "checkpoint": args.checkpoint,
+                "cache_dir": None if args.no_cache else args.cache_dir,
+                "cache_bytes": args.cache_mb << 20,
+                "cache_strokes": args.cache_strokes,
+            })
+    return jobs
+
+
+def report_finished(futures, done):
+    """Print the results of done render_image futures, forget them and return how many jobs failed"""
+    failures = 0
+    for future in done:
+        group = futures.pop(future)
+        try:
+            results = future.result()
+        except Exception as e:
+            failures += len(group)
+            print(f"Error rendering {group[0]['input']}: {e}", file=sys.stderr)
+            continue
+        for result in results:
+            if "error" in result:
+                failures += 1
+                print(f"Error rendering {result['output']}: {result['error']}", file=sys.stderr)
+            else:
+                print(format_result(result))
+    return failures
+
+
+def format_result(result):
+    seconds = max(result["seconds"], 1e-9)
+    if result.get("cached"):
+        line = f"{os.path.basename(result['output'])}: {result['steps']} steps, cached ({seconds:.2f}s)"
+    else:
+        line = (f"{os.path.basename(result['output'])}: {result['steps']} steps "
+                f"in {seconds:.2f}s ({result['steps'] / seconds:.0f} steps/s)")
+    if result.get("resumed"):
+        line += ", resumed from checkpoint"
+    if result.get("travel"):
+        before, after = result["travel"]
+        line += f", pen travel {before:.0f} -> {after:.0f} px"
+    return line
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Render drawing styles for a directory or manifest of images without the GUI")
+    parser.add_argument("source", help="image directory, or a text file listing one image path per line")
+    parser.add_argument("-o", "--output", default="drawings", help="output directory (default: drawings)")
+    parser.add_argument("-s", "--style", default="realistic", choices=STYLES + ("all",),
+                        help="drawing style, or 'all' for every style (default: realistic)")
+    parser.add_argument("-d", "--detail", type=int, default=50,
+                        help="detail level 10-100, as on the GUI slider (default: 50)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="random seed; matches the GUI Seed field for identical output")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH)
+    parser.add_argument("--height", type=int, default=DEFAULT_HEIGHT)
+    parser.add_argument("--format", default="png", help="output file extension (default: png)")
+    parser.add_argument("--backend", default="pil", choices=sorted(BACKENDS) + ["auto"],
+                        help="rasterizer: pil (reference look), opencv, or auto to "
+                             "benchmark and use the faster one per style (default: pil)")
+    parser.add_argument("--antialias", action="store_true",
+                        help="anti-aliased strokes (opencv backend)")
+    parser.add_argument("--order", default="natural", choices=ORDERS,
+                        help="stroke order: the style's own, or coarse-to-fine so a "
+                             "partial drawing previews the whole picture (default: natural)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="where finished drawings are cached for reuse (seeded jobs only)")
+    parser.add_argument("--cache-mb", type=int, default=None,
+                        help=f"cache size cap in megabytes (default: {DEFAULT_CACHE_BYTES >> 20})")
+    parser.add_argument("--cache-strokes", action="store_true",
+                        help="also cache each drawing's stroke list")
+    parser.add_argument("--thumbnail-dir", default=None,
+                        help="where sources fitted to the canvas are cached for reuse")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor fill the caches")
+    parser.add_argument("--checkpoint", type=float, default=None, metavar="SECONDS",
+                        help="checkpoint each drawing every SECONDS next to its output, and "
+                             "resume an interrupted run of it from there")
+    parser.add_argument("--tile", type=int, default=None, metavar="SIZE",
+                        help="draw at the source's full resolution in SIZE x SIZE tiles "
+                             "(ignores --width/--height; output png, tif or ppm)")
+    parser.add_argument("--plot", action="append", choices=PLOT_FORMATS,
+                        help="also write the strokes for a pen plotter, ordered to cut "
+                             "pen-up travel (repeat for several formats)")
+    parser.add_argument("--plot-seconds", type=float, default=None, metavar="SECONDS",
+                        help="time limit for refining the plot order (default: none)")
+    args = parser.parse_args(argv)
+    if args.tile:
+        # Tiled drawings are streamed straight to disk, past the caches and checkpoints
+        given = [option for option, value in (("--plot", args.plot),
+                                              ("--checkpoint", args.checkpoint is not None),
+                                              ("--cache-dir", args.cache_dir is not None),
+                                              ("--cache-mb", args.cache_mb is not None),
+                                              ("--cache-strokes", args.cache_strokes),
+                                              ("--thumbnail-dir", args.thumbnail_dir is not None),
+                                              ("--no-cache", args.no_cache)) if value]
+        if given:
+            parser.error(f"{', '.join(given)} can't be combined with --tile")
+        if f".{args.format.lower()}" not in TILE_FORMATS:
+            parser.error(f"--tile writes {', '.join(TILE_FORMATS)} only, not --format {args.format}")
+    if args.cache_dir is None:
+        args.cache_dir = DEFAULT_CACHE_DIR
+    if args.cache_mb is None:
+        args.cache_mb = DEFAULT_CACHE_BYTES >> 20
+    if args.thumbnail_dir is None:
+        args.thumbnail_dir = DEFAULT_THUMBNAIL_DIR
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = collect_images(args.source)
+    if not paths:
+        print(f"No images found in {args.source}")
+        return 1
+
+    ensure_directory_exists(args.output)
+    jobs = build_jobs(paths, args)
+
+    failures = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        if args.tile:
+            # One image at a time; its tiles keep every worker busy
+            for job in jobs:
+                try:
+                    print(format_result(render_tiled_job(job, executor)))
+                except Exception as e:
+                    failures += 1
+                    print(f"Error rendering {job['input']}: {e}", file=sys.stderr)
+        else:
+            # Images are decoded a few ahead on threads here, once for all
+            # their styles, and each goes to one worker with all its styles
+            # so they share its preprocessing; a bounded number of images
+            # in flight keeps memory flat however many images there are
+            thumbnails = None if args.no_cache else ThumbnailCache(args.thumbnail_dir)
+            limit = 2 * (args.workers or os.cpu_count() or 1)
+            futures = {}
+            groups = [list(group) for _, group in groupby(jobs, key=lambda job: job["input"])]
+            sources = prefetch_sources([group[0]["input"] for group in groups],
+                                       args.width, args.height, cache=thumbnails)
+            for (path, loading), group in zip(sources, groups):
+                try:
+                    source = loading.result()
+                except Exception as e:
+                    failures += len(group)
+                    print(f"Error rendering {path}: {e}", file=sys.stderr)
+                    continue
+                while len(futures) >= limit:
+                    failures += report_finished(futures, wait(futures, return_when=FIRST_COMPLETED).done)
+                futures[executor.submit(render_image, [dict(group[0], source=source)] + group[1:])] = group
+            failures += report_finished(futures, as_completed(list(futures)))
+
+    elapsed = time.perf_counter() - start
+    done = len(jobs) - failures
+    print(f"Rendered {done}/{len(jobs)} jobs in {elapsed:.2f}s "
+          f"({done / max(elapsed, 1e-9):.2f} jobs/s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
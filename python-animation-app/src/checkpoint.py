@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# Where the GUI keeps the checkpoint of a stopped drawing
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "python-animation-app",
+                                      "checkpoints")
+
+# Seconds between periodic checkpoints of a running render
+DEFAULT_INTERVAL = 30.0
+
+
+def settings_key(settings):
+    """Digest of a DrawingEngine.settings tuple"""
+    return hashlib.sha256(repr(settings).encode()).hexdigest()
+
+
+@dataclass
+class Checkpoint:
+    """A render stopped part way, enough to finish it exactly
+
+    Strokes are not stored: with the random generators put back in the
+    state they had when the render began, the engine regenerates the same
+    strokes from the same source, and playback continues at stroke drawn
+    of the layer-th StrokeList it plays (the earlier ones are already on
+    pixels). key is the settings_key of everything that decides the
+    drawing (source pixels, style, detail, seed, size, background,
+    backend, order), backend the rasterizer the engine actually used (what
+    "auto" picked). step is the progress count reached, for display.
+    """
+    key: str
+    backend: str
+    layer: int
+    drawn: int
+    step: int
+    rng_state: tuple
+    np_rng_state: dict
+    pixels: np.ndarray
+
+    def matches(self, settings):
+        """True if this checkpoint belongs to a render with these settings"""
+        return self.key == settings_key(settings)
+
+    def save(self, path):
+        """Write to path as a compressed .npz, replacing it atomically"""
+        version, internal, gauss = self.rng_state
+        meta = {"key": self.key, "backend": self.backend, "layer": self.layer,
+                "drawn": self.drawn, "step": self.step,
+                "rng_state": [version, list(internal), gauss],
+                "np_rng_state": self.np_rng_state}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(handle, "wb") as temp_file:
+                np.savez_compressed(temp_file, pixels=self.pixels, meta=np.array(json.dumps(meta)))
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Read a checkpoint written by save(), or None if there is no usable one"""
+        try:
+            with np.load(path) as entry:
+                pixels = entry["pixels"]
+                meta = json.loads(str(entry["meta"]))
+            version, internal, gauss = meta["rng_state"]
+            return cls(meta["key"], meta["backend"], int(meta["layer"]), int(meta["drawn"]),
+                       int(meta["step"]), (version, tuple(internal), gauss),
+                       meta["np_rng_state"], pixels)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+
+
+class Checkpointer:
+    """Writes a running engine's checkpoints to one file
+
+    The engine calls tick() as it draws, which saves once interval seconds
+    have passed since the last save, and save() when it is stopped; a
+    finished render discards the file. After discard() nothing more is
+    written, so a render being torn down can't bring the file back.
+    """
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL, clock=time.monotonic):
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self.last_save = clock()
+        self.discarded = False
+
+    def tick(self, engine):
+        """Save if a checkpoint is due"""
+        if self.interval is not None and self.clock() - self.last_save >= self.interval:
+            self.save(engine)
+
+    def save(self, engine):
+        """Save the engine's state now"""
+        if not self.discarded:
+            engine.checkpoint().save(self.path)
+            self.last_save = self.clock()
+
+    def discard(self):
+        """Delete the checkpoint file and stop writing it"""
+        self.discarded = True
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,214 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from effects import backdrop_for, blend, premultiply
+from raster import union_boxes
+
+
+# Memory the cache of layer images may use before the least recently used go
+DEFAULT_LAYER_BYTES = 64 << 20
+
+# Dirty rectangles are merged when their union wastes no more than this
+# share of its area on pixels neither covers
+_MERGE_SLACK = 0.25
+
+
+def _warp(target, layer, matrix, origin, opacity):
+    """Draw layer mapped onto the frame by matrix over target, the frame from origin on"""
+    matrix = matrix.copy()
+    matrix[:, 2] -= origin
+    size = (target.shape[1], target.shape[0])
+    if layer.alpha is None:
+        # Pixels the layer doesn't cover keep what is under them
+        warped = target if opacity >= 1 else target.copy()
+        cv2.warpAffine(layer.pixels, matrix, size, dst=warped, flags=cv2.INTER_LINEAR,
+                       borderMode=cv2.BORDER_TRANSPARENT)
+        if opacity < 1:
+            cv2.addWeighted(warped, opacity, target, 1 - opacity, 0, dst=target)
+        return
+    # Premultiplied colours warped against a transparent border keep clean edges
+    pixels, alpha = (cv2.warpAffine(channels, matrix, size, flags=cv2.INTER_LINEAR,
+                                    borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+                     for channels in (layer.pixels, layer.alpha))
+    blend(target, pixels, alpha, opacity)
+
+
+def _intersect(first, second):
+    """Overlap of two (x0, y0, x1, y1) boxes, or None"""
+    x0, y0 = max(first[0], second[0]), max(first[1], second[1])
+    x1, y1 = min(first[2], second[2]), min(first[3], second[3])
+    return (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+
+
+def _area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def merge_boxes(boxes):
+    """Fewer boxes covering boxes: overlapping or nearby ones become their union"""
+    merged = []
+    for box in boxes:
+        while True:
+            for i, other in enumerate(merged):
+                union = union_boxes(box, other)
+                if _area(union) * (1 - _MERGE_SLACK) <= _area(box) + _area(other):
+                    box = union
+                    del merged[i]
+                    break
+            else:
+                break
+        merged.append(box)
+    return merged
+
+
+class Compositor:
+    """Stacks image layers into frames, redrawing only what changed
+
+    compose() takes the layers of a frame, bottom first, each an image
+    with Effect parameters (opacity, x, y, scale, angle) and the point
+    its centre sits at, and updates frame in place. Images are cached as
+    premultiplied-alpha _Layers (least recently used first out past
+    max_bytes), so a layer that only moves or fades is never loaded or
+    resized again, and blending is whole-array OpenCV arithmetic. A
+    scaled or rotated layer is warped straight onto the frame, and only
+    over the rectangles being redrawn.
+
+    Against the frame before, only the rectangles of layers that appeared,
+    went, moved or changed are composited again, and the rest of the
+    frame is left as it was: a small layer moving over a still scene costs
+    its old and new box, not the whole frame. A rectangle is built up from
+    the background, or from the highest opaque layer covering all of it.
+    """
+
+    def __init__(self, size, background="white", max_bytes=DEFAULT_LAYER_BYTES):
+        self.size = size
+        self.max_bytes = max_bytes
+        self.backdrop = backdrop_for(np.empty((1, 1, 3), np.uint8), size, background)
+        self.frame = self.backdrop.copy()
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.shown = None
+
+    def compose(self, layers):
+        """Composite layers, (key, image, params, centre) from the bottom up, into frame
+
+        key names the layer's image between frames (and in the cache): the
+        same key must always come with the same image. image is an array,
+        or a function returning one that is only called when the image
+        isn't cached. centre None is the middle of the frame. Returns the
+        boxes of frame that were redrawn.
+        """
+        width, height = self.size
+        placed = []
+        for key, image, params, centre in layers:
+            placement = self._place(key, image, params, centre)
+            if placement is not None:
+                placed.append(placement)
+
+        if self.shown is None:
+            dirty = [(0, 0, width, height)]
+        else:
+            dirty = self._changes(self.shown, placed)
+        frame_box = (0, 0, width, height)
+        dirty = [box for box in (_intersect(box, frame_box) for box in dirty) if box is not None]
+        dirty = merge_boxes(dirty)
+        for box in dirty:
+            self._redraw(box, placed)
+        self.shown = placed
+        return dirty
+
+    def reset(self):
+        """Forget the frame shown, so the next compose draws all of it"""
+        self.shown = None
+
+    def _place(self, key, image, params, centre):
+        """(key, state, box, layer, opacity, matrix) of one layer, or None if it can't be seen
+
+        matrix is None for a layer shown as it is, at box, or the affine
+        map from the layer onto the frame for one that is scaled or rotated.
+        """
+        opacity = min(max(params["opacity"], 0.0), 1.0)
+        if opacity == 0:
+            return None
+        width, height = self.size
+        if centre is None:
+            centre = (width / 2, height / 2)
+        centre = (float(centre[0] + params["x"] * width), float(centre[1] + params["y"] * height))
+        scale, angle = float(params["scale"]), float(params["angle"]) % 360
+        source = self._source(key, image)
+        source_height, source_width = source.pixels.shape[:2]
+        if scale == 1 and angle == 0:
+            # Whole-pixel move: the cached image itself
+            left = int(round(centre[0] - source_width / 2))
+            top = int(round(centre[1] - source_height / 2))
+            box = (left, top, left + source_width, top + source_height)
+            return key, (scale, angle, box, opacity), box, source, opacity, None
+
+        matrix = cv2.getRotationMatrix2D((source_width / 2, source_height / 2), angle, scale)
+        matrix[0, 2] += centre[0] - source_width / 2
+        matrix[1, 2] += centre[1] - source_height / 2
+        corners = np.array([[0, 0, 1], [source_width, 0, 1], [0, source_height, 1],
+                            [source_width, source_height, 1]]) @ matrix.T
+        x0, y0 = np.floor(corners.min(axis=0)).astype(int) - 1
+        x1, y1 = np.ceil(corners.max(axis=0)).astype(int) + 1
+        box = (int(x0), int(y0), int(x1), int(y1))
+        return key, (scale, angle, centre, opacity), box, source, opacity, matrix
+
+    def _source(self, key, image):
+        """The _Layer of image key as it is, from the cache or made now"""
+        source = self.cache.get(key)
+        if source is not None:
+            self.cache.move_to_end(key)
+            return source
+        source = premultiply(image() if callable(image) else image)
+        self.cache[key] = source
+        self.cache_bytes += source.nbytes
+        while self.cache_bytes > self.max_bytes and len(self.cache) > 1:
+            _, old = self.cache.popitem(last=False)
+            self.cache_bytes -= old.nbytes
+        return source
+
+    def _changes(self, before, after):
+        """Boxes of the frame that differ between two lists of placed layers"""
+        old = {placement[0]: placement for placement in before}
+        new = {placement[0]: placement for placement in after}
+        dirty = []
+        for key, placement in old.items():
+            if key not in new or new[key][1] != placement[1]:
+                dirty.append(placement[2])
+        for key, placement in new.items():
+            if key not in old or old[key][1] != placement[1]:
+                dirty.append(placement[2])
+        # Layers that stay put but change places in the stack
+        kept_before = [placement[0] for placement in before if placement[0] in new]
+        kept_after = [placement[0] for placement in after if placement[0] in old]
+        if kept_before != kept_after:
+            dirty.extend(new[key][2] for key in kept_after)
+        return dirty
+
+    def _redraw(self, box, placed):
+        """Composite box of the frame again, from the background or the lowest layer seen"""
+        x0, y0, x1, y1 = box
+        bottom = None
+        for i, (_, _, layer_box, layer, opacity, matrix) in enumerate(placed):
+            if (matrix is None and layer.alpha is None and opacity == 1 and
+                    _intersect(box, layer_box) == box):
+                bottom = i
+        if bottom is None:
+            bottom = 0
+            self.frame[y0:y1, x0:x1] = self.backdrop[y0:y1, x0:x1]
+        for _, _, layer_box, layer, opacity, matrix in placed[bottom:]:
+            overlap = _intersect(box, layer_box)
+            if overlap is None:
+                continue
+            target = self.frame[overlap[1]:overlap[3], overlap[0]:overlap[2]]
+            if matrix is None:
+                left, top = layer_box[:2]
+                rows = slice(overlap[1] - top, overlap[3] - top)
+                columns = slice(overlap[0] - left, overlap[2] - left)
+                alpha = layer.alpha[rows, columns] if layer.alpha is not None else None
+                blend(target, layer.pixels[rows, columns], alpha, opacity)
+            else:
+                _warp(target, layer, matrix, overlap[:2], opacity)
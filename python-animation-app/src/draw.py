@@ -1,13 +1,22 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image, ImageDraw, ImageTk, ImageOps, ImageFilter
-import numpy as np
-import time
-import random
+from PIL import Image, ImageDraw, ImageTk
 import threading
-import cv2
 import os
 
+import numpy as np
+
+from checkpoint import DEFAULT_CHECKPOINT_DIR, Checkpoint, Checkpointer
+from engine import DrawingEngine, fit_image
+from history import CanvasHistory
+from ingest import ThumbnailCache, load_source
+from preprocess import content_key
+from process_render import ProcessRender
+from recorder import Recorder
+from result_cache import ResultCache, engine_result_key, result_key
+from scheduler import FrameScheduler, speed_to_rate
+from updates import RenderUpdates
+
 
 class AutoDrawingSystem:
     def __init__(self, root):
@@ -62,17 +71,52 @@ class AutoDrawingSystem:
         # Initialize PhotoImages
         self.original_tk_image = None
         self.drawing_tk_image = ImageTk.PhotoImage(self.drawing_image)
-        self.drawing_image_id = self.drawing_canvas.create_image(0, 0, anchor=tk.NW, image=self.drawing_tk_image)
+        self.drawing_image_id = self.drawing_canvas.create_image(
+            self.canvas_width // 2,
+            self.canvas_height // 4,
+            image=self.drawing_tk_image
+        )
+        
+        # Updates from the drawing thread, drained once per display frame;
+        # each drawing gets its own mailbox so a stopped one can't leak in
+        self.updates = RenderUpdates()
+        self.poll_interval = 16  # ms
         
         # Drawing parameters
         self.drawing_style = tk.StringVar(value="realistic")
         self.drawing_speed = tk.DoubleVar(value=50.0)
+        self.fastest = tk.BooleanVar(value=False)
         self.detail_level = tk.IntVar(value=50)
+        self.seed_var = tk.StringVar(value="")
+        self.use_process = tk.BooleanVar(value=False)
+        self.backend_var = tk.StringVar(value="pil")
+        self.coarse_first = tk.BooleanVar(value=False)
         self.is_drawing = False
         self.drawing_thread = None
+        self.drawing_engine = None
+        self.render_process = None
+        
+        # Finished seeded drawings are kept for the batch renderer to reuse
+        self.result_cache = ResultCache()
+        self.thumbnails = ThumbnailCache()
+        
+        # A stopped drawing is checkpointed here and picked up by the next Start
+        self.checkpoint_path = os.path.join(DEFAULT_CHECKPOINT_DIR, "drawing.npz")
+        self.checkpointer = None
+        
+        # Tile snapshots of everything shown on the drawing canvas, to scrub back through
+        self.history = CanvasHistory(np.asarray(self.drawing_image), compress=True)
+        self.history_position = tk.DoubleVar(value=100.0)
+        self.last_progress = 0
+        
+        # Optional recording of the drawing as it appears, encoded in the background
+        self.record_var = tk.BooleanVar(value=False)
+        self.recorder = None
         
         # Create controls in right frame
         self.create_controls()
+        
+        self.root.after(self.poll_interval, self.poll_updates)
     
     def create_controls(self):
         # File controls
@@ -91,7 +135,8 @@ class AutoDrawingSystem:
             ("Contour", "contour"),
             ("Pointillist", "pointillist"),
             ("Cubist", "cubist"),
-            ("Abstract", "abstract")
+            ("Abstract", "abstract"),
+            ("Flow Field", "flow")
         ]
         
         for text, value in styles:
@@ -105,6 +150,13 @@ class AutoDrawingSystem:
         tk.Scale(speed_frame, from_=1, to=100, orient=tk.HORIZONTAL, 
                 variable=self.drawing_speed).pack(fill=tk.X, padx=5, pady=5)
         
+        tk.Checkbutton(speed_frame, text="As fast as possible",
+                       variable=self.fastest).pack(anchor=tk.W, padx=5)
+        
+        # Coarse-to-fine shows the whole picture early, so a drawing can be stopped sooner
+        tk.Checkbutton(speed_frame, text="Coarse to fine",
+                       variable=self.coarse_first).pack(anchor=tk.W, padx=5)
+        
         # Detail level control
         detail_frame = tk.LabelFrame(self.right_frame, text="Detail Level")
         detail_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -112,6 +164,24 @@ class AutoDrawingSystem:
         tk.Scale(detail_frame, from_=10, to=100, orient=tk.HORIZONTAL, 
                 variable=self.detail_level).pack(fill=tk.X, padx=5, pady=5)
         
+        # Seed control (blank = different drawing every run)
+        seed_frame = tk.LabelFrame(self.right_frame, text="Seed")
+        seed_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        tk.Entry(seed_frame, textvariable=self.seed_var).pack(fill=tk.X, padx=5, pady=5)
+        
+        # Execution mode: threads by default; a worker process (opt-in) keeps
+        # heavy styles off the GUI's GIL
+        tk.Checkbutton(self.right_frame, text="Draw in separate process",
+                       variable=self.use_process).pack(anchor=tk.W, padx=5)
+        
+        # Rasterizer: PIL is the reference look, auto picks the faster one per style
+        backend_frame = tk.LabelFrame(self.right_frame, text="Renderer")
+        backend_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Combobox(backend_frame, textvariable=self.backend_var, state="readonly",
+                     values=("pil", "opencv", "auto")).pack(fill=tk.X, padx=5, pady=5)
+        
         # Action buttons
         action_frame = tk.Frame(self.right_frame)
         action_frame.pack(fill=tk.X, padx=5, pady=10)
@@ -128,6 +198,10 @@ class AutoDrawingSystem:
         self.save_button = tk.Button(action_frame, text="Save Drawing", command=self.save_drawing)
         self.save_button.pack(fill=tk.X, pady=2)
         
+        # Asks for a .gif or .mp4 file when the drawing starts
+        tk.Checkbutton(action_frame, text="Record drawing",
+                       variable=self.record_var).pack(anchor=tk.W)
+        
         # Progress bar
         progress_frame = tk.LabelFrame(self.right_frame, text="Drawing Progress")
         progress_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -135,6 +209,16 @@ class AutoDrawingSystem:
         self.progress = ttk.Progressbar(progress_frame, orient=tk.HORIZONTAL, length=100, mode='determinate')
         self.progress.pack(fill=tk.X, padx=5, pady=5)
         
+        # History: scrub back through the drawing, and undo to the point shown
+        history_frame = tk.LabelFrame(self.right_frame, text="History")
+        history_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        tk.Scale(history_frame, from_=0, to=100, orient=tk.HORIZONTAL, showvalue=False,
+                 variable=self.history_position, command=self.scrub_history).pack(fill=tk.X, padx=5, pady=5)
+        
+        tk.Button(history_frame, text="Undo to Here", command=self.undo_to_here).pack(fill=tk.X, padx=5, pady=2)
+        self.root.bind("<Control-z>", lambda event: self.undo_step())
+        
         # Status label
         self.status_var = tk.StringVar(value="Ready")
         status_label = tk.Label(self.right_frame, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, anchor=tk.W)
@@ -153,9 +237,9 @@ class AutoDrawingSystem:
             return
         
         try:
-            # Load and resize the image to fit the canvas
-            img = Image.open(file_path)
-            self.original_image = self.resize_image(img, self.canvas_width, self.canvas_height // 2)
+            # Load the image fitted to the canvas (decoded small, and cached)
+            self.original_image = load_source(file_path, self.canvas_width, self.canvas_height // 2,
+                                              cache=self.thumbnails)
             
             # Convert to PhotoImage and display
             self.original_tk_image = ImageTk.PhotoImage(self.original_image)
@@ -177,10 +261,17 @@ class AutoDrawingSystem:
     
     def resize_image(self, img, width, height):
         """Resize image to fit within dimensions while preserving aspect ratio"""
-        img_width, img_height = img.size
-        ratio = min(width/img_width, height/img_height)
-        new_size = (int(img_width * ratio), int(img_height * ratio))
-        return img.resize(new_size, Image.LANCZOS)
+        return fit_image(img, width, height)
+    
+    def get_seed(self):
+        """Return the seed from the Seed field, or None for a random drawing"""
+        value = self.seed_var.get().strip()
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return None
     
     def start_drawing(self):
         """Start the automatic drawing process"""
@@ -197,38 +288,214 @@ class AutoDrawingSystem:
         self.stop_button.config(state=tk.NORMAL)
         self.status_var.set("Drawing in progress...")
         
-        # Clear canvas for new drawing
-        self.clear_canvas()
+        # Clear canvas for new drawing; a stopped one with the same settings
+        # continues from its checkpoint
+        self.clear_canvas(keep_checkpoint=True)
+        if self.drawing_thread is not None:
+            self.drawing_thread.join(timeout=1)  # let it finish its checkpoint
+        
+        # Calculate parameters based on settings
+        detail = self.detail_level.get() / 100.0
+        # Strokes per second; None draws flat out, still shown at a steady frame rate
+        rate = None if self.fastest.get() else speed_to_rate(self.drawing_speed.get())
+        style = self.drawing_style.get()
+        backend = self.backend_var.get()
+        order = "coarse-to-fine" if self.coarse_first.get() else "natural"
+        
+        # A seeded drawing made before with these settings is shown at once
+        if self.show_cached_drawing(style, detail, backend, order):
+            return
+        if self.record_var.get():
+            self.start_recording()
+        
+        if self.use_process.get():
+            # Start drawing in a worker process; it drains like self.updates
+            self.render_process = ProcessRender(self.original_image, style, detail,
+                                                self.canvas_width, self.canvas_height // 2,
+                                                bg_color=self.bg_color, seed=self.get_seed(),
+                                                strokes_per_second=rate, backend=backend,
+                                                order=order, checkpoint_path=self.checkpoint_path,
+                                                cache_dir=self.result_cache.directory)
+            self.updates = self.render_process
+            return
         
         # Start drawing in a separate thread
-        self.drawing_thread = threading.Thread(target=self.drawing_process)
+        self.drawing_thread = threading.Thread(target=self.drawing_process,
+                                               args=(self.updates, style, detail, rate,
+                                                     self.get_seed(), backend, order))
         self.drawing_thread.daemon = True
         self.drawing_thread.start()
     
+    def show_cached_drawing(self, style, detail, backend, order):
+        """Show the finished drawing for these settings from the result cache
+        
+        Returns False, leaving the canvas alone, on a miss. Drawings with
+        the "auto" backend aren't looked up, since the backend they would
+        be drawn with isn't known before the benchmark.
+        """
+        if backend == "auto":
+            return False
+        key = result_key(content_key(np.asarray(self.original_image)), style, detail,
+                         self.get_seed(), self.canvas_width, self.canvas_height // 2,
+                         bg_color=self.bg_color, backend=backend, order=order)
+        hit = self.result_cache.get(key)
+        if hit is None:
+            return False
+        
+        pixels, _, _ = hit
+        self.discard_checkpoint()  # the drawing it would resume is already finished
+        self.drawing_image = Image.fromarray(pixels)
+        self.draw = ImageDraw.Draw(self.drawing_image)
+        self.update_drawing_canvas()
+        self.history.record((0, 0) + self.drawing_image.size, pixels, 100)
+        self.history_position.set(100.0)
+        self.last_progress = 100
+        self.progress['value'] = 100
+        self.is_drawing = False
+        self.start_button.config(state=tk.NORMAL)
+        self.stop_button.config(state=tk.DISABLED)
+        self.status_var.set("Drawing completed (from cache).")
+        return True
+    
     def stop_drawing(self):
         """Stop the current drawing process"""
         if not self.is_drawing:
             return
         
         self.is_drawing = False
+        if self.render_process is not None:
+            self.render_process.cancel()
         self.status_var.set("Drawing stopped.")
+        self.finish_recording()
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
     
-    def clear_canvas(self):
+    def clear_canvas(self, keep_checkpoint=False):
         """Clear the drawing canvas"""
+        if self.render_process is not None:
+            self.render_process.close(timeout=1)
+            self.render_process = None
+        self.finish_recording()
+        if not keep_checkpoint:
+            self.discard_checkpoint()
         self.drawing_image = Image.new("RGB", (self.canvas_width, self.canvas_height // 2), self.bg_color)
         self.draw = ImageDraw.Draw(self.drawing_image)
+        self.updates = RenderUpdates()
         self.update_drawing_canvas()
+        self.history.reset(np.asarray(self.drawing_image))
+        self.history_position.set(100.0)
+        self.last_progress = 0
         self.progress['value'] = 0
         self.status_var.set("Canvas cleared.")
     
+    def discard_checkpoint(self):
+        """Forget any stopped drawing, so the next Start begins afresh"""
+        if self.checkpointer is not None:
+            self.checkpointer.discard()
+            self.checkpointer = None
+        try:
+            os.remove(self.checkpoint_path)
+        except OSError:
+            pass
+    
+    def start_recording(self):
+        """Ask where to record the drawing about to start, and start recording"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".gif",
+            filetypes=[
+                ("GIF files", "*.gif"),
+                ("MP4 files", "*.mp4"),
+                ("All files", "*.*")
+            ]
+        )
+        
+        if not file_path:
+            return
+        try:
+            self.recorder = Recorder(file_path, np.asarray(self.drawing_image),
+                                     palette_image=self.original_image)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not record to file:\n{str(e)}")
+            return
+        self.record_frame(self.recorder)
+    
+    def record_frame(self, recorder):
+        """Sample a frame of the recording - runs in the Tk main loop at its frame rate"""
+        if recorder is not self.recorder:
+            return  # finished, or replaced by a newer recording
+        recorder.tick()
+        self.root.after(max(1, round(recorder.frame_time * 1000)), self.record_frame, recorder)
+    
+    def finish_recording(self):
+        """Write out the rest of the recording in progress, if any"""
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return
+        try:
+            recorder.close()
+            self.status_var.set(f"Recording saved to: {os.path.basename(recorder.path)}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not save recording:\n{str(e)}")
+    
+    def history_index(self):
+        """Snapshot the History slider points at"""
+        return round(self.history_position.get() / 100 * (len(self.history) - 1))
+    
+    def scrub_history(self, value=None):
+        """Show the snapshot under the History slider (the drawing itself is kept)"""
+        if self.is_drawing:
+            self.history_position.set(100.0)
+            return
+        index = self.history_index()
+        self.drawing_tk_image.paste(Image.fromarray(self.history.restore(index)))
+        label = self.history.labels[index]
+        self.status_var.set(f"History: {label:.0f}% drawn")
+    
+    def undo_to_here(self):
+        """Make the snapshot shown by the History slider the drawing"""
+        if self.is_drawing or self.render_process is not None:
+            return
+        self.undo_to(self.history_index())
+    
+    def undo_step(self):
+        """Go back one snapshot"""
+        if self.is_drawing or self.render_process is not None:
+            return
+        index = self.history_index()
+        if index == len(self.history) - 1:
+            index -= 1
+        self.undo_to(max(index, 0))
+    
+    def undo_to(self, index):
+        """Drop the history after snapshot index and continue from it"""
+        self.history.truncate(index)
+        self.drawing_image = Image.fromarray(self.history.restore(index))
+        self.draw = ImageDraw.Draw(self.drawing_image)
+        self.update_drawing_canvas()
+        self.history_position.set(100.0)
+        # A checkpoint would resume the drawing as it was before the undo
+        self.discard_checkpoint()
+        self.last_progress = self.history.labels[index]
+        self.progress['value'] = self.last_progress
+        self.status_var.set(f"Undone to {self.last_progress:.0f}% drawn")
+    
     def save_drawing(self):
-        """Save the current drawing to a file"""
+        """Save the current drawing to a file
+        
+        This saves what is on the canvas and never looks in the result
+        cache; only Start does (show_cached_drawing), and a drawing it
+        finds there is already on the canvas to save.
+        """
         if self.drawing_image is None:
             messagebox.showinfo("Info", "No drawing to save.")
             return
         
+        image = self.drawing_image
+        if self.render_process is not None:
+            image = self.render_process.snapshot()
+        elif self.drawing_engine is not None:
+            image = self.drawing_engine.image
+        
         file_path = filedialog.asksaveasfilename(
             defaultextension=".png",
             filetypes=[
@@ -240,455 +507,92 @@ class AutoDrawingSystem:
         
         if file_path:
             try:
-                self.drawing_image.save(file_path)
+                image.save(file_path)
                 self.status_var.set(f"Drawing saved to: {os.path.basename(file_path)}")
             except Exception as e:
                 messagebox.showerror("Error", f"Could not save drawing:\n{str(e)}")
     
     def update_drawing_canvas(self):
         """Update the drawing canvas with the current drawing"""
-        self.drawing_tk_image = ImageTk.PhotoImage(self.drawing_image)
-        self.drawing_canvas.delete("all")
-        self.drawing_canvas.create_image(
-            self.canvas_width // 2,
-            self.canvas_height // 4,
-            image=self.drawing_tk_image
-        )
-        self.root.update_idletasks()
-    
-    def drawing_process(self):
-        """The main drawing process - runs in a separate thread"""
-        # Convert PIL Image to numpy array for processing
-        img_array = np.array(self.original_image)
-        
-        # Convert to grayscale for edge detection
-        if len(img_array.shape) == 3:  # Color image
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:  # Already grayscale
-            gray = img_array
-        
-        # Get dimensions
-        height, width = gray.shape
-        
-        # Calculate parameters based on settings
-        detail = self.detail_level.get() / 100.0
-        speed = 101 - self.drawing_speed.get()  # Invert so higher value = faster
-        style = self.drawing_style.get()
-        
-        total_steps = 0
-        current_step = 0
-        
-        # Different drawing techniques based on selected style
-        if style == "realistic":
-            total_steps = self.draw_realistic(gray, detail, speed)
-        elif style == "sketch":
-            total_steps = self.draw_sketch(gray, detail, speed)
-        elif style == "contour":
-            total_steps = self.draw_contour(gray, detail, speed)
-        elif style == "pointillist":
-            total_steps = self.draw_pointillist(img_array, detail, speed)
-        elif style == "cubist":
-            total_steps = self.draw_cubist(img_array, detail, speed)
-        elif style == "abstract":
-            total_steps = self.draw_abstract(img_array, detail, speed)
-        
-        # Drawing completed
-        if self.is_drawing:  # Only update if not manually stopped
-            self.progress['value'] = 100
-            self.is_drawing = False
-            self.status_var.set("Drawing completed.")
-            
-            # Update UI from main thread
-            self.root.after(0, lambda: self.start_button.config(state=tk.NORMAL))
-            self.root.after(0, lambda: self.stop_button.config(state=tk.DISABLED))
+        self.drawing_tk_image.paste(self.drawing_image)
     
-    def draw_realistic(self, gray_img, detail, speed):
-        """Draw in a realistic style using edge-based approaches"""
-        # Apply some blurring to reduce noise
-        blurred = cv2.GaussianBlur(gray_img, (5, 5), 0)
-        
-        # Edge detection
-        edges = cv2.Canny(blurred, 30, 100)
-        
-        # Find contours in the edge image
-        contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Sort contours by length (to draw more significant features first)
-        contours = sorted(contours, key=cv2.contourArea, reverse=True)
-        
-        # Limit number of contours based on detail level
-        max_contours = max(10, int(len(contours) * detail))
-        contours = contours[:max_contours]
-        
-        # Draw tone first (base layer)
-        height, width = gray_img.shape
-        tone_step = max(1, int((101 - detail * 100) / 10))
-        
-        # Update progress counter
-        total_steps = len(contours) + (height // tone_step) * (width // tone_step)
-        current_step = 0
-        
-        # Draw shading with lines
-        for y in range(0, height, tone_step):
-            if not self.is_drawing:
-                break
-                
-            for x in range(0, width, tone_step):
-                if not self.is_drawing:
-                    break
-                    
-                value = gray_img[y, x]
-                if value < 200:  # Only shade darker areas
-                    darkness = 255 - value
-                    # Make line length proportional to darkness
-                    line_length = int(darkness / 255 * 5) + 1
-                    
-                    # Draw short lines of varying darkness for shading
-                    shade_color = tuple([int(value)] * 3)
-                    angle = random.uniform(0, 3.14)
-                    x1 = x + line_length * np.cos(angle)
-                    y1 = y + line_length * np.sin(angle)
-                    self.draw.line([(x, y), (int(x1), int(y1))], fill=shade_color, width=1)
-                
-                current_step += 1
-                if current_step % 50 == 0:
-                    self.progress['value'] = (current_step / total_steps) * 100
-                    self.update_drawing_canvas()
-                    time.sleep(0.01 / (speed / 10))
-        
-        # Draw contours for edges
-        for contour in contours:
-            if not self.is_drawing:
-                break
-                
-            points = []
-            for point in contour:
-                x, y = point[0]
-                points.append((x, y))
-            
-            # Only draw if we have enough points
-            if len(points) > 1:
-                # Draw with varying pressure
-                for i in range(len(points) - 1):
-                    x1, y1 = points[i]
-                    x2, y2 = points[i + 1]
-                    
-                    # Vary line width slightly for natural look
-                    width = random.uniform(0.8, 1.2)
-                    self.draw.line([(x1, y1), (x2, y2)], fill="black", width=int(width))
-            
-            current_step += 1
-            if current_step % 5 == 0:
-                self.progress['value'] = (current_step / total_steps) * 100
-                self.update_drawing_canvas()
-                time.sleep(0.05 / (speed / 10))
-        
-        return total_steps
+    def refresh_drawing(self, box, patch):
+        """Show patch, a copy of the changed box = (x0, y0, x1, y1) of the drawing
+        
+        Only that region is copied into the persistent PhotoImage.
+        """
+        if box == (0, 0) + self.drawing_image.size:
+            self.drawing_tk_image.paste(patch)
+        else:
+            # Blit a PhotoImage of just the changed region into place
+            patch = ImageTk.PhotoImage(patch)
+            self.drawing_canvas.tk.call(str(self.drawing_tk_image), "copy", str(patch),
+                                        "-to", box[0], box[1])
     
-    def draw_sketch(self, gray_img, detail, speed):
-        """Draw in a sketchy style with rough lines"""
-        # Edge detection with different thresholds for sketch effect
-        edges = cv2.Canny(gray_img, 20, 80)
-        
-        # Find contours in the edge image
-        contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Limit contours based on detail level
-        max_contours = max(10, int(len(contours) * detail))
-        selected_contours = random.sample(contours, min(max_contours, len(contours)))
-        
-        total_steps = len(selected_contours)
-        current_step = 0
-        
-        # Draw contours with sketchy effect
-        for contour in selected_contours:
-            if not self.is_drawing:
-                break
-                
-            points = []
-            for point in contour:
-                x, y = point[0]
-                points.append((x, y))
-            
-            # Only draw if we have enough points
-            if len(points) > 1:
-                # Draw with sketchy effect (multiple overlapping lines)
-                for _ in range(random.randint(1, 3)):
-                    # Add some random jitter to points for sketchy look
-                    jittered_points = []
-                    for x, y in points:
-                        jx = x + random.randint(-2, 2)
-                        jy = y + random.randint(-2, 2)
-                        jittered_points.append((jx, jy))
-                    
-                    # Draw the sketch lines
-                    for i in range(len(jittered_points) - 1):
-                        x1, y1 = jittered_points[i]
-                        x2, y2 = jittered_points[i + 1]
-                        
-                        # Vary line width for sketchy effect
-                        width = random.uniform(0.5, 1.5)
-                        self.draw.line([(x1, y1), (x2, y2)], fill="black", width=int(width))
-            
-            current_step += 1
-            self.progress['value'] = (current_step / total_steps) * 100
-            
-            if current_step % 3 == 0:
-                self.update_drawing_canvas()
-                time.sleep(0.03 / (speed / 10))
-        
-        return total_steps
-    
-    def draw_contour(self, gray_img, detail, speed):
-        """Draw only the main contours/outlines of the image"""
-        # Apply bilateral filter to reduce noise while keeping edges sharp
-        blurred = cv2.bilateralFilter(gray_img, 9, 75, 75)
-        
-        # Edge detection with higher threshold for cleaner lines
-        edges = cv2.Canny(blurred, 50, 150)
-        
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Sort contours by length (to draw more significant features first)
-        contours = sorted(contours, key=cv2.contourArea, reverse=True)
-        
-        # Limit number of contours based on detail level
-        max_contours = max(5, int(len(contours) * detail))
-        contours = contours[:max_contours]
-        
-        total_steps = len(contours)
-        current_step = 0
-        
-        # Draw clean contours
-        for contour in contours:
-            if not self.is_drawing:
-                break
-                
-            # Simplify contour based on detail level
-            epsilon = (1.1 - detail) * 0.01 * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, True)
-            
-            points = []
-            for point in approx:
-                x, y = point[0]
-                points.append((x, y))
-            
-            # Close the contour if we have enough points
-            if len(points) > 2:
-                points.append(points[0])  # Close the shape
-                
-                # Draw the contour with solid lines
-                for i in range(len(points) - 1):
-                    x1, y1 = points[i]
-                    x2, y2 = points[i + 1]
-                    self.draw.line([(x1, y1), (x2, y2)], fill="black", width=2)
-            
-            current_step += 1
-            self.progress['value'] = (current_step / total_steps) * 100
-            
-            if current_step % 2 == 0:
-                self.update_drawing_canvas()
-                time.sleep(0.02 / (speed / 10))
-        
-        return total_steps
-    
-    def draw_pointillist(self, img_array, detail, speed):
-        """Draw using dots/points like pointillism"""
-        height, width = img_array.shape[:2]
-        
-        # Calculate point density based on detail level
-        # Higher detail = more points
-        point_step = max(1, int((101 - detail * 100) / 5))
-        
-        total_steps = (height // point_step) * (width // point_step)
-        current_step = 0
-        
-        # Create points
-        for y in range(0, height, point_step):
-            if not self.is_drawing:
-                break
-                
-            for x in range(0, width, point_step):
-                if not self.is_drawing:
-                    break
-                    
-                # Get color at this pixel
-                if len(img_array.shape) == 3:  # Color image
-                    b, g, r = img_array[y, x]
-                    color = (r, g, b)
-                else:  # Grayscale
-                    v = img_array[y, x]
-                    color = (v, v, v)
-                
-                # Vary point size based on brightness (darker = larger points)
-                brightness = sum(color) / len(color)
-                max_radius = 3
-                radius = max(1, int(max_radius * (1 - brightness / 255)))
-                
-                # Add some randomness to point placement
-                point_x = x + random.randint(-2, 2)
-                point_y = y + random.randint(-2, 2)
-                
-                # Draw the point
-                self.draw.ellipse(
-                    [(point_x - radius, point_y - radius), 
-                     (point_x + radius, point_y + radius)], 
-                    fill=color
-                )
-                
-                current_step += 1
-                if current_step % 100 == 0:
-                    self.progress['value'] = (current_step / total_steps) * 100
-                    self.update_drawing_canvas()
-                    time.sleep(0.01 / (speed / 10))
-        
-        return total_steps
-    
-    def draw_cubist(self, img_array, detail, speed):
-        """Draw in a cubist style with geometric shapes"""
-        height, width = img_array.shape[:2]
-        
-        # Number of polygons based on detail level
-        num_polygons = int(50 + 450 * detail)
-        
-        total_steps = num_polygons
-        current_step = 0
-        
-        # Create geometric shapes
-        for _ in range(num_polygons):
-            if not self.is_drawing:
-                break
-            
-            # Random polygon size based on detail
-            size = random.randint(10, max(11, int(30 * detail)))
-            
-            # Random position
-            x = random.randint(0, width - size)
-            y = random.randint(0, height - size)
-            
-            # Get average color in this region
-            region = img_array[y:min(y+size, height), x:min(x+size, width)]
-            if len(region) == 0:
-                continue
-                
-            if len(img_array.shape) == 3:  # Color image
-                avg_color = region.mean(axis=(0, 1))
-                color = (int(avg_color[2]), int(avg_color[1]), int(avg_color[0]))
-            else:  # Grayscale
-                avg_color = region.mean()
-                color = (int(avg_color), int(avg_color), int(avg_color))
-            
-            # Create polygon with 3-5 points
-            num_points = random.randint(3, 5)
-            points = []
-            
-            for _ in range(num_points):
-                px = x + random.randint(0, size)
-                py = y + random.randint(0, size)
-                points.append((px, py))
-            
-            # Fill polygon with color
-            self.draw.polygon(points, fill=color, outline=None)
-            
-            current_step += 1
-            if current_step % 10 == 0:
-                self.progress['value'] = (current_step / total_steps) * 100
-                self.update_drawing_canvas()
-                time.sleep(0.01 / (speed / 10))
-        
-        return total_steps
+    def poll_updates(self):
+        """Apply what the drawing thread published - runs in the Tk main loop"""
+        batch = self.updates.drain()
+        if batch.progress is not None:
+            self.progress['value'] = batch.progress
+            self.last_progress = batch.progress
+        if batch.frame is not None:
+            self.refresh_drawing(*batch.frame)
+            box, patch = batch.frame
+            self.history.record(box, np.asarray(patch), self.last_progress)
+            self.history_position.set(100.0)
+            if self.recorder is not None:
+                self.recorder.capture(box, np.asarray(patch))
+        if batch.status is not None:
+            self.status_var.set(batch.status)
+        if "finished" in batch.events:
+            self.finish_recording()
+            self.is_drawing = False
+            self.start_button.config(state=tk.NORMAL)
+            self.stop_button.config(state=tk.DISABLED)
+        if self.render_process is not None and self.render_process.done:
+            # Bring the finished canvas home and release the worker
+            self.drawing_image = self.render_process.close()
+            self.draw = ImageDraw.Draw(self.drawing_image)
+            self.render_process = None
+        self.root.after(self.poll_interval, self.poll_updates)
     
-    def draw_abstract(self, img_array, detail, speed):
-        """Draw in an abstract style with flowing lines and shapes"""
-        height, width = img_array.shape[:2]
+    def drawing_process(self, updates, style, detail, rate, seed, backend, order):
+        """The main drawing process - runs in a separate thread
+        
+        Never touches Tk: everything meant for the UI goes through updates,
+        which poll_updates drains on the main thread.
+        """
+        def on_progress(current_step, total_steps):
+            updates.publish(progress=(current_step / total_steps) * 100)
+            updates.offer_frame(engine.pixels, engine.take_dirty())
+        
+        # A newer drawing or a cleared canvas replaces self.updates, which
+        # stops this one too
+        checkpointer = Checkpointer(self.checkpoint_path)
+        self.checkpointer = checkpointer
+        engine = DrawingEngine(self.canvas_width, self.canvas_height // 2,
+                               bg_color=self.bg_color,
+                               seed=seed,
+                               should_continue=lambda: self.is_drawing and self.updates is updates,
+                               on_progress=on_progress,
+                               backend=backend,
+                               scheduler=FrameScheduler(rate),
+                               order=order,
+                               checkpointer=checkpointer)
+        self.drawing_engine = engine
+        total_steps = engine.render(self.original_image, style, detail,
+                                    resume=Checkpoint.load(self.checkpoint_path))
+        if self.updates is updates:
+            self.drawing_image = engine.image
+            self.draw = ImageDraw.Draw(self.drawing_image)
+        if self.drawing_engine is engine:
+            self.drawing_engine = None
         
-        # Generate random curves and shapes based on image colors
-        num_elements = int(20 + 180 * detail)
-        
-        total_steps = num_elements
-        current_step = 0
-        
-        # Draw flowing lines that follow color changes
-        for _ in range(num_elements):
-            if not self.is_drawing:
-                break
-            
-            # Random starting point
-            x = random.randint(0, width - 1)
-            y = random.randint(0, height - 1)
-            
-            # Get color at this point
-            if len(img_array.shape) == 3:  # Color image
-                b, g, r = img_array[y, x]
-                color = (r, g, b)
-                
-                # Modify color for artistic effect
-                hue_shift = random.randint(-20, 20)
-                r = max(0, min(255, r + hue_shift))
-                g = max(0, min(255, g + hue_shift))
-                b = max(0, min(255, b + hue_shift))
-                color = (r, g, b)
-            else:  # Grayscale
-                v = img_array[y, x]
-                color = (v, v, v)
-            
-            # Decide what type of element to draw
-            element_type = random.choice(['curve', 'circle', 'line'])
-            
-            if element_type == 'curve':
-                # Create a flowing curve
-                points = [(x, y)]
-                
-                # Generate a path that follows similar colors
-                num_segments = random.randint(5, 15)
-                for _ in range(num_segments):
-                    # Move in a somewhat random direction
-                    angle = random.uniform(0, 2 * 3.14159)
-                    distance = random.randint(5, 20)
-                    new_x = int(x + distance * np.cos(angle))
-                    new_y = int(y + distance * np.sin(angle))
-                    
-                    # Keep within bounds
-                    new_x = max(0, min(width - 1, new_x))
-                    new_y = max(0, min(height - 1, new_y))
-                    
-                    points.append((new_x, new_y))
-                    x, y = new_x, new_y
-                
-                # Draw a smooth curve through the points
-                if len(points) > 1:
-                    self.draw.line(points, fill=color, width=random.randint(1, 3))
-            
-            elif element_type == 'circle':
-                # Draw a circle or ellipse
-                radius = random.randint(5, 25)
-                self.draw.ellipse(
-                    [(x - radius, y - radius), (x + radius, y + radius)],
-                    outline=color,
-                    width=random.randint(1, 3)
-                )
-            
-            else:  # line
-                # Draw a straight line in a random direction
-                angle = random.uniform(0, 2 * 3.14159)
-                length = random.randint(20, 80)
-                end_x = int(x + length * np.cos(angle))
-                end_y = int(y + length * np.sin(angle))
-                
-                # Keep within bounds
-                end_x = max(0, min(width - 1, end_x))
-                end_y = max(0, min(height - 1, end_y))
-                
-                self.draw.line([(x, y), (end_x, end_y)], fill=color, width=random.randint(1, 3))
-            
-            current_step += 1
-            if current_step % 5 == 0:
-                self.progress['value'] = (current_step / total_steps) * 100
-                self.update_drawing_canvas()
-                time.sleep(0.02 / (speed / 10))
-        
-        return total_steps
+        # Drawing completed
+        if engine.should_continue():  # Only update if not manually stopped
+            updates.offer_frame(engine.pixels, engine.take_dirty(), force=True)
+            updates.publish(progress=100, status="Drawing completed.", event="finished")
+            self.result_cache.put(engine_result_key(engine, style, detail), engine.pixels, total_steps)
 
 
 if __name__ == "__main__":
@@ -1,19 +1,502 @@
-def fade_in(image, duration):
-    # Logic for fade-in effect
-    pass
+from functools import lru_cache
 
-def slide_in(image, duration):
-    # Logic for slide-in effect
-    pass
+import cv2
+import numpy as np
+from PIL import Image, ImageColor
 
-def bounce(image, duration):
-    # Logic for bounce effect
-    pass
 
-def rotate(image, duration):
-    # Logic for rotate effect
-    pass
+# Frame rate effects are rendered at unless told otherwise
+DEFAULT_FPS = 30
 
-def zoom(image, duration):
-    # Logic for zoom effect
-    pass
\ No newline at end of file
+# Frames rendered into one buffer by the lazy generators
+DEFAULT_CHUNK = 16
+
+# Smallest scale a zoom starts from; 0 would collapse the image to a point
+_MIN_SCALE = 1e-3
+
+# Largest padded plane, in frames' worth of pixels, that moved frames are cut from
+_PLANE_FRAMES = 4
+
+
+def _bounce_out(t):
+    """Easing that lands and bounces three times, like a dropped ball"""
+    n, d = 7.5625, 2.75
+    return np.select(
+        [t < 1 / d, t < 2 / d, t < 2.5 / d],
+        [n * t * t, n * (t - 1.5 / d) ** 2 + 0.75, n * (t - 2.25 / d) ** 2 + 0.9375],
+        n * (t - 2.625 / d) ** 2 + 0.984375)
+
+
+# Easing curves over t in [0, 1], as array functions
+EASINGS = {
+    "linear": lambda t: t,
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: 1 - (1 - t) ** 2,
+    "ease_in_out": lambda t: t * t * (3 - 2 * t),
+    "bounce": _bounce_out,
+}
+
+# What each effect parameter is when no effect sets it, and how the
+# values of composed effects combine
+_IDENTITY = {"opacity": 1.0, "x": 0.0, "y": 0.0, "scale": 1.0, "angle": 0.0}
+_COMBINE = {"opacity": np.multiply, "x": np.add, "y": np.add, "scale": np.multiply,
+            "angle": np.add}
+
+
+@lru_cache(maxsize=64)
+def easing_table(easing, count):
+    """Eased progress of each of count frames, from 0 at the first to 1 at the last
+
+    Computed once per (easing, count) and shared, so it is read-only.
+    """
+    t = np.linspace(0.0, 1.0, count) if count > 1 else np.ones(1)
+    table = np.asarray(EASINGS[easing](t), dtype=np.float64)
+    table.flags.writeable = False
+    return table
+
+
+class Effect:
+    """How an image fades and moves over an effect's duration
+
+    An effect animates some of five parameters from a start to an end
+    value along an easing curve: opacity (0-1), x and y (offset of the
+    image's centre from the frame's, as fractions of the frame size),
+    scale and angle (degrees, anticlockwise). compose() merges effects
+    into one that does all of them at once: opacities and scales
+    multiply, offsets and angles add. Rendering works out every frame's
+    parameters with array operations on the easing tables, then draws
+    each frame with a single pass over its pixels, however many effects
+    were composed.
+    """
+
+    def __init__(self, easing="linear", **ranges):
+        unknown = set(ranges) - set(_IDENTITY)
+        if unknown:
+            raise ValueError(f"Unknown effect parameter(s): {', '.join(sorted(unknown))}")
+        if easing not in EASINGS:
+            raise ValueError(f"Unknown easing: {easing}")
+        self.parts = [(name, easing, float(start), float(end))
+                      for name, (start, end) in ranges.items()]
+
+    def tracks(self, count):
+        """Each parameter's value at each of count frames, as arrays"""
+        tracks = {name: np.full(count, value) for name, value in _IDENTITY.items()}
+        for name, easing, start, end in self.parts:
+            values = start + (end - start) * easing_table(easing, count)
+            _COMBINE[name](tracks[name], values, out=tracks[name])
+        tracks["scale"] = np.maximum(tracks["scale"], _MIN_SCALE)
+        return tracks
+
+    def at(self, frame, count):
+        """Each parameter's value at one frame of count, without the other frames"""
+        frame = min(max(frame, 0), count - 1)
+        params = dict(_IDENTITY)
+        for name, easing, start, end in self.parts:
+            value = start + (end - start) * easing_table(easing, count)[frame]
+            params[name] = _COMBINE[name](params[name], value)
+        params["scale"] = max(params["scale"], _MIN_SCALE)
+        return params
+
+
+def compose(*effects):
+    """One effect doing all of effects at once"""
+    combined = Effect()
+    for effect in effects:
+        combined.parts.extend(effect.parts)
+    return combined
+
+
+# The built-in effects, by the names the app uses
+EFFECTS = {
+    "fade_in": Effect("linear", opacity=(0, 1)),
+    "slide_in": Effect("ease_out", x=(-1, 0)),
+    "bounce": Effect("bounce", y=(-1, 0)),
+    "rotate": Effect("ease_in_out", angle=(0, 360)),
+    "zoom": Effect("ease_out", scale=(0, 1)),
+}
+
+
+def frame_count(duration, fps=DEFAULT_FPS):
+    """Frames in duration seconds at fps (at least one)"""
+    return max(1, int(round(duration * fps)))
+
+
+def to_array(image):
+    """An image as an (H, W, C) uint8 array: PIL images are converted once to RGB(A)"""
+    if isinstance(image, Image.Image):
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        return np.asarray(image)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def backdrop_for(image, size, background):
+    """A frame-sized (H, W, C) array of the background colour"""
+    width, height = size
+    color = ImageColor.getrgb(background) if isinstance(background, str) else tuple(background)
+    # Opaque unless the colour says otherwise; dropped for RGB images
+    color = (tuple(color) + (255,))[:image.shape[2]]
+    return np.broadcast_to(np.array(color, dtype=np.uint8), (height, width, len(color))).copy()
+
+
+class _Layer:
+    """Pixels to composite, with their colours premultiplied by alpha
+
+    pixels is (H, W, 3) and alpha (H, W), or None where the layer is
+    opaque (and premultiplied colours are the plain ones).
+    """
+
+    __slots__ = ("pixels", "alpha")
+
+    def __init__(self, pixels, alpha=None):
+        self.pixels = pixels
+        self.alpha = alpha
+
+    @property
+    def nbytes(self):
+        return self.pixels.nbytes + (self.alpha.nbytes if self.alpha is not None else 0)
+
+
+def premultiply(image):
+    """An (H, W, 3 or 4) uint8 image as a _Layer"""
+    if image.shape[2] == 3 or image[..., 3].min() == 255:
+        return _Layer(np.ascontiguousarray(image[..., :3]))
+    alpha = np.ascontiguousarray(image[..., 3])
+    pixels = cv2.multiply(np.ascontiguousarray(image[..., :3]), cv2.merge((alpha, alpha, alpha)),
+                          scale=1 / 255)
+    return _Layer(pixels, alpha)
+
+
+def blend(target, pixels, alpha, opacity):
+    """Draw premultiplied pixels (alpha None if opaque) over target at opacity, in place
+
+    target is RGB, or RGBA with straight alpha; where an RGBA target is
+    itself see-through the result is too, with its colours unpremultiplied.
+    """
+    if alpha is None:
+        if target.shape[2] == 3:
+            if opacity >= 1:
+                target[...] = pixels
+            else:
+                cv2.addWeighted(pixels, opacity, target, 1 - opacity, 0, dst=target)
+            return
+        alpha = np.full(pixels.shape[:2], 255, dtype=np.uint8)
+    if opacity < 1:
+        pixels = cv2.convertScaleAbs(pixels, alpha=opacity)
+        alpha = cv2.convertScaleAbs(alpha, alpha=opacity)
+    # target * (1 - alpha) + pixels
+    inverse = cv2.bitwise_not(alpha)
+    if target.shape[2] == 3:
+        cv2.multiply(target, cv2.merge((inverse, inverse, inverse)), dst=target, scale=1 / 255)
+        cv2.add(target, pixels, dst=target)
+        return
+    colour = np.ascontiguousarray(target[..., :3])
+    under = np.ascontiguousarray(target[..., 3])
+    opaque = under.min() == 255
+    if not opaque:
+        colour = cv2.multiply(colour, cv2.merge((under, under, under)), scale=1 / 255)
+    colour = cv2.add(cv2.multiply(colour, cv2.merge((inverse, inverse, inverse)), scale=1 / 255),
+                     pixels)
+    if not opaque:
+        under = cv2.add(alpha, cv2.multiply(under, inverse, scale=1 / 255))
+        colour = cv2.divide(colour, cv2.merge((under, under, under)), scale=255)
+        target[..., 3] = under
+    target[..., :3] = colour
+
+
+class EffectFrames:
+    """The count frames of an effect on one image, drawn on demand
+
+    Conversions and the per-frame parameters are worked out once here;
+    render() then draws any run of frames, in any order, into a caller's
+    buffer. size is the frame (width, height), the image's own by
+    default, with the image centred on it over the background colour.
+    An RGBA image is composited over the background with premultiplied
+    alpha, on every path.
+
+    Frames that only move and fade the image (scale 1, no rotation) are
+    batched: where every frame puts the image is worked out for all of
+    them at once from the x and y columns, and the image is composited
+    over the background once, onto a plane with enough background
+    around it for all those positions. Each such frame is then a window
+    of the plane, copied as it is or faded against the background in one
+    OpenCV call. Frames that scale or rotate the image are warped one at
+    a time by _draw_frame, as is everything on a see-through background.
+    """
+
+    def __init__(self, image, effect, count, size=None, background="white",
+                 interpolation=cv2.INTER_LINEAR):
+        self.image = to_array(image)
+        self.layer = premultiply(self.image)
+        if size is None:
+            size = (self.image.shape[1], self.image.shape[0])
+        self.count = count
+        self.shape = (size[1], size[0], self.image.shape[2])
+        self.backdrop = backdrop_for(self.image, size, background)
+        self.tracks = effect.tracks(count)
+        self.interpolation = interpolation
+
+        # Top-left corner of the image in each frame that only moves it
+        width, height = size
+        image_height, image_width = self.image.shape[:2]
+        tracks = self.tracks
+        self.moved = (tracks["scale"] == 1) & (tracks["angle"] % 360 == 0)
+        if self.image.shape[2] == 4 and self.backdrop[0, 0, 3] < 255:
+            self.moved[:] = False  # fading against a see-through background needs blend
+        self.lefts = np.rint(width / 2 + tracks["x"] * width - image_width / 2).astype(np.int64)
+        self.tops = np.rint(height / 2 + tracks["y"] * height - image_height / 2).astype(np.int64)
+        self.plane = None
+
+    def __len__(self):
+        return self.count
+
+    def render(self, start, out):
+        """Draw frames start to start + len(out) into out, a (frames, H, W, C) buffer"""
+        stop = start + len(out)
+        params = np.stack([self.tracks[name][start:stop] for name in _IDENTITY], axis=1)
+        # A frame whose parameters match the one before (a hold) is a copy
+        repeats = np.r_[False, (params[1:] == params[:-1]).all(axis=1)]
+        moved = self.moved[start:stop] & ~repeats
+        plane = None
+        if moved.any():
+            plane = self._plane(np.flatnonzero(self.moved)) or self._plane(
+                start + np.flatnonzero(moved))
+        if plane is not None:
+            self._move(plane, start, out, np.flatnonzero(moved))
+        else:
+            moved[:] = False
+        for index in np.flatnonzero(~moved):
+            if repeats[index]:
+                out[index] = out[index - 1]
+            else:
+                opacity, x, y, scale, angle = params[index]
+                _draw_frame(out[index], self.image, self.layer, self.backdrop, opacity, x, y,
+                            scale, angle, self.interpolation)
+        return out
+
+    def _plane(self, frames):
+        """(pixels, left, top) of the image over the background, padded for frames
+
+        The window of pixels for frame i starts at (left - lefts[i],
+        top - tops[i]). The plane for the whole effect is kept; one too
+        big for _PLANE_FRAMES frames isn't made, and None is returned.
+        """
+        whole = len(frames) == self.moved.sum()
+        if whole and self.plane is not None:
+            return self.plane
+        height, width, channels = self.shape
+        image_height, image_width = self.image.shape[:2]
+        left, top = int(self.lefts[frames].max()), int(self.tops[frames].max())
+        plane_width = left - int(self.lefts[frames].min()) + width
+        plane_height = top - int(self.tops[frames].min()) + height
+        if plane_width * plane_height > _PLANE_FRAMES * width * height:
+            return None
+
+        pixels = np.empty((plane_height, plane_width, channels), dtype=np.uint8)
+        pixels[...] = self.backdrop[0, 0]
+        x0, y0 = max(left, 0), max(top, 0)
+        x1, y1 = min(left + image_width, plane_width), min(top + image_height, plane_height)
+        if x0 < x1 and y0 < y1:
+            rows, columns = slice(y0 - top, y1 - top), slice(x0 - left, x1 - left)
+            target = pixels[y0:y1, x0:x1]
+            if self.layer.alpha is None:
+                target[...] = self.image[rows, columns]
+            else:
+                blend(target, self.layer.pixels[rows, columns], self.layer.alpha[rows, columns], 1)
+        plane = (pixels, left, top)
+        if whole:
+            self.plane = plane
+        return plane
+
+    def _move(self, plane, start, out, indices):
+        """Draw the frames start + indices of out as windows of plane"""
+        pixels, left, top = plane
+        height, width = self.shape[:2]
+        frames = start + indices
+        xs = left - self.lefts[frames]
+        ys = top - self.tops[frames]
+        opacities = np.clip(self.tracks["opacity"][frames], 0.0, 1.0)
+        for index, x, y, opacity in zip(indices.tolist(), xs.tolist(), ys.tolist(),
+                                        opacities.tolist()):
+            window = pixels[y:y + height, x:x + width]
+            if opacity >= 1:
+                out[index] = window
+            elif opacity <= 0:
+                out[index] = self.backdrop
+            else:
+                cv2.addWeighted(window, opacity, self.backdrop, 1 - opacity, 0, dst=out[index])
+
+
+def render_frames(image, effect, count, size=None, background="white", start=0, out=None,
+                  interpolation=cv2.INTER_LINEAR):
+    """Frames start to start + len(out) of an effect count frames long, into out
+
+    out is a (frames, H, W, C) uint8 buffer, allocated for all count frames
+    if not given. Returns out.
+    """
+    frames = EffectFrames(image, effect, count, size, background, interpolation)
+    if out is None:
+        out = np.empty((count - start,) + frames.shape, dtype=np.uint8)
+    return frames.render(start, out)
+
+
+def iter_frames(image, effect, count, size=None, background="white", chunk=DEFAULT_CHUNK,
+                reuse=False, interpolation=cv2.INTER_LINEAR):
+    """Lazily yield the count frames of an effect as (H, W, C) arrays
+
+    Frames are rendered chunk at a time into a fresh buffer, so at most a
+    chunk of frames is alive beyond those the caller keeps. With reuse the
+    same buffer is rendered into every time, which saves allocating it but
+    overwrites a yielded frame chunk frames later: for callers that use
+    each frame straight away, like an encoder.
+    """
+    frames = EffectFrames(image, effect, count, size, background, interpolation)
+    shape = (min(chunk, count),) + frames.shape
+    buffer = np.empty(shape, dtype=np.uint8) if reuse else None
+    for start in range(0, count, chunk):
+        out = buffer if reuse else np.empty(shape, dtype=np.uint8)
+        yield from frames.render(start, out[:min(chunk, count - start)])
+
+
+def effect_named(name):
+    """The Effect called name in EFFECTS; "a+b" composes several, and None or "" is a still"""
+    if isinstance(name, Effect):
+        return name
+    if not name:
+        return Effect()
+    try:
+        return compose(*(EFFECTS[part.strip()] for part in name.split("+")))
+    except KeyError as e:
+        raise ValueError(f"Unknown effect: {e.args[0]}") from None
+
+
+def animate(image, effect, duration, fps=DEFAULT_FPS, **options):
+    """Lazily yield the frames of effect applied to image for duration seconds
+
+    effect is an Effect or a name for effect_named; options go to
+    iter_frames.
+    """
+    return iter_frames(image, effect_named(effect), frame_count(duration, fps), **options)
+
+
+def draw_image(frame, image, params, centre=None, backdrop=None,
+               interpolation=cv2.INTER_LINEAR):
+    """Draw image onto frame with one frame's effect parameters
+
+    params maps the Effect parameter names to values (Effect.at gives
+    them); the image's centre sits at centre, the frame's by default,
+    before the effect's offset. Without a backdrop the image is drawn over
+    (and faded against) what the frame already shows, which is how layers
+    stack; with one the rest of the frame is cleared to it.
+    """
+    image = to_array(image)
+    _draw_frame(frame, image, premultiply(image), backdrop, params["opacity"], params["x"],
+                params["y"], params["scale"], params["angle"], interpolation, centre)
+
+
+def _draw_frame(frame, image, layer, backdrop, opacity, x, y, scale, angle, interpolation,
+                centre=None):
+    """Draw image onto the frame with the given parameters, in one pass
+
+    layer is premultiply(image); an image with any transparency is drawn
+    from it, blended over what is underneath.
+    """
+    height, width = frame.shape[:2]
+    image_height, image_width = image.shape[:2]
+    if centre is None:
+        centre = (width / 2, height / 2)
+    centre_x = centre[0] + x * width
+    centre_y = centre[1] + y * height
+    opacity = min(max(opacity, 0.0), 1.0)
+    if opacity == 0:
+        if backdrop is not None:
+            frame[...] = backdrop
+        return
+
+    if scale == 1 and angle % 360 == 0:
+        # Whole-pixel move: copy or blend the visible part, background elsewhere
+        left = int(round(centre_x - image_width / 2))
+        top = int(round(centre_y - image_height / 2))
+        x0, y0 = max(left, 0), max(top, 0)
+        x1, y1 = min(left + image_width, width), min(top + image_height, height)
+        if backdrop is not None and ((x0, y0, x1, y1) != (0, 0, width, height) or
+                                     layer.alpha is not None):
+            frame[...] = backdrop
+        if x0 >= x1 or y0 >= y1:
+            return
+        target = frame[y0:y1, x0:x1]
+        if layer.alpha is not None:
+            rows, columns = slice(y0 - top, y1 - top), slice(x0 - left, x1 - left)
+            blend(target, layer.pixels[rows, columns], layer.alpha[rows, columns], opacity)
+            return
+        source = image[y0 - top:y1 - top, x0 - left:x1 - left]
+        if opacity == 1:
+            target[...] = source
+        else:
+            under = target if backdrop is None else backdrop[y0:y1, x0:x1]
+            cv2.addWeighted(source, opacity, under, 1 - opacity, 0, dst=target)
+        return
+
+    # Scale and rotate about the image centre, then move it into place
+    matrix = cv2.getRotationMatrix2D((image_width / 2, image_height / 2), angle, scale)
+    matrix[0, 2] += centre_x - image_width / 2
+    matrix[1, 2] += centre_y - image_height / 2
+    # Only the box the image lands in is warped; the rest is background
+    corners = np.array([[0, 0, 1], [image_width, 0, 1], [0, image_height, 1],
+                        [image_width, image_height, 1]]) @ matrix.T
+    x0, y0 = np.maximum(np.floor(corners.min(axis=0)).astype(int) - 1, 0)
+    x1 = min(int(np.ceil(corners[:, 0].max())) + 1, width)
+    y1 = min(int(np.ceil(corners[:, 1].max())) + 1, height)
+    if backdrop is not None and ((x0, y0, x1, y1) != (0, 0, width, height) or
+                                 layer.alpha is not None):
+        frame[...] = backdrop
+    if x0 >= x1 or y0 >= y1:
+        return
+    matrix[:, 2] -= (x0, y0)
+    target = frame[y0:y1, x0:x1]
+    if layer.alpha is not None:
+        # Premultiplied colours warped against a transparent border keep clean edges
+        pixels, alpha = (cv2.warpAffine(channels, matrix, (x1 - x0, y1 - y0), flags=interpolation,
+                                        borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+                         for channels in (layer.pixels, layer.alpha))
+        blend(target, pixels, alpha, opacity)
+    elif backdrop is not None:
+        cv2.warpAffine(image, matrix, (x1 - x0, y1 - y0), dst=target, flags=interpolation,
+                       borderMode=cv2.BORDER_CONSTANT,
+                       borderValue=tuple(int(v) for v in backdrop[0, 0]))
+        if opacity < 1:
+            cv2.addWeighted(target, opacity, backdrop[y0:y1, x0:x1], 1 - opacity, 0, dst=target)
+    elif opacity == 1:
+        # Pixels the image doesn't cover keep what is under them
+        cv2.warpAffine(image, matrix, (x1 - x0, y1 - y0), dst=target, flags=interpolation,
+                       borderMode=cv2.BORDER_TRANSPARENT)
+    else:
+        layer = target.copy()
+        cv2.warpAffine(image, matrix, (x1 - x0, y1 - y0), dst=layer, flags=interpolation,
+                       borderMode=cv2.BORDER_TRANSPARENT)
+        cv2.addWeighted(layer, opacity, target, 1 - opacity, 0, dst=target)
+
+
+def fade_in(image, duration, fps=DEFAULT_FPS, **options):
+    """Frames of image fading in from the background"""
+    return animate(image, EFFECTS["fade_in"], duration, fps, **options)
+
+
+def slide_in(image, duration, fps=DEFAULT_FPS, **options):
+    """Frames of image sliding in from the left"""
+    return animate(image, EFFECTS["slide_in"], duration, fps, **options)
+
+
+def bounce(image, duration, fps=DEFAULT_FPS, **options):
+    """Frames of image dropping in from above and bouncing to rest"""
+    return animate(image, EFFECTS["bounce"], duration, fps, **options)
+
+
+def rotate(image, duration, fps=DEFAULT_FPS, **options):
+    """Frames of image turning a full circle"""
+    return animate(image, EFFECTS["rotate"], duration, fps, **options)
+
+
+def zoom(image, duration, fps=DEFAULT_FPS, **options):
+    """Frames of image growing from a point to full size"""
+    return animate(image, EFFECTS["zoom"], duration, fps, **options)
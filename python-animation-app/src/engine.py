@@ -0,0 +1,595 @@
+from PIL import Image
+import numpy as np
+import random
+import cv2
+
+from flow import flow_field, streamline_segments, trace_streamlines
+from hatching import hatch_strokes
+from preprocess import PREPROCESS_CACHE, content_key
+from backends import get_backend
+from checkpoint import Checkpoint, settings_key
+from ordering import ORDERS, coarse_to_fine
+from raster import union_boxes
+from scheduler import FrameScheduler
+from sampling import box_means, integral_image
+from strokes import ELLIPSE, LINE, POLYGON, StrokeBuilder, StrokeList, contour_segments
+
+
+# Bumped whenever a change alters the pixels or strokes any style produces,
+# which invalidates every cached result
+ENGINE_VERSION = 1
+
+# Pieces a headless render is drawn in when it writes checkpoints
+CHECKPOINT_CHUNKS = 64
+
+# Drawing styles in the order they appear in the GUI
+STYLES = ("realistic", "sketch", "contour", "pointillist", "cubist", "abstract", "flow")
+
+# Image area (the GUI drawing canvas) that element counts are tuned for
+REFERENCE_AREA = 800 * 300
+
+# Upper bound on cubist polygons for very large sources
+MAX_CUBIST_POLYGONS = 50000
+
+# Upper bound on flow-field particles for very large sources
+MAX_FLOW_PARTICLES = 200000
+
+
+def fitted_size(size, width, height):
+    """Size an image of size fits to within width x height, aspect ratio kept"""
+    img_width, img_height = size
+    ratio = min(width/img_width, height/img_height)
+    return (int(img_width * ratio), int(img_height * ratio))
+
+
+def fit_image(img, width, height):
+    """Resize image to fit within dimensions while preserving aspect ratio"""
+    return img.resize(fitted_size(img.size, width, height), Image.LANCZOS)
+
+
+def find_contours(edges, mode, by_area=False):
+    """Contours of an edge map as a tuple, optionally largest area first"""
+    contours, _ = cv2.findContours(edges, mode, cv2.CHAIN_APPROX_SIMPLE)
+    if by_area:
+        contours = sorted(contours, key=cv2.contourArea, reverse=True)
+    return tuple(contours)
+
+
+def prepare_source(img, width, height):
+    """Fit a loaded image to the canvas and normalise its mode for drawing"""
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    return fit_image(img, width, height)
+
+
+class DrawingEngine:
+    """Renders a drawing style onto an in-memory canvas without any GUI.
+
+    The GUI and the batch renderer both drive this class so a given seed
+    produces the same pixels on either path. Each style first describes
+    its drawing as a StrokeList and then plays it back through a
+    rasterization backend: ``backend`` is "pil"
+    (the reference look), "opencv" (optionally ``antialias``-ed) or
+    "auto" to benchmark both once and use the faster one for the style.
+    The canvas is ``pixels``, an (H, W, 3) uint8 array that callers can
+    read in place (pass one, such as a view of shared memory, to have it
+    cleared to ``bg_color`` and drawn on directly); ``image`` gives a PIL copy. ``should_continue`` is polled
+    between strokes to support cancellation and ``on_progress`` is called
+    with ``(current_step, total_steps)`` whenever a progressive display
+    should refresh. Progressive playback is paced by ``scheduler``, a
+    FrameScheduler (by default one that draws as fast as possible and
+    presents at its frame rate); headless runs draw everything at once.
+    ``order`` "coarse-to-fine" replays each layer of strokes so that an
+    early stop already shows the whole picture (see ordering.py) instead
+    of the style's own raster, random or by-area order.
+    A ``checkpointer`` saves the canvas and stroke cursor as it draws, and
+    render() can resume from such a checkpoint with the same result as an
+    uninterrupted run.
+    Every stroke also widens a dirty box that take_dirty hands out, so a
+    display only has to copy what changed since its last refresh.
+
+    Preprocessing (grayscale, blurs, edge maps, sorted contours, flow
+    fields) goes through the process-wide PREPROCESS_CACHE (or the
+    ``preprocess_cache`` given), keyed by the source pixels and the stage
+    parameters, so redrawing the same image at another detail level or
+    seed only re-slices the cached results.
+    """
+
+    def __init__(self, width, height, bg_color="white", seed=None,
+                 should_continue=None, on_progress=None, backend="pil", antialias=False,
+                 scheduler=None, order="natural", checkpointer=None, preprocess_cache=None,
+                 pixels=None):
+        if order not in ORDERS:
+            raise ValueError(f"Unknown stroke order: {order}")
+        self.width = width
+        self.height = height
+        self.bg_color = bg_color
+        blank = np.asarray(Image.new("RGB", (width, height), bg_color))
+        if pixels is None:
+            pixels = blank.copy()
+        else:
+            pixels[...] = blank
+        self.pixels = pixels
+        self.background = self.pixels[0, 0].copy()
+        self.backend = backend
+        self.antialias = antialias
+        self.order = order
+        self.rasterizer = None
+        self.source_key = None
+        self.played = []
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        self.should_continue = should_continue or (lambda: True)
+        self.on_progress = on_progress
+        if scheduler is None and on_progress is not None:
+            scheduler = FrameScheduler()
+        self.scheduler = scheduler
+        self.checkpointer = checkpointer
+        self.preprocess_cache = PREPROCESS_CACHE if preprocess_cache is None else preprocess_cache
+        self.settings = None
+        self.resumed = False
+        self.resume_at = None
+        self.initial_rng_state = None
+        self.cursor = (0, 0)
+        self.dirty = None
+
+    @property
+    def image(self):
+        """The canvas as a PIL image (a copy)"""
+        return Image.fromarray(self.pixels)
+
+    @property
+    def progressive(self):
+        """True when someone watches the drawing build up step by step"""
+        return self.on_progress is not None
+
+    def report(self, current_step, total_steps):
+        """Forward a progress checkpoint to the caller, if anyone listens"""
+        if self.on_progress is not None:
+            self.on_progress(current_step, total_steps)
+
+    def mark_dirty(self, box):
+        """Record that box = (x0, y0, x1, y1) of the canvas has changed"""
+        self.dirty = union_boxes(self.dirty, box)
+
+    def take_dirty(self):
+        """Return the canvas box changed since the last call, or None"""
+        box, self.dirty = self.dirty, None
+        if box is None:
+            return None
+        x0, y0 = max(0, box[0]), max(0, box[1])
+        x1, y1 = min(self.width, box[2]), min(self.height, box[3])
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def play(self, strokes, step_base=0, total_steps=None):
+        """Rasterize a StrokeList onto the canvas, paced by the scheduler
+
+        Headless runs draw every stroke at once (in a few chunks when
+        checkpointing). Progressive runs draw frame by frame as the
+        scheduler allows and report after every frame that drew something,
+        with steps counted on top of step_base. A resumed render skips the
+        strokes its checkpoint already has on the canvas. Returns the
+        number of steps taken once drawing stops or finishes.
+        """
+        if total_steps is None:
+            total_steps = step_base + strokes.num_steps
+        if self.order == "coarse-to-fine":
+            strokes = coarse_to_fine(strokes, self.width, self.height, self.background)
+        layer = len(self.played)
+        self.played.append(strokes)
+
+        drawn = 0
+        if self.resume_at is not None:
+            resume_layer, drawn = self.resume_at
+            if layer < resume_layer:
+                return step_base + strokes.num_steps
+            self.resume_at = None
+        self.cursor = (layer, drawn)
+
+        if not self.progressive:
+            chunk = len(strokes)
+            if self.checkpointer is not None:
+                chunk = max(1, -(-len(strokes) // CHECKPOINT_CHUNKS))
+            while drawn < len(strokes) and self.should_continue():
+                count = min(chunk, len(strokes) - drawn)
+                self.mark_dirty(self.rasterizer.rasterize(self.pixels, strokes,
+                                                          slice(drawn, drawn + count)))
+                drawn += count
+                self.cursor = (layer, drawn)
+                if self.checkpointer is not None:
+                    self.checkpointer.tick(self)
+            return step_base + self.step_of(strokes, drawn)
+
+        scheduler = self.scheduler
+        clock = scheduler.clock
+        while drawn < len(strokes) and self.should_continue():
+            due = scheduler.due()
+            wanted = len(strokes) - drawn if due is None else min(due, len(strokes) - drawn)
+            first = drawn
+            count = scheduler.chunk(wanted)
+            while count and self.should_continue():
+                started = clock()
+                self.mark_dirty(self.rasterizer.rasterize(self.pixels, strokes,
+                                                          slice(drawn, drawn + count)))
+                scheduler.record(count, clock() - started)
+                drawn += count
+                wanted -= count
+                count = scheduler.chunk(wanted)
+            self.cursor = (layer, drawn)
+
+            if drawn > first:
+                self.report(step_base + self.step_of(strokes, drawn), total_steps)
+                if self.checkpointer is not None:
+                    self.checkpointer.tick(self)
+            if drawn < len(strokes):
+                scheduler.next_frame()
+
+        if not len(strokes) and self.should_continue():
+            self.report(step_base + strokes.num_steps, total_steps)
+        return step_base + self.step_of(strokes, drawn)
+
+    @staticmethod
+    def step_of(strokes, drawn):
+        """Steps completed once the first drawn strokes are on the canvas"""
+        if drawn >= len(strokes):
+            return strokes.num_steps
+        return int(strokes.steps[drawn])
+
+    def strokes(self):
+        """Every stroke list played so far, as one StrokeList (or None)"""
+        if not self.played:
+            return None
+        return StrokeList.concatenate(self.played)
+
+    def cached(self, compute, *key):
+        """Result of a preprocessing stage of the current source, from the cache
+
+        key names the stage and every parameter it depends on; compute is
+        only called when the cache has no result for it.
+        """
+        return self.preprocess_cache.get((self.source_key,) + key, compute)
+
+    def render(self, source_image, style, detail, resume=None):
+        """Draw source_image in the given style; returns the step count
+
+        resume is a Checkpoint of an earlier, stopped render to finish;
+        one made with other settings is ignored (see resumed). With a
+        checkpointer, a stopped render leaves a checkpoint behind and a
+        finished one removes it.
+        """
+        if style not in STYLES:
+            raise ValueError(f"Unknown drawing style: {style}")
+
+        # Convert PIL Image to numpy array for processing
+        img_array = np.array(source_image)
+        self.source_key = content_key(img_array)
+        self.settings = (self.source_key, style, round(float(detail), 6), self.seed,
+                         self.width, self.height, str(self.bg_color), self.backend,
+                         bool(self.antialias), self.order, ENGINE_VERSION)
+
+        self.resumed = resume is not None and resume.matches(self.settings)
+        if self.resumed:
+            # Same generator states give the same strokes; those already
+            # on the saved canvas are skipped by play()
+            self.rasterizer = get_backend(resume.backend, style, self.antialias)
+            self.rng.setstate(resume.rng_state)
+            self.np_rng.bit_generator.state = resume.np_rng_state
+            self.pixels[...] = resume.pixels
+            self.mark_dirty((0, 0, self.width, self.height))
+            self.resume_at = (resume.layer, resume.drawn)
+        else:
+            self.rasterizer = get_backend(self.backend, style, self.antialias)
+        self.initial_rng_state = (self.rng.getstate(), self.np_rng.bit_generator.state)
+        if self.scheduler is not None:
+            self.scheduler.start()
+
+        # Convert to grayscale for edge detection
+        if len(img_array.shape) == 3:  # Color image
+            gray = self.cached(lambda: cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY), "gray")
+        else:  # Already grayscale
+            gray = img_array
+
+        if style in ("realistic", "sketch", "contour"):
+            total_steps = getattr(self, "draw_" + style)(gray, detail)
+        else:
+            total_steps = getattr(self, "draw_" + style)(img_array, detail)
+
+        if self.checkpointer is not None:
+            if self.should_continue():
+                self.checkpointer.discard()
+            else:
+                self.checkpointer.save(self)
+        return total_steps
+
+    def checkpoint(self):
+        """Checkpoint of the render in progress, to pick it up later"""
+        layer, drawn = self.cursor
+        rng_state, np_rng_state = self.initial_rng_state
+        step = sum(strokes.num_steps for strokes in self.played[:layer])
+        if layer < len(self.played):
+            step += self.step_of(self.played[layer], drawn)
+        return Checkpoint(settings_key(self.settings), self.rasterizer.name, layer, drawn,
+                          step, rng_state, np_rng_state, self.pixels)
+
+    def draw_realistic(self, gray_img, detail):
+        """Draw in a realistic style using edge-based approaches"""
+        # Apply some blurring to reduce noise
+        blurred = self.cached(lambda: cv2.GaussianBlur(gray_img, (5, 5), 0), "gaussian", 5)
+
+        # Edge detection
+        edges = self.cached(lambda: cv2.Canny(blurred, 30, 100), "canny", "gaussian", 5, 30, 100)
+
+        # Find contours in the edge image, sorted by size (to draw more
+        # significant features first)
+        contours = self.cached(lambda: find_contours(edges, cv2.RETR_LIST, by_area=True),
+                               "contours", "gaussian", 5, 30, 100, "list", "area")
+
+        # Limit number of contours based on detail level
+        max_contours = max(10, int(len(contours) * detail))
+        contours = contours[:max_contours]
+
+        # Draw tone first (base layer)
+        tone_step = max(1, int((101 - detail * 100) / 10))
+        hatches = hatch_strokes(gray_img, tone_step, rng=self.np_rng)
+
+        # Update progress counter
+        total_steps = len(contours) + hatches.num_steps
+
+        # Draw shading with lines, rasterized in batches of grid points
+        current_step = self.play(hatches, total_steps=total_steps)
+
+        # Draw contours for edges, skipping about half of the segments for
+        # the look of varying pen pressure
+        if self.should_continue():
+            edges = contour_segments(contours, self.np_rng, drop=0.5)
+            self.play(edges, step_base=current_step, total_steps=total_steps)
+
+        return total_steps
+
+    def draw_sketch(self, gray_img, detail):
+        """Draw in a sketchy style with rough lines"""
+        # Edge detection with different thresholds for sketch effect
+        edges = self.cached(lambda: cv2.Canny(gray_img, 20, 80), "canny", 20, 80)
+
+        # Find contours in the edge image
+        contours = self.cached(lambda: find_contours(edges, cv2.RETR_LIST),
+                               "contours", 20, 80, "list")
+
+        # Limit contours based on detail level
+        max_contours = max(10, int(len(contours) * detail))
+        chosen = self.np_rng.permutation(len(contours))[:max_contours]
+        selected_contours = [contours[i] for i in chosen]
+
+        # Draw each contour 1-3 times with jittered points for a sketchy
+        # look; about half of the segments are skipped (pen pressure)
+        passes = self.np_rng.integers(1, 4, size=len(selected_contours))
+        lines = contour_segments(selected_contours, self.np_rng, passes=passes,
+                                 jitter=2, drop=0.5)
+
+        self.play(lines)
+
+        return len(selected_contours)
+
+    def draw_contour(self, gray_img, detail):
+        """Draw only the main contours/outlines of the image"""
+        # Apply bilateral filter to reduce noise while keeping edges sharp
+        blurred = self.cached(lambda: cv2.bilateralFilter(gray_img, 9, 75, 75),
+                              "bilateral", 9, 75, 75)
+
+        # Edge detection with higher threshold for cleaner lines
+        edges = self.cached(lambda: cv2.Canny(blurred, 50, 150),
+                            "canny", "bilateral", 9, 75, 75, 50, 150)
+
+        # Find contours, sorted by size (to draw more significant features first)
+        contours = self.cached(lambda: find_contours(edges, cv2.RETR_EXTERNAL, by_area=True),
+                               "contours", "bilateral", 9, 75, 75, 50, 150, "external", "area")
+
+        # Limit number of contours based on detail level
+        max_contours = max(5, int(len(contours) * detail))
+        contours = contours[:max_contours]
+
+        # Clean contours, one step each
+        strokes = StrokeBuilder()
+        for step, contour in enumerate(contours):
+            # Simplify contour based on detail level
+            epsilon = (1.1 - detail) * 0.01 * cv2.arcLength(contour, True)
+            approx = cv2.approxPolyDP(contour, epsilon, True).reshape(-1, 2)
+
+            # Close the contour if we have enough points
+            if len(approx) > 2:
+                closed = np.vstack([approx, approx[:1]])
+
+                # Draw the contour as one solid polyline
+                strokes.add(LINE, closed.tolist(), (0, 0, 0), width=2, step=step)
+
+        self.play(strokes.build(len(contours)))
+        return len(contours)
+
+    def draw_pointillist(self, img_array, detail):
+        """Draw using dots/points like pointillism"""
+        height, width = img_array.shape[:2]
+
+        # Calculate point density based on detail level
+        # Higher detail = more points
+        point_step = max(1, int((101 - detail * 100) / 5))
+
+        # Dot centres on the sampling grid, in row-major drawing order
+        grid_y, grid_x = np.mgrid[0:height:point_step, 0:width:point_step]
+        grid_y = grid_y.ravel()
+        grid_x = grid_x.ravel()
+        total_steps = len(grid_x)
+
+        # Colour at each centre, channel-reversed as the style always has
+        samples = img_array[grid_y, grid_x]
+        if samples.ndim == 1:  # Grayscale
+            colors = np.repeat(samples[:, None], 3, axis=1)
+        else:  # Color image
+            colors = samples[:, 2::-1]
+
+        # Vary point size based on brightness (darker = larger points)
+        brightness = colors.mean(axis=1)
+        max_radius = 3
+        radii = np.maximum(1, (max_radius * (1 - brightness / 255)).astype(np.intp))
+
+        # Add some randomness to point placement
+        jitter = self.np_rng.integers(-2, 3, size=(2, total_steps))
+        xs = grid_x + jitter[0]
+        ys = grid_y + jitter[1]
+
+        # One dot per step, revealed a hundred at a time
+        dots = StrokeList.discs(xs, ys, radii, colors, np.arange(total_steps), total_steps)
+        self.play(dots)
+        return total_steps
+
+    def draw_cubist(self, img_array, detail):
+        """Draw in a cubist style with geometric shapes"""
+        height, width = img_array.shape[:2]
+
+        # Number of polygons based on detail level, scaled up with the
+        # image area so large sources are covered as densely as small ones
+        area_scale = max(1.0, height * width / REFERENCE_AREA)
+        num_polygons = min(MAX_CUBIST_POLYGONS, int((50 + 450 * detail) * area_scale))
+
+        # Random polygon size based on detail, and random position
+        sizes = self.np_rng.integers(10, max(11, int(30 * detail)) + 1, size=num_polygons)
+        xs = (self.np_rng.random(num_polygons) * (np.maximum(width - sizes, 0) + 1)).astype(np.intp)
+        ys = (self.np_rng.random(num_polygons) * (np.maximum(height - sizes, 0) + 1)).astype(np.intp)
+
+        # Average color of every region from one summed-area table
+        table = self.cached(lambda: integral_image(img_array), "integral")
+        means = box_means(table, xs, ys, xs + sizes, ys + sizes)
+        if means.shape[1] >= 3:  # Color image, channel-reversed as always
+            colors = means[:, 2::-1].astype(np.intp)
+        else:  # Grayscale
+            colors = np.repeat(means[:, :1], 3, axis=1).astype(np.intp)
+
+        # Polygons with 3-5 points inside their size x size box
+        num_points = self.np_rng.integers(3, 6, size=num_polygons)
+        corners = self.np_rng.integers(0, sizes[:, None, None] + 1, size=(num_polygons, 5, 2))
+        corners += np.stack([xs, ys], axis=1)[:, None, :]
+
+        # One filled polygon per step, using the first num_points corners
+        used = np.arange(5)[None, :] < num_points[:, None]
+        polygons = StrokeList(np.full(num_polygons, POLYGON, dtype=np.uint8),
+                              (np.cumsum(num_points) - num_points).astype(np.int64),
+                              num_points.astype(np.int32),
+                              colors.astype(np.uint8),
+                              np.zeros(num_polygons, dtype=np.int32),
+                              np.arange(num_polygons, dtype=np.int32),
+                              corners[used].astype(np.int32), num_polygons)
+        self.play(polygons)
+        return num_polygons
+
+    def draw_abstract(self, img_array, detail):
+        """Draw in an abstract style with flowing lines and shapes"""
+        height, width = img_array.shape[:2]
+
+        # Generate random curves and shapes based on image colors
+        num_elements = int(20 + 180 * detail)
+
+        # Flowing lines that follow color changes, one element per step
+        strokes = StrokeBuilder()
+        for step in range(num_elements):
+            # Random starting point
+            x = self.rng.randint(0, width - 1)
+            y = self.rng.randint(0, height - 1)
+
+            # Get color at this point
+            if len(img_array.shape) == 3:  # Color image
+                b, g, r = (int(c) for c in img_array[y, x])
+                color = (r, g, b)
+
+                # Modify color for artistic effect
+                hue_shift = self.rng.randint(-20, 20)
+                r = max(0, min(255, r + hue_shift))
+                g = max(0, min(255, g + hue_shift))
+                b = max(0, min(255, b + hue_shift))
+                color = (r, g, b)
+            else:  # Grayscale
+                v = int(img_array[y, x])
+                color = (v, v, v)
+
+            # Decide what type of element to draw
+            element_type = self.rng.choice(['curve', 'circle', 'line'])
+
+            if element_type == 'curve':
+                # Create a flowing curve
+                points = [(x, y)]
+
+                # Generate a path that follows similar colors
+                num_segments = self.rng.randint(5, 15)
+                for _ in range(num_segments):
+                    # Move in a somewhat random direction
+                    angle = self.rng.uniform(0, 2 * 3.14159)
+                    distance = self.rng.randint(5, 20)
+                    new_x = int(x + distance * np.cos(angle))
+                    new_y = int(y + distance * np.sin(angle))
+
+                    # Keep within bounds
+                    new_x = max(0, min(width - 1, new_x))
+                    new_y = max(0, min(height - 1, new_y))
+
+                    points.append((new_x, new_y))
+                    x, y = new_x, new_y
+
+                # Draw a smooth curve through the points
+                if len(points) > 1:
+                    strokes.add(LINE, points, color, width=self.rng.randint(1, 3), step=step)
+
+            elif element_type == 'circle':
+                # Draw a circle or ellipse
+                radius = self.rng.randint(5, 25)
+                strokes.add(ELLIPSE, [(x - radius, y - radius), (x + radius, y + radius)],
+                            color, width=self.rng.randint(1, 3), step=step)
+
+            else:  # line
+                # Draw a straight line in a random direction
+                angle = self.rng.uniform(0, 2 * 3.14159)
+                length = self.rng.randint(20, 80)
+                end_x = int(x + length * np.cos(angle))
+                end_y = int(y + length * np.sin(angle))
+
+                # Keep within bounds
+                end_x = max(0, min(width - 1, end_x))
+                end_y = max(0, min(height - 1, end_y))
+
+                strokes.add(LINE, [(x, y), (end_x, end_y)], color,
+                            width=self.rng.randint(1, 3), step=step)
+
+        self.play(strokes.build(num_elements))
+        return num_elements
+
+    def draw_flow(self, img_array, detail):
+        """Draw flowing lines that follow the edges and color changes"""
+        height, width = img_array.shape[:2]
+        if len(img_array.shape) == 3:  # Color image
+            gray = self.cached(lambda: cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY), "gray")
+            rgb = img_array[:, :, :3]
+        else:  # Grayscale
+            gray = img_array
+            rgb = img_array[:, :, None].repeat(3, axis=2)
+
+        # Particle count based on detail level and image area; longer lines
+        # at higher detail
+        area_scale = max(1.0, height * width / REFERENCE_AREA)
+        num_particles = min(MAX_FLOW_PARTICLES, int((1000 + 19000 * detail) * area_scale))
+        steps = 10 + int(20 * detail)
+
+        # Seed particles at random and advect them all through the field
+        xs = self.np_rng.random(num_particles, dtype=np.float32) * (width - 1)
+        ys = self.np_rng.random(num_particles, dtype=np.float32) * (height - 1)
+        field = self.cached(lambda: flow_field(gray, sigma=4.0), "flow field", 4.0)
+        px, py, alive = trace_streamlines(field, xs, ys, steps)
+
+        # Color of the starting point, shifted a little for artistic effect
+        colors = rgb[np.rint(ys).astype(np.intp), np.rint(xs).astype(np.intp)].astype(np.int32)
+        colors += self.np_rng.integers(-20, 21, size=(num_particles, 1))
+        colors = np.clip(colors, 0, 255).astype(np.uint8)
+
+        lines = streamline_segments(px, py, alive, colors)
+        self.play(lines)
+
+        return num_particles
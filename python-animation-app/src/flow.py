@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+from strokes import StrokeList
+
+
+def flow_field(gray_img, sigma=4.0):
+    """Unit vectors along the local edge direction of a grayscale image
+
+    The Sobel gradients are combined into a structure tensor, smoothed
+    with a Gaussian of the given sigma so the field varies gently, and the
+    tensor's minor eigenvector is taken: the direction in which the image
+    changes least, i.e. along edges and colour boundaries. Returns float32
+    (vx, vy) arrays the size of the image.
+    """
+    gray = gray_img.astype(np.float32)
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+
+    jxx = cv2.GaussianBlur(gx * gx, (0, 0), sigma)
+    jxy = cv2.GaussianBlur(gx * gy, (0, 0), sigma)
+    jyy = cv2.GaussianBlur(gy * gy, (0, 0), sigma)
+
+    # Gradient orientation, turned a quarter so lines run along the edges
+    angle = 0.5 * np.arctan2(2 * jxy, jxx - jyy) + np.float32(np.pi / 2)
+    return np.cos(angle), np.sin(angle)
+
+
+def trace_streamlines(field, xs, ys, steps, step_size=1.5):
+    """Advect particles through a flow field, all at once
+
+    Every particle takes steps midpoint (RK2) steps of step_size pixels,
+    sampling the field at the nearest pixel. The field is an orientation
+    rather than a direction, so each sample is flipped to agree with the
+    particle's previous heading. Particles stop where they leave the
+    image. Returns (px, py, alive) arrays of shape (particles, steps + 1);
+    alive marks the positions reached before stopping.
+    """
+    vx, vy = field
+    height, width = vx.shape
+    count = len(xs)
+
+    px = np.empty((count, steps + 1), dtype=np.float32)
+    py = np.empty((count, steps + 1), dtype=np.float32)
+    alive = np.ones((count, steps + 1), dtype=bool)
+    px[:, 0] = xs
+    py[:, 0] = ys
+
+    def sample(x, y, heading_x, heading_y):
+        col = np.clip(np.rint(x).astype(np.intp), 0, width - 1)
+        row = np.clip(np.rint(y).astype(np.intp), 0, height - 1)
+        dx = vx[row, col]
+        dy = vy[row, col]
+        flip = np.where(dx * heading_x + dy * heading_y < 0, -1, 1).astype(np.float32)
+        return dx * flip, dy * flip
+
+    x = px[:, 0].copy()
+    y = py[:, 0].copy()
+    heading_x = np.ones(count, dtype=np.float32)
+    heading_y = np.zeros(count, dtype=np.float32)
+    running = np.ones(count, dtype=bool)
+    for step in range(1, steps + 1):
+        dx, dy = sample(x, y, heading_x, heading_y)
+        mx = x + 0.5 * step_size * dx
+        my = y + 0.5 * step_size * dy
+        heading_x, heading_y = sample(mx, my, dx, dy)
+        x = x + step_size * heading_x
+        y = y + step_size * heading_y
+
+        running &= (x >= 0) & (x <= width - 1) & (y >= 0) & (y <= height - 1)
+        px[:, step] = x
+        py[:, step] = y
+        alive[:, step] = running
+
+    return px, py, alive
+
+
+def streamline_segments(px, py, alive, colors):
+    """Turn traced streamlines into segment strokes, one step per particle"""
+    count, points = px.shape
+    x = np.rint(px).astype(np.int32)
+    y = np.rint(py).astype(np.int32)
+
+    # A segment joins consecutive positions the particle actually reached
+    joined = alive[:, 1:].ravel()
+    starts = np.flatnonzero(joined)
+    particle = starts // (points - 1)
+    first = particle * points + starts % (points - 1)
+
+    x = x.ravel()
+    y = y.ravel()
+    return StrokeList.segments(x[first], y[first], x[first + 1], y[first + 1],
+                               np.asarray(colors, dtype=np.uint8)[particle], particle, count)
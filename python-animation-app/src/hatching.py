@@ -0,0 +1,41 @@
+import numpy as np
+
+from strokes import StrokeList
+
+
+def hatch_strokes(gray_img, step, rng=None, threshold=200, max_length=5):
+    """Build one short shading stroke per dark grid point of gray_img
+
+    Grid points are taken every step pixels in raster order and each one is
+    a step of the returned StrokeList. Points darker than threshold get
+    a stroke in their own gray value whose length grows with darkness (1 to
+    max_length + 1 pixels) at a random angle in [0, pi). rng is a numpy
+    Generator; pass a seeded one for repeatable output.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    grid = gray_img[::step, ::step]
+    grid_width = grid.shape[1]
+    cells = np.flatnonzero(grid.ravel() < threshold)
+    values = grid.ravel()[cells]
+
+    # Grid coordinates from the flat cell index, in 32-bit arithmetic
+    cells32 = cells.astype(np.int32)
+    y = cells32 // grid_width * step
+    x = cells32 % grid_width * step
+
+    # Make line length proportional to darkness (table lookup per gray level)
+    darkness = 255 - np.arange(256)
+    length_table = (darkness / 255 * max_length).astype(np.int32) + 1
+    length = length_table[values]
+
+    # Single precision is plenty for angles of strokes a few pixels long
+    angle = rng.random(len(cells), dtype=np.float32) * np.float32(3.14)
+
+    # Truncate towards zero like int() on the scalar end points
+    x1 = (x + length * np.cos(angle)).astype(np.int32)
+    y1 = (y + length * np.sin(angle)).astype(np.int32)
+
+    colors = np.repeat(values[:, None], 3, axis=1)
+    return StrokeList.segments(x, y, x1, y1, colors, cells, grid.size)
@@ -0,0 +1,172 @@
+import hashlib
+import zlib
+
+import numpy as np
+
+
+# Side of the square tiles the canvas is split into, in pixels
+DEFAULT_TILE = 64
+
+# Memory the stored tiles and tile maps may use before snapshots are thinned out
+DEFAULT_MAX_BYTES = 64 << 20
+
+
+class CanvasHistory:
+    """Snapshots of a canvas as it is drawn, for undo and scrubbing
+
+    The canvas is cut into tile x tile squares. A snapshot is a map from
+    tile position to tile id, and the tiles themselves are stored once
+    each, keyed by a digest of their pixels: a snapshot only adds the tiles
+    that changed since the previous one, and a tile that comes back (the
+    blank background, a region redrawn the same) is shared. Memory
+    therefore grows with the area drawn rather than with the number of
+    snapshots; with compress the tiles are also zlib-compressed.
+
+    When the tiles and maps outgrow max_bytes, every other snapshot
+    between the first and the latest is dropped (repeatedly, if need be),
+    freeing the tiles nothing else refers to. That keeps the history spread
+    evenly over the whole drawing, only at a coarser grain.
+
+    restore() rebuilds a snapshot from the one restored before it, copying
+    only the tiles whose ids differ, so scrubbing to a nearby snapshot is
+    cheap. The history is not thread-safe; the GUI keeps it on the Tk
+    main loop.
+    """
+
+    def __init__(self, pixels, tile=DEFAULT_TILE, compress=False, max_bytes=DEFAULT_MAX_BYTES):
+        self.tile = tile
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.height, self.width = pixels.shape[:2]
+        self.rows = -(-self.height // tile)
+        self.columns = -(-self.width // tile)
+        self.reset(pixels)
+
+    def reset(self, pixels):
+        """Forget every snapshot and start again from pixels"""
+        self.canvas = np.array(pixels, dtype=np.uint8)
+        self.tiles = []  # tile id -> stored bytes, None once freed
+        self.ids = {}  # (shape, digest) -> tile id
+        self.keys = []  # tile id -> (shape, digest)
+        self.refs = np.zeros(0, dtype=np.int64)
+        self.free = []
+        self.tile_bytes = 0
+        self.maps = []
+        self.labels = []
+        self.view = None
+        self.view_map = None
+
+        tiles = np.empty((self.rows, self.columns), dtype=np.int32)
+        for row in range(self.rows):
+            for column in range(self.columns):
+                tiles[row, column] = self._intern(row, column)
+        self._append(tiles, 0)
+
+    def __len__(self):
+        return len(self.maps)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the stored tiles and the snapshots' tile maps"""
+        return self.tile_bytes + sum(tiles.nbytes for tiles in self.maps)
+
+    def record(self, box, patch, label=None):
+        """Paint patch at box = (x0, y0, x1, y1) and snapshot the result
+
+        Only the tiles under box are looked at. Returns False, taking no
+        snapshot, if none of them actually changed.
+        """
+        x0, y0, x1, y1 = box
+        self.canvas[y0:y1, x0:x1] = patch
+        size = self.tile
+        tiles = self.maps[-1].copy()
+        for row in range(y0 // size, -(-y1 // size)):
+            for column in range(x0 // size, -(-x1 // size)):
+                tiles[row, column] = self._intern(row, column)
+        if np.array_equal(tiles, self.maps[-1]):
+            return False
+        self._append(tiles, label)
+        if self.nbytes > self.max_bytes:
+            self._thin()
+        return True
+
+    def restore(self, index):
+        """The canvas as it was at snapshot index, as a new (H, W, 3) array"""
+        tiles = self.maps[index]
+        if self.view is None:
+            self.view = np.empty_like(self.canvas)
+            changed = np.ones(tiles.shape, dtype=bool)
+        else:
+            changed = tiles != self.view_map
+        size = self.tile
+        for row, column in zip(*np.nonzero(changed)):
+            y = row * size
+            x = column * size
+            self.view[y:y + size, x:x + size] = self._pixels(tiles[row, column])
+        self.view_map = tiles
+        return self.view.copy()
+
+    def truncate(self, index):
+        """Drop every snapshot after index, making it the latest (undo)"""
+        while len(self.maps) > index + 1:
+            self._release(self.maps.pop())
+            self.labels.pop()
+        self.canvas = self.restore(index)
+
+    def _append(self, tiles, label):
+        """Add a snapshot with tile map tiles"""
+        np.add.at(self.refs, tiles.ravel(), 1)
+        self.maps.append(tiles)
+        self.labels.append(label)
+
+    def _release(self, tiles):
+        """Let go of a dropped snapshot's tiles, freeing those left unused"""
+        np.subtract.at(self.refs, tiles.ravel(), 1)
+        for tile_id in np.unique(tiles[self.refs[tiles] == 0]):
+            self.tile_bytes -= len(self.tiles[tile_id])
+            del self.ids[self.keys[tile_id]]
+            self.tiles[tile_id] = None
+            self.free.append(int(tile_id))
+
+    def _thin(self):
+        """Drop every other snapshot between the first and the latest until within budget"""
+        while self.nbytes > self.max_bytes and len(self.maps) > 2:
+            dropped = range(len(self.maps) - 2, 0, -2)
+            for index in dropped:
+                self._release(self.maps.pop(index))
+                self.labels.pop(index)
+        # The view may show tiles that have just been freed
+        self.view_map = None if self.view_map is None else np.full_like(self.view_map, -1)
+
+    def _intern(self, row, column):
+        """Id of the canvas tile at (row, column), storing it if it is new"""
+        size = self.tile
+        tile = self.canvas[row * size:(row + 1) * size, column * size:(column + 1) * size]
+        data = tile.tobytes()
+        key = (tile.shape, hashlib.blake2b(data, digest_size=16).digest())
+        tile_id = self.ids.get(key)
+        if tile_id is not None:
+            return tile_id
+
+        if self.compress:
+            data = zlib.compress(data, 1)
+        if self.free:
+            tile_id = self.free.pop()
+            self.tiles[tile_id] = data
+            self.keys[tile_id] = key
+        else:
+            tile_id = len(self.tiles)
+            self.tiles.append(data)
+            self.keys.append(key)
+            if tile_id >= len(self.refs):
+                self.refs = np.concatenate([self.refs, np.zeros(max(tile_id, 64), dtype=np.int64)])
+        self.ids[key] = tile_id
+        self.tile_bytes += len(data)
+        return tile_id
+
+    def _pixels(self, tile_id):
+        """The pixels of a stored tile"""
+        data = self.tiles[tile_id]
+        if self.compress:
+            data = zlib.decompress(data)
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.keys[tile_id][0])
@@ -0,0 +1,135 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import tempfile
+
+from PIL import Image
+
+from engine import fitted_size
+from result_cache import disk_budget
+
+
+# Where fitted sources are kept unless a directory is given
+DEFAULT_THUMBNAIL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "python-animation-app",
+                                     "thumbnails")
+
+# Disk space the thumbnail cache may use before the least recently used go
+DEFAULT_THUMBNAIL_BYTES = 128 << 20
+
+# Images decoded ahead of the batch renderer, and threads decoding them
+DEFAULT_PREFETCH = 4
+DEFAULT_PREFETCH_THREADS = 2
+
+# Decode and shrink by whole factors down to this multiple of the target
+# size, and resample with LANCZOS from there (as Image.thumbnail does)
+_REDUCING_GAP = 2.0
+
+_SUFFIX = ".png"
+
+
+def decode_fitted(path, width, height):
+    """Decode the image at path fitted to width x height, ready to draw from
+
+    The same size and mode as engine.prepare_source of the full image, but
+    a JPEG is decoded straight at the smallest DCT scale (1/2 to 1/8) that
+    stays twice the target size, and other formats are shrunk by whole
+    factors before the LANCZOS resample, so a large photo is never decoded
+    or filtered at full resolution.
+    """
+    with Image.open(path) as img:
+        size = fitted_size(img.size, width, height)
+        img.draft(None, (int(size[0] * _REDUCING_GAP), int(size[1] * _REDUCING_GAP)))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        return img.resize(size, Image.LANCZOS, reducing_gap=_REDUCING_GAP)
+
+
+def thumbnail_key(path, width, height):
+    """Cache key of path fitted to width x height; changes whenever the file does"""
+    info = os.stat(path)
+    fields = (os.path.abspath(path), info.st_mtime_ns, info.st_size, int(width), int(height))
+    return hashlib.sha256(repr(fields).encode()).hexdigest()
+
+
+class ThumbnailCache:
+    """Fitted sources on disk, keyed by file path, modification time and size
+
+    Entries are lossless PNGs at <directory>/<key[:2]>/<key>.png, written
+    to a temporary file and renamed into place so other processes never
+    read half an entry. Hits refresh the modification time, and the least
+    recently used entries are removed once the directory outgrows
+    max_bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_THUMBNAIL_DIR, max_bytes=DEFAULT_THUMBNAIL_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + _SUFFIX)
+
+    def get(self, key):
+        """Return the cached image for key, or None on a miss"""
+        path = self.path(key)
+        try:
+            with Image.open(path) as img:
+                img.load()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return img
+
+    def put(self, key, img):
+        """Store a fitted source under key"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(handle, "wb") as temp_file:
+                img.save(temp_file, "PNG", compress_level=1)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        disk_budget(self.directory, self.max_bytes, _SUFFIX).stored(size)
+
+
+def load_source(path, width, height, cache=None):
+    """The image at path fitted to width x height, from cache when it has it"""
+    if cache is None:
+        return decode_fitted(path, width, height)
+    key = thumbnail_key(path, width, height)
+    img = cache.get(key)
+    if img is None:
+        img = decode_fitted(path, width, height)
+        cache.put(key, img)
+    return img
+
+
+def prefetch_sources(paths, width, height, cache=None, ahead=DEFAULT_PREFETCH,
+                     threads=DEFAULT_PREFETCH_THREADS):
+    """Yield (path, future of load_source) for paths in order, loading ahead
+
+    Up to ahead images are being loaded or waiting at any time, on a pool
+    of threads (decoding releases the GIL), so the consumer rarely waits
+    and memory stays at ahead images however many paths there are. A
+    failed load raises from its future's result().
+    """
+    paths = iter(paths)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append((path, pool.submit(load_source, path, width, height, cache)))
+            if len(pending) >= ahead:
+                break
+        while pending:
+            item = pending.popleft()
+            for path in paths:
+                pending.append((path, pool.submit(load_source, path, width, height, cache)))
+                break
+            yield item
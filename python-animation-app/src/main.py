@@ -16,10 +16,12 @@ def main():
     
     duration = float(input("Enter the duration for the animation (in seconds): "))
     delay = float(input("Enter the delay between animations (in seconds): "))
+    output_path = input("Enter the output file (.mp4 or .gif): ").strip() or "animation.mp4"
     
     # Create and render the animation
     animator.create_animation(image_paths, effects, duration, delay)
-    animator.render_animation()
+    frames = animator.render_animation(output_path)
+    print(f"Saved {frames} frames to {output_path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,13 @@
 from dataclasses import dataclass
 from typing import List, Tuple
 
-@dataclass
+@dataclass(slots=True)
 class AnimationConfig:
     duration: float
     delay: float
     effects: List[str]
 
-@dataclass
+@dataclass(slots=True)
 class ImageData:
     file_path: str
     position: Tuple[int, int]
@@ -0,0 +1,94 @@
+import numpy as np
+
+from strokes import DISC
+
+
+# Orders a style's strokes can be revealed in: the style's own, or one
+# that previews the whole picture early
+ORDERS = ("natural", "coarse-to-fine")
+
+# Cells across the longer canvas side at the coarsest pyramid level
+_COARSEST_CELLS = 4
+
+# Importance left to a stroke drawn in the background colour itself
+_MIN_CONTRAST = 0.1
+
+
+def stroke_boxes(strokes):
+    """Boxes (x0, y0, x1, y1) of every stroke's points, grown by its width"""
+    starts = strokes.starts
+    xs = strokes.points[:, 0]
+    ys = strokes.points[:, 1]
+    # Discs store their radius as the width, lines their full width
+    pad = np.where(strokes.kinds == DISC, strokes.widths, strokes.widths // 2)
+    return (np.minimum.reduceat(xs, starts) - pad, np.minimum.reduceat(ys, starts) - pad,
+            np.maximum.reduceat(xs, starts) + pad, np.maximum.reduceat(ys, starts) + pad)
+
+
+def pyramid_levels(xs, ys, weights, width, height):
+    """Level of detail of each anchor point in a quadtree over the canvas
+
+    Level 0 cuts the canvas into cells _COARSEST_CELLS across, and every
+    level halves the cell size. Going from coarse to fine, each cell keeps
+    the heaviest anchor not already placed at a coarser level, so every
+    level adds about one anchor per cell, evenly over the canvas. Anchors
+    left after the one-pixel level all go to the last level.
+    """
+    count = len(xs)
+    levels = np.empty(count, dtype=np.intp)
+    remaining = np.argsort(-weights, kind="stable")
+    cell = max(width, height) / _COARSEST_CELLS
+    level = 0
+    while len(remaining) and cell >= 1:
+        size = int(np.ceil(cell))
+        columns = -(-width // size)
+        cells = (ys[remaining] // size) * columns + xs[remaining] // size
+        # np.unique returns the first, i.e. heaviest, anchor of each cell
+        _, first = np.unique(cells, return_index=True)
+        levels[remaining[first]] = level
+        remaining = np.delete(remaining, first)
+        cell /= 2
+        level += 1
+    levels[remaining] = level
+    return levels
+
+
+def coarse_to_fine(strokes, width, height, background):
+    """Reorder strokes so that any prefix previews the whole drawing
+
+    Strokes stay grouped in the steps the style reveals them in (a flow
+    line, a contour, a dot). Each step is weighted by its size (the longer
+    side of its box) times its contrast with the background, and placed in
+    a pyramid_levels order of its box centre: large, high-contrast steps
+    spread over the whole canvas come first and small, faint detail last.
+    Within a level heavier steps come first. Step numbers are reassigned
+    in the new order, so progress still counts up to num_steps.
+    """
+    if len(strokes) < 2:
+        return strokes
+    steps = strokes.steps
+    group_starts = np.flatnonzero(np.r_[True, steps[1:] != steps[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(steps)])
+
+    x0, y0, x1, y1 = stroke_boxes(strokes)
+    x0 = np.minimum.reduceat(x0, group_starts)
+    y0 = np.minimum.reduceat(y0, group_starts)
+    x1 = np.maximum.reduceat(x1, group_starts)
+    y1 = np.maximum.reduceat(y1, group_starts)
+    size = np.maximum(x1 - x0, y1 - y0) + 1
+
+    difference = np.abs(strokes.colors.astype(np.int16) - np.asarray(background, dtype=np.int16))
+    contrast = np.add.reduceat(difference.sum(axis=1), group_starts) / (group_sizes * 3 * 255.0)
+    weights = size * (_MIN_CONTRAST + contrast)
+
+    xs = np.clip((x0 + x1) // 2, 0, width - 1)
+    ys = np.clip((y0 + y1) // 2, 0, height - 1)
+    levels = pyramid_levels(xs, ys, weights, width, height)
+    group_order = np.lexsort((-weights, levels))
+
+    # Expand the group order into stroke indices, group by group
+    sizes = group_sizes[group_order]
+    offsets = np.cumsum(sizes) - sizes
+    order = np.repeat(group_starts[group_order] - offsets, sizes) + np.arange(len(steps))
+    new_steps = np.repeat(steps[group_starts], sizes)
+    return strokes.take(order, steps=new_steps)
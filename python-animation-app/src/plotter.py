@@ -0,0 +1,429 @@
+import math
+import time
+
+import numpy as np
+
+from strokes import DISC, ELLIPSE, LINE, POLYGON
+
+
+# Segments approximating a disc or ellipse outline
+_CIRCLE_SEGMENTS = 24
+
+# End points per grid cell the spatial index aims for
+_POINTS_PER_CELL = 2
+
+# Rings of cells searched around a query before scanning every point left
+_MAX_RING = 4
+
+# Nearby paths tried as 2-opt partners of each path, and the most end
+# points of one cell considered when looking for them
+_NEIGHBORS = 8
+_CELL_CAPACITY = 6
+
+# Longest run of paths a 2-opt move may reverse, as reversing takes time
+# in proportion to the run
+_MAX_RUN = 50000
+
+# File types export_plot writes
+PLOT_FORMATS = ("svg", "gcode")
+
+# Default G-code: millimetres, absolute coordinates, pen lifted on Z
+GCODE_HEADER = ("G21", "G90")
+GCODE_PEN_UP = "G0 Z5"
+GCODE_PEN_DOWN = "G1 Z0 F1000"
+
+
+def stroke_paths(strokes):
+    """Polylines a pen plotter draws for a StrokeList, as (k, 2) float arrays
+
+    LINE strokes that continue where the previous one ended (contour
+    styles emit their lines as runs of two-point segments) are joined
+    back into one polyline, so the pen stays down along them. POLYGON
+    strokes become closed outlines and DISC and ELLIPSE strokes polygons
+    around their outline; plotters draw a single pen, so colours and
+    widths are dropped.
+    """
+    if len(strokes) == 0:
+        return []
+    kinds = strokes.kinds
+    starts = strokes.starts
+    counts = strokes.counts
+    points = strokes.points.astype(np.float64)
+    lines = kinds == LINE
+
+    # Line strokes chained to the previous one lose their shared first point
+    first = strokes.points[starts]
+    last = strokes.points[starts + counts - 1]
+    joined = np.zeros(len(strokes), dtype=bool)
+    joined[1:] = lines[1:] & lines[:-1] & (first[1:] == last[:-1]).all(axis=1)
+
+    paths = []
+    line_starts = np.flatnonzero(lines & ~joined)
+    if len(line_starts):
+        # Every point of every line stroke, minus the shared ones
+        keep = np.zeros(len(points), dtype=bool)
+        line_points = np.repeat(starts[lines], counts[lines]) + _ranges(counts[lines])
+        keep[line_points] = True
+        keep[starts[joined]] = False
+        # A path runs from its first stroke up to the next path's first stroke
+        path_begins = np.zeros(len(points), dtype=bool)
+        path_begins[starts[line_starts]] = True
+        path_of_point = np.cumsum(path_begins)
+        kept = np.flatnonzero(keep)
+        boundaries = np.flatnonzero(np.diff(path_of_point[kept])) + 1
+        paths.extend(part for part in np.split(points[kept], boundaries) if len(part) > 1)
+
+    for index in np.flatnonzero(~lines).tolist():
+        shape = points[starts[index]:starts[index] + counts[index]]
+        if kinds[index] == POLYGON:
+            paths.append(np.vstack([shape, shape[:1]]))
+        elif kinds[index] == DISC:
+            radius = float(strokes.widths[index])
+            paths.append(_ellipse(shape[0, 0], shape[0, 1], radius, radius))
+        elif kinds[index] == ELLIPSE:
+            (x0, y0), (x1, y1) = shape
+            paths.append(_ellipse((x0 + x1) / 2, (y0 + y1) / 2, (x1 - x0) / 2, (y1 - y0) / 2))
+    return paths
+
+
+def _ranges(counts):
+    """0..count-1 for every count, concatenated"""
+    offsets = np.cumsum(counts) - counts
+    return np.arange(int(counts.sum())) - np.repeat(offsets, counts)
+
+
+def _ellipse(cx, cy, rx, ry):
+    """Closed polygon around an ellipse outline"""
+    angles = np.linspace(0, 2 * math.pi, _CIRCLE_SEGMENTS + 1)
+    return np.stack([cx + rx * np.cos(angles), cy + ry * np.sin(angles)], axis=1)
+
+
+def path_ends(paths):
+    """(n, 2, 2) array of each path's first and last point"""
+    ends = np.empty((len(paths), 2, 2))
+    for index, path in enumerate(paths):
+        ends[index, 0] = path[0]
+        ends[index, 1] = path[-1]
+    return ends
+
+
+def travel_distance(ends, order, flipped, origin=(0.0, 0.0)):
+    """Pen-up distance to draw the paths in order, starting from origin
+
+    flipped[p] means path p is drawn from its last point to its first.
+    """
+    if len(order) == 0:
+        return 0.0
+    side = flipped[order].astype(np.intp)
+    entries = ends[order, side]
+    exits = ends[order, 1 - side]
+    previous = np.vstack([np.asarray(origin, dtype=np.float64)[None], exits[:-1]])
+    return float(np.hypot(*(entries - previous).T).sum())
+
+
+class EndpointGrid:
+    """Uniform grid over points for nearest-neighbour queries
+
+    Points are bucketed into square cells sized for about
+    _POINTS_PER_CELL points each, and the grid has a border of empty
+    cells so ring searches need no bounds checks. nearest() searches
+    rings of cells around the query and skips removed points, scanning
+    every remaining point directly once the rings grow large (late in a
+    greedy chain, when most cells are empty). neighbors() answers
+    k-nearest queries for all points at once from the 3 x 3 block of
+    cells around each.
+    """
+
+    def __init__(self, points, origin=(0.0, 0.0)):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.coordinates = self.points.tolist()
+        corners = np.vstack([self.points, np.asarray(origin, dtype=np.float64)[None]])
+        self.low = corners.min(axis=0)
+        extent = np.maximum(corners.max(axis=0) - self.low, 1.0)
+        self.cell = max(1.0, math.sqrt(extent[0] * extent[1] * _POINTS_PER_CELL
+                                       / max(1, len(self.points))))
+        self.columns = int(extent[0] // self.cell) + 1
+        self.rows = int(extent[1] // self.cell) + 1
+        self.stride = self.columns + 2 * _MAX_RING
+        self.rings = [[dy * self.stride + dx
+                       for dy in range(-ring, ring + 1) for dx in range(-ring, ring + 1)
+                       if max(abs(dx), abs(dy)) == ring]
+                      for ring in range(_MAX_RING + 1)]
+
+        self.cell_ids = self.cell_of(self.points)
+        self.members = [[] for _ in range(self.stride * (self.rows + 2 * _MAX_RING))]
+        for index, cell in enumerate(self.cell_ids.tolist()):
+            self.members[cell].append(index)
+        self.alive = np.ones(len(self.points), dtype=bool)
+        self.remaining = len(self.points)
+        self.pool = np.arange(len(self.points))
+
+    def cell_of(self, points):
+        """Cell id of every point"""
+        ij = ((points - self.low) // self.cell).astype(np.int64)
+        np.clip(ij[:, 0], 0, self.columns - 1, out=ij[:, 0])
+        np.clip(ij[:, 1], 0, self.rows - 1, out=ij[:, 1])
+        return (ij[:, 1] + _MAX_RING) * self.stride + ij[:, 0] + _MAX_RING
+
+    def remove(self, index):
+        """Take point index out of further nearest() answers"""
+        if self.alive[index]:
+            self.alive[index] = False
+            self.remaining -= 1
+            self.members[self.cell_ids[index]].remove(index)
+
+    def nearest(self, x, y):
+        """Index of the remaining point closest to (x, y), or -1 if none is left"""
+        if self.remaining == 0:
+            return -1
+        coordinates = self.coordinates
+        members = self.members
+        column = min(max(int((x - self.low[0]) // self.cell), 0), self.columns - 1)
+        row = min(max(int((y - self.low[1]) // self.cell), 0), self.rows - 1)
+        base = (row + _MAX_RING) * self.stride + column + _MAX_RING
+        best = -1
+        best_distance = math.inf
+        for ring, offsets in enumerate(self.rings):
+            for offset in offsets:
+                for index in members[base + offset]:
+                    px, py = coordinates[index]
+                    distance = (px - x) * (px - x) + (py - y) * (py - y)
+                    if distance < best_distance:
+                        best, best_distance = index, distance
+            # Points beyond this ring are at least ring cells away
+            if best >= 0 and best_distance <= (ring * self.cell) ** 2:
+                return best
+        return self._scan(x, y)
+
+    def _scan(self, x, y):
+        """nearest() by checking every remaining point"""
+        if 4 * self.remaining < 3 * len(self.pool):
+            self.pool = self.pool[self.alive[self.pool]]
+        candidates = self.pool[self.alive[self.pool]]
+        offsets = self.points[candidates] - (x, y)
+        return int(candidates[np.argmin(np.einsum("ij,ij->i", offsets, offsets))])
+
+    def neighbors(self, k):
+        """(m, k) indices of about the k nearest other points of every point
+
+        Only the 3 x 3 cells around a point and at most _CELL_CAPACITY
+        points per cell are considered, so this is approximate in crowded
+        cells; missing neighbours are -1.
+        """
+        count = len(self.points)
+        order = np.argsort(self.cell_ids, kind="stable")
+        sorted_cells = self.cell_ids[order]
+        first = np.searchsorted(sorted_cells, sorted_cells)
+        rank = np.arange(count) - first
+        table = np.full((len(self.members), _CELL_CAPACITY), -1, dtype=np.int64)
+        kept = rank < _CELL_CAPACITY
+        table[sorted_cells[kept], rank[kept]] = order[kept]
+
+        blocks = [table[self.cell_ids + dy * self.stride + dx]
+                  for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+        candidates = np.concatenate(blocks, axis=1)
+
+        offsets = self.points[candidates] - self.points[:, None]
+        distance = np.einsum("ijk,ijk->ij", offsets, offsets)
+        distance[(candidates < 0) | (candidates == np.arange(count)[:, None])] = np.inf
+        k = min(k, candidates.shape[1])
+        nearest = np.argpartition(distance, k - 1, axis=1)[:, :k]
+        chosen = np.take_along_axis(candidates, nearest, axis=1)
+        chosen[np.take_along_axis(distance, nearest, axis=1) == np.inf] = -1
+        return chosen
+
+
+def greedy_order(ends, origin=(0.0, 0.0)):
+    """Chain paths by always moving to the closest unused path end
+
+    Returns (order, flipped): a path entered at its last point is drawn
+    reversed.
+    """
+    count = len(ends)
+    grid = EndpointGrid(ends.reshape(-1, 2), origin)
+    coordinates = grid.coordinates
+    order = np.empty(count, dtype=np.intp)
+    flipped = np.zeros(count, dtype=bool)
+    x, y = origin
+    for position in range(count):
+        path, side = divmod(grid.nearest(x, y), 2)
+        grid.remove(2 * path)
+        grid.remove(2 * path + 1)
+        order[position] = path
+        flipped[path] = side == 1
+        x, y = coordinates[2 * path + 1 - side]
+    return order, flipped
+
+
+def two_opt(ends, order, flipped, origin=(0.0, 0.0), max_passes=10, time_limit=None):
+    """Improve a path order with 2-opt moves between nearby path ends
+
+    A move reverses a run of the order (drawing each path in it the other
+    way round), which replaces the two pen-up jumps around the run: the
+    ends of the paths before and at the end of the run become neighbours,
+    as do the starts of the run's first path and of the path after it.
+    Only moves that pair each path end with one of its nearest other ends
+    (from the spatial index) are tried. Each pass prices all of them at
+    once with array arithmetic, then applies the improving ones best
+    first, re-pricing each against the order as it stands by then. Works
+    in place on order and flipped; stops after a pass without
+    improvement, after max_passes passes, or once time_limit seconds
+    have passed.
+    """
+    count = len(order)
+    if count < 3:
+        return order, flipped
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    points = ends.reshape(-1, 2)
+    neighbors = EndpointGrid(points, origin).neighbors(_NEIGHBORS)
+    origin = np.asarray(origin, dtype=np.float64)
+    ends_of = np.repeat(np.arange(2 * count), neighbors.shape[1])
+    others = neighbors.ravel()
+    valid = others >= 0
+    ends_of, others = ends_of[valid], others[valid]
+    path, partner = ends_of // 2, others // 2
+    keep = path != partner
+    ends_of, others, path, partner = ends_of[keep], others[keep], path[keep], partner[keep]
+
+    position = np.empty(count, dtype=np.intp)
+    position[order] = np.arange(count)
+
+    coordinates = points.tolist()
+    home = (float(origin[0]), float(origin[1]))
+
+    def gains(a, b):
+        # Travel saved by reversing positions a + 1 .. b, for arrays a and b
+        # (rows are positions shifted by one, so -1, the origin, is row 0)
+        side = flipped[order].astype(np.intp)
+        starts = np.vstack([origin[None], points[2 * order + side]])
+        exits = np.vstack([origin[None], points[2 * order + 1 - side]])
+        end_a, start_run, end_b = exits[a + 1], starts[a + 2], exits[b + 1]
+        start_next = starts[np.minimum(b + 2, count)]
+        delta = np.hypot(*(end_a - end_b).T) - np.hypot(*(end_a - start_run).T)
+        delta += np.where(b + 1 < count, np.hypot(*(start_run - start_next).T)
+                          - np.hypot(*(end_b - start_next).T), 0.0)
+        return -delta
+
+    def point(index, leaving):
+        # Where the path at this position of the order ends (or starts)
+        if index < 0:
+            return home
+        path = order[index]
+        return coordinates[2 * path + (leaving != flipped[path])]
+
+    def gain(a, b):
+        # gains() of a single move against the order as it is now
+        ax, ay = point(a, True)
+        sx, sy = point(a + 1, False)
+        bx, by = point(b, True)
+        delta = math.hypot(ax - bx, ay - by) - math.hypot(ax - sx, ay - sy)
+        if b + 1 < count:
+            nx, ny = point(b + 1, False)
+            delta += math.hypot(sx - nx, sy - ny) - math.hypot(bx - nx, by - ny)
+        return -delta
+
+    def move(end, other):
+        # The run a move pairing these two ends reverses, or None
+        first, second = end // 2, other // 2
+        leaving = end % 2 != flipped[first]
+        if (other % 2 != flipped[second]) != leaving:
+            return None
+        a, b = sorted((position[first], position[second]))
+        if not leaving:
+            a, b = a - 1, b - 1
+        return (a, b) if a + 1 < b else None
+
+    for _ in range(max_passes):
+        leaving = ends_of % 2 != flipped[path]
+        matched = (others % 2 != flipped[partner]) == leaving
+        a = np.minimum(position[path], position[partner]) - ~leaving
+        b = np.maximum(position[path], position[partner]) - ~leaving
+        candidates = np.flatnonzero(matched & (a + 1 < b) & (b - a <= _MAX_RUN))
+        saved = gains(a[candidates], b[candidates])
+        better = saved > 1e-9
+        candidates = candidates[better][np.argsort(-saved[better])]
+        if len(candidates) == 0:
+            break
+
+        for index in candidates.tolist():
+            run = move(ends_of[index], others[index])
+            if run is None:
+                continue
+            a, b = run
+            if b - a > _MAX_RUN or gain(a, b) <= 1e-9:
+                continue
+            moved = order[a + 1:b + 1][::-1].copy()
+            order[a + 1:b + 1] = moved
+            position[moved] = np.arange(a + 1, b + 1)
+            flipped[moved] = ~flipped[moved]
+            if deadline is not None and time.perf_counter() > deadline:
+                return order, flipped
+    return order, flipped
+
+
+def optimize_paths(paths, origin=(0.0, 0.0), time_limit=None):
+    """Order paths for a pen plotter to cut pen-up travel
+
+    Greedy nearest-end chaining (with reversal) followed by 2-opt. Returns
+    the reordered (and where useful reversed) paths and the pen-up travel
+    before and after, in the paths' units.
+    """
+    if not paths:
+        return [], 0.0, 0.0
+    ends = path_ends(paths)
+    before = travel_distance(ends, np.arange(len(paths)), np.zeros(len(paths), dtype=bool), origin)
+    order, flipped = greedy_order(ends, origin)
+    two_opt(ends, order, flipped, origin, time_limit=time_limit)
+    after = travel_distance(ends, order, flipped, origin)
+    ordered = [paths[path][::-1] if flipped[path] else paths[path] for path in order.tolist()]
+    return ordered, before, after
+
+
+def write_svg(file_path, paths, width, height, stroke_width=1):
+    """Write paths as SVG polylines on a width x height page"""
+    with open(file_path, "w") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                  f'viewBox="0 0 {width} {height}">\n'
+                  f'<g fill="none" stroke="black" stroke-width="{stroke_width}" '
+                  'stroke-linecap="round" stroke-linejoin="round">\n')
+        for path in paths:
+            coordinates = " ".join(f"{x:.6g},{y:.6g}" for x, y in path.tolist())
+            out.write(f'<polyline points="{coordinates}"/>\n')
+        out.write("</g>\n</svg>\n")
+
+
+def write_gcode(file_path, paths, height, scale=0.25, feed_rate=3000,
+                pen_up=GCODE_PEN_UP, pen_down=GCODE_PEN_DOWN, header=GCODE_HEADER):
+    """Write paths as G-code for a pen plotter
+
+    Coordinates are scaled by scale millimetres per pixel and flipped so
+    the image's top edge is the far side of the bed (G-code y grows
+    upwards). The pen is lifted with pen_up for every jump between paths
+    and lowered with pen_down at the start of each.
+    """
+    with open(file_path, "w") as out:
+        out.write("\n".join(header) + "\n" + pen_up + "\n")
+        for path in paths:
+            plotted = path * (scale, -scale) + (0.0, height * scale)
+            (x, y), rest = plotted[0], plotted[1:]
+            out.write(f"G0 X{x:.3f} Y{y:.3f}\n{pen_down}\n")
+            out.write("".join(f"G1 X{x:.3f} Y{y:.3f} F{feed_rate}\n" for x, y in rest.tolist()))
+            out.write(pen_up + "\n")
+        out.write("G0 X0 Y0\n")
+
+
+def export_plot(strokes, file_stem, formats, width, height, time_limit=None):
+    """Write strokes as travel-optimized plotter files <file_stem>.<format>
+
+    Returns the pen-up travel in pixels before and after optimizing.
+    """
+    paths, before, after = optimize_paths(stroke_paths(strokes), time_limit=time_limit)
+    for file_format in formats:
+        if file_format == "svg":
+            write_svg(file_stem + ".svg", paths, width, height)
+        elif file_format == "gcode":
+            write_gcode(file_stem + ".gcode", paths, height)
+        else:
+            raise ValueError(f"Unknown plot format: {file_format}")
+    return before, after
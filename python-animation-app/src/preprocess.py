@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
+import numpy as np
+
+
+# Memory the shared preprocessing cache may hold
+DEFAULT_BUDGET = 256 << 20
+
+# Rough cost of a Python container entry, counted on top of array data
+_ENTRY_OVERHEAD = 100
+
+
+def content_key(array):
+    """Digest of an array's pixels, shape and type, for cache keys"""
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str((array.shape, array.dtype.str)).encode())
+    digest.update(array.data)
+    return digest.hexdigest()
+
+
+def result_size(value):
+    """Approximate bytes held by a cached result"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + _ENTRY_OVERHEAD
+    if isinstance(value, (tuple, list)):
+        return sum(result_size(item) for item in value) + _ENTRY_OVERHEAD
+    return _ENTRY_OVERHEAD
+
+
+def _freeze(value):
+    """Make cached arrays read-only so no caller can change them for the next"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _freeze(item)
+    return value
+
+
+class PreprocessCache:
+    """Least-recently-used cache of preprocessing results under a byte budget
+
+    Keys are tuples such as (content_key(source), "edges", 30, 100);
+    values are arrays or tuples of arrays (contour lists), which are made
+    read-only when stored. Results bigger than the whole budget are
+    returned without being kept. Safe to share between threads; two
+    threads missing the same key at once both compute it.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Return the cached result for key, calling compute() on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = _freeze(compute())
+        size = result_size(value)
+        if size > self.max_bytes:
+            return value
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (value, size)
+                self.used_bytes += size
+            while self.used_bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.used_bytes -= evicted
+        return value
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self.entries.clear()
+            self.used_bytes = 0
+
+
+# Process-wide cache shared by every DrawingEngine (all styles, GUI
+# redraws and the batch jobs a worker process runs)
+PREPROCESS_CACHE = PreprocessCache()
@@ -0,0 +1,173 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import traceback
+
+import numpy as np
+from PIL import Image
+
+from checkpoint import Checkpoint, Checkpointer
+from engine import DrawingEngine
+from result_cache import ResultCache, engine_result_key
+from scheduler import FrameScheduler
+from updates import UpdateBatch
+
+
+# Worker states kept in the last slot of the shared state array
+RUNNING, FINISHED, STOPPED, FAILED = range(4)
+
+
+def _render_worker(shm_name, shape, state, cancelled, source_image, style, detail,
+                   bg_color, seed, strokes_per_second, backend, order, cache_dir,
+                   checkpoint_path):
+    """Process entry point: render straight into the shared canvas"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+
+    def publish(progress=None, result=RUNNING):
+        # The strokes are already in the shared canvas; widen the shared
+        # dirty box under the lock the GUI reads with
+        box = engine.take_dirty()
+        with state.get_lock():
+            if box is not None:
+                x0, y0, x1, y1 = box
+                if state[3] == 0:
+                    state[1:5] = box
+                else:
+                    state[1:5] = [min(state[1], x0), min(state[2], y0),
+                                  max(state[3], x1), max(state[4], y1)]
+            if progress is not None:
+                state[0] = progress
+            state[5] = result
+
+    def on_progress(current_step, total_steps):
+        publish((current_step / total_steps) * 100)
+
+    engine = DrawingEngine(shape[1], shape[0], bg_color=bg_color, seed=seed,
+                           should_continue=lambda: not cancelled.is_set(),
+                           on_progress=on_progress, backend=backend,
+                           scheduler=FrameScheduler(strokes_per_second), order=order,
+                           checkpointer=checkpoint_path and Checkpointer(checkpoint_path),
+                           pixels=np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+    engine.mark_dirty((0, 0, shape[1], shape[0]))
+    result = FAILED
+    try:
+        resume = checkpoint_path and Checkpoint.load(checkpoint_path)
+        total_steps = engine.render(source_image, style, detail, resume=resume)
+        result = STOPPED if cancelled.is_set() else FINISHED
+        if result == FINISHED and cache_dir is not None:
+            ResultCache(cache_dir).put(engine_result_key(engine, style, detail),
+                                       engine.pixels, total_steps)
+    except Exception:
+        traceback.print_exc()
+    finally:
+        publish(100 if result == FINISHED else None, result)
+        engine.pixels = None  # the last view of the block, which close() needs gone
+        shm.close()
+
+
+class ProcessRender:
+    """Run a DrawingEngine render in a worker process
+
+    Stroke generation and rasterization hold the GIL, so a render thread
+    still stalls the Tk event loop on heavy styles. This moves the engine
+    into a separate (spawned) process. The canvas lives in a
+    multiprocessing.shared_memory block that both sides see as an
+    (H, W, 3) uint8 array: the worker's engine draws straight into it, and
+    the GUI reads changed regions straight out of it. Progress, the merged
+    dirty box and the worker state sit in a small shared array, the only
+    thing written under its lock; stopping goes through a shared event
+    rather than an attribute of the GUI.
+
+    drain() has the same contract as RenderUpdates.drain(), so the GUI
+    poller can treat both alike. The drawing is paced at strokes_per_second
+    (None: as fast as possible) by a FrameScheduler. Call close() once done to reap the process
+    and free the shared block; it returns the final canvas as an image.
+    With a cache_dir, a finished seeded drawing is also stored in the
+    ResultCache there. With a checkpoint_path the worker resumes from the
+    checkpoint there if it matches, and checkpoints there as it draws and
+    when cancelled.
+    """
+
+    def __init__(self, source_image, style, detail, width, height,
+                 bg_color="white", seed=None, strokes_per_second=None, backend="pil",
+                 order="natural", cache_dir=None, checkpoint_path=None):
+        context = multiprocessing.get_context("spawn")
+        shape = (height, width, 3)
+        self.shm = shared_memory.SharedMemory(create=True, size=height * width * 3)
+        self.canvas = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.canvas[...] = np.asarray(Image.new("RGB", (width, height), bg_color))
+        # progress, dirty box (x0, y0, x1, y1; x1 == 0 when clean), state
+        self.state = context.Array("d", 6)
+        self.cancelled = context.Event()
+        self.result = None
+        self.process = context.Process(
+            target=_render_worker,
+            args=(self.shm.name, shape, self.state, self.cancelled, source_image,
+                  style, detail, bg_color, seed, strokes_per_second, backend, order,
+                  cache_dir, checkpoint_path),
+            daemon=True)
+        self.process.start()
+
+    @property
+    def done(self):
+        """True once the worker has stopped, for whatever reason"""
+        return self.result is not None
+
+    def cancel(self):
+        """Ask the worker to stop at its next progress check"""
+        self.cancelled.set()
+
+    def drain(self):
+        """Take progress, the changed region and state changes (UI thread)"""
+        batch = UpdateBatch()
+        if self.shm is None:
+            return batch
+        # Checked first: a worker that exited has published its last state
+        alive = self.process.is_alive()
+        with self.state.get_lock():
+            progress, x0, y0, x1, y1, result = self.state[:]
+            self.state[0] = 0
+            self.state[1:5] = [0, 0, 0, 0]
+            if x1 > 0:
+                box = (int(x0), int(y0), int(x1), int(y1))
+                batch.frame = (box, Image.fromarray(self.canvas[box[1]:box[3], box[0]:box[2]]))
+        if progress > 0:
+            batch.progress = progress
+
+        if result == RUNNING and not alive:
+            result = FAILED  # killed without getting to report
+        if result != RUNNING and self.result is None:
+            self.result = int(result)
+            if result == FINISHED:
+                batch.status = "Drawing completed."
+                batch.events.append("finished")
+            elif result == FAILED:
+                batch.status = "Drawing failed."
+                batch.events.append("finished")
+        return batch
+
+    def snapshot(self):
+        """Copy of the canvas as it stands, as an RGB image"""
+        with self.state.get_lock():
+            return Image.fromarray(self.canvas.copy())
+
+    def close(self, timeout=None):
+        """Stop the worker if needed and free the shared canvas
+
+        Returns a copy of the final canvas as an RGB image.
+        """
+        if self.shm is None:
+            return None
+        self.cancel()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            # A killed worker may die holding the lock; copy without it
+            self.process.terminate()
+            self.process.join()
+            image = Image.fromarray(self.canvas.copy())
+        else:
+            image = self.snapshot()
+        del self.canvas
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        return image
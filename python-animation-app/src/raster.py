@@ -0,0 +1,350 @@
+from PIL import Image, ImageDraw
+import numpy as np
+
+from strokes import DISC, ELLIPSE, LINE, POLYGON
+
+
+_disc_cache = {}
+_segment_cache = {}
+
+# Segments rasterized per vectorized step in draw_segments
+_SEGMENT_CHUNK = 1 << 16
+
+# Longest segment (in pixels along its major axis) drawn from the offset table
+_TABLE_REACH = 16
+
+
+def disc_offsets(radius):
+    """Return (dy, dx) offsets of the pixels covered by a filled disc
+
+    The stamp is rasterized once with ImageDraw.ellipse so bulk-stamped dots
+    have exactly the shape of individually drawn ones.
+    """
+    offsets = _disc_cache.get(radius)
+    if offsets is None:
+        size = 2 * radius + 1
+        stamp = Image.new("L", (size, size), 0)
+        ImageDraw.Draw(stamp).ellipse([(0, 0), (size - 1, size - 1)], fill=255)
+        dy, dx = np.nonzero(np.asarray(stamp))
+        offsets = ((dy - radius).astype(np.int32), (dx - radius).astype(np.int32))
+        _disc_cache[radius] = offsets
+    return offsets
+
+
+def bounding_box(xs, ys, pad, width, height):
+    """Clip the bounding box of a point set (plus pad) to the canvas
+
+    Returns (x0, y0, x1, y1) with exclusive upper bounds, or None when the
+    points are empty or entirely off-canvas.
+    """
+    if len(xs) == 0:
+        return None
+    x0 = max(0, int(xs.min()) - pad)
+    y0 = max(0, int(ys.min()) - pad)
+    x1 = min(width, int(xs.max()) + pad + 1)
+    y1 = min(height, int(ys.max()) + pad + 1)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+def _paint_topmost(canvas, box, groups, colors, ordered=False, sparse=False):
+    """Paint pixel writes so the latest primitive wins at every pixel
+
+    groups yields (pixels, owners) arrays of local pixel indices inside box
+    and the index of the primitive writing each one; owners only has to
+    broadcast against pixels. Writes that should be dropped can point at
+    the sink index (the box area) instead of being filtered out. Within a
+    group owners must be non-decreasing in C order; plain fancy assignment
+    (last write wins) then keeps the latest, and np.maximum merges groups
+    without sorting all the writes. When ordered is true the groups
+    themselves come in owner order and are written straight into one map.
+
+    sparse says the writes cover only a small part of the box (a few
+    strokes spread over the canvas); ordered writes are then copied
+    straight onto the canvas instead of going through a box-sized map.
+    """
+    x0, y0, x1, y1 = box
+    area = (y1 - y0) * (x1 - x0)
+    colors = np.asarray(colors)
+    if ordered and sparse:
+        flat_canvas = canvas.reshape(-1, canvas.shape[2])
+        for pixels, owners in groups:
+            owners = np.broadcast_to(owners, pixels.shape)
+            keep = pixels != area
+            pixels = pixels[keep]
+            flat_canvas[(pixels // (x1 - x0) + y0) * canvas.shape[1] +
+                        pixels % (x1 - x0) + x0] = colors[owners[keep]]
+        return
+
+    top = np.full(area + 1, -1, dtype=np.int32)
+    group_top = top if ordered else np.empty_like(top)
+    for pixels, owners in groups:
+        if not ordered:
+            group_top.fill(-1)
+        group_top[pixels] = owners
+        if not ordered:
+            np.maximum(top, group_top, out=top)
+
+    painted = np.flatnonzero(top[:area] >= 0)
+    region = canvas[y0:y1, x0:x1]
+    flat = region.reshape(-1, canvas.shape[2])
+    flat[painted] = colors[top[painted]]
+    # Boxes narrower than the canvas reshape to a copy; write it back
+    if not np.may_share_memory(flat, canvas):
+        region[...] = flat.reshape(region.shape)
+
+
+def union_boxes(first, second):
+    """Smallest box covering two (x0, y0, x1, y1) boxes; None means empty"""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return (min(first[0], second[0]), min(first[1], second[1]),
+            max(first[2], second[2]), max(first[3], second[3]))
+
+
+def stamp_discs(canvas, xs, ys, radii, colors):
+    """Paint filled discs onto an (H, W, C) uint8 canvas in one pass
+
+    Discs are grouped by radius and stamped with a precomputed offset
+    table, so the work is a handful of NumPy operations per distinct radius
+    rather than one call per dot. Where discs overlap, the one later in the
+    input order wins, exactly as if they had been drawn one at a time.
+    Returns the canvas box that was touched, or None.
+    """
+    height, width = canvas.shape[:2]
+    box = bounding_box(xs, ys, int(radii.max()) if len(radii) else 0, width, height)
+    if box is None:
+        return None
+    x0, y0, x1, y1 = box
+    # 32-bit indices halve the memory traffic of the (dots, offsets) temporaries
+    xs = np.asarray(xs, dtype=np.int32)
+    ys = np.asarray(ys, dtype=np.int32)
+    order = np.arange(len(xs), dtype=np.int32)
+
+    def groups():
+        sink = (y1 - y0) * (x1 - x0)
+        for radius in np.unique(radii):
+            members = order[radii == radius]
+            dy, dx = disc_offsets(int(radius))
+            py = ys[members, None] + dy[None, :]
+            px = xs[members, None] + dx[None, :]
+            inside = (py >= y0) & (py < y1) & (px >= x0) & (px < x1)
+            yield (np.where(inside, (py - y0) * (x1 - x0) + (px - x0), sink),
+                   members[:, None])
+
+    _paint_topmost(canvas, box, groups(), colors)
+    return box
+
+
+def _walk_segments(dx, dy, k):
+    """Bresenham pixel offsets of segment vectors (dx, dy) at steps k
+
+    Returns (ox, oy) arrays of shape (segments, len(k)). The major axis
+    advances one pixel per step and the minor axis rounds half-way cases
+    towards the end point, which is what ImageDraw.line does for width 1.
+    Steps past the end of a segment repeat its end point, so padding
+    writes land on a pixel the segment paints anyway.
+    """
+    adx, ady = np.abs(dx)[:, None], np.abs(dy)[:, None]
+    steps = np.maximum(adx, ady)
+    span = 2 * np.maximum(steps, 1)
+    k = np.minimum(k, steps)
+    ox = np.sign(dx)[:, None] * ((2 * k * adx + steps) // span)
+    oy = np.sign(dy)[:, None] * ((2 * k * ady + steps) // span)
+    return ox, oy
+
+
+def _segment_table(reach):
+    """Offsets of every segment vector with |dx|, |dy| <= reach, cached"""
+    table = _segment_cache.get(reach)
+    if table is None:
+        vy, vx = np.mgrid[-reach:reach + 1, -reach:reach + 1].astype(np.int32)
+        k = np.arange(reach + 1, dtype=np.int32)[None, :]
+        table = _walk_segments(vx.ravel(), vy.ravel(), k)
+        _segment_cache[reach] = table
+    return table
+
+
+def draw_segments(canvas, x0, y0, x1, y1, colors):
+    """Draw 1-pixel line segments onto an (H, W, C) uint8 canvas in one pass
+
+    Segments are walked with the integer Bresenham steps ImageDraw.line
+    uses for width 1, as a (segments, steps) array padded to the longest
+    segment. Short segments (hatching, sketch jitter) look their offsets up
+    in a table keyed by segment vector instead of recomputing them. Later
+    segments win where they cross. Returns the canvas box that was touched,
+    or None.
+    """
+    height, width = canvas.shape[:2]
+    x0 = np.asarray(x0, dtype=np.int32)
+    y0 = np.asarray(y0, dtype=np.int32)
+    x1 = np.asarray(x1, dtype=np.int32)
+    y1 = np.asarray(y1, dtype=np.int32)
+    xs = np.concatenate([x0, x1])
+    ys = np.concatenate([y0, y1])
+    box = bounding_box(xs, ys, 0, width, height)
+    if box is None:
+        return None
+    bx0, by0, bx1, by1 = box
+    box_width = bx1 - bx0
+
+    # A segment with both ends on the canvas never leaves it, so the
+    # per-pixel bounds test is only needed for segments with an end off it
+    off_canvas = ((np.minimum(x0, x1) < 0) | (np.minimum(y0, y1) < 0) |
+                  (np.maximum(x0, x1) >= width) | (np.maximum(y0, y1) >= height))
+    sink = (by1 - by0) * box_width
+    reach = int(max(np.abs(x1 - x0).max(), np.abs(y1 - y0).max()))
+    if reach <= _TABLE_REACH:
+        table_x, table_y = _segment_table(reach)
+        table_delta = table_y * box_width + table_x
+
+    def groups():
+        # Walk the segments in cache-sized chunks to keep temporaries small
+        for start in range(0, len(x0), _SEGMENT_CHUNK):
+            part = slice(start, start + _SEGMENT_CHUNK)
+            sx, sy = x0[part, None], y0[part, None]
+            dx, dy = x1[part] - x0[part], y1[part] - y0[part]
+            base = (sy - by0) * box_width + (sx - bx0)
+            if reach <= _TABLE_REACH:
+                pixels = base + table_delta[(dy + reach) * (2 * reach + 1) + (dx + reach)]
+            else:
+                k = np.arange(reach + 1, dtype=np.int32)[None, :]
+                ox, oy = _walk_segments(dx, dy, k)
+                pixels = base + oy * box_width + ox
+
+            # Re-walk the few segments that leave the canvas with bounds tests
+            clipped = np.flatnonzero(off_canvas[part])
+            if len(clipped):
+                k = np.arange(pixels.shape[1], dtype=np.int32)[None, :]
+                ox, oy = _walk_segments(dx[clipped], dy[clipped], k)
+                px = sx[clipped] + ox
+                py = sy[clipped] + oy
+                inside = (py >= by0) & (py < by1) & (px >= bx0) & (px < bx1)
+                pixels[clipped] = np.where(inside, (py - by0) * box_width + (px - bx0), sink)
+
+            yield pixels, np.arange(start, start + len(dx), dtype=np.int32)[:, None]
+
+    # Few short strokes in a big box are cheaper to write directly
+    sparse = (canvas.flags.c_contiguous and
+              len(x0) * (reach + 1) < (by1 - by0) * box_width // 8)
+    _paint_topmost(canvas, box, groups(), colors, ordered=True, sparse=sparse)
+    return box
+
+
+def _line_segments(strokes, run):
+    """End points and colours of every segment of the width-1 LINE strokes[run]"""
+    starts = strokes.starts[run]
+    counts = strokes.counts[run]
+    first = int(starts[0])
+    if (counts == 2).all() and int(starts[-1]) - first == 2 * (len(starts) - 1):
+        # Plain segments laid end to end: view the points as (start, end) pairs
+        ends = strokes.points[first:first + 2 * len(starts)].reshape(-1, 2, 2)
+        return (ends[:, 0], ends[:, 1]), strokes.colors[run]
+
+    pieces = counts.astype(np.int64) - 1
+    pieces[pieces < 0] = 0
+    total = int(pieces.sum())
+    first = np.repeat(starts - (np.cumsum(pieces) - pieces), pieces) + np.arange(total)
+    ends = strokes.points[first], strokes.points[first + 1]
+    return ends, np.repeat(strokes.colors[run], pieces, axis=0)
+
+
+def strokes_box(canvas, strokes, run, extra=1):
+    """Canvas box that strokes[run] can touch, or None
+
+    The points' bounding box is grown by the widest line (or disc radius)
+    plus extra pixels and clipped to the canvas.
+    """
+    first = int(strokes.starts[run.start])
+    last = int(strokes.starts[run.stop - 1] + strokes.counts[run.stop - 1])
+    points = strokes.points[first:last]
+    pad = int(strokes.widths[run].max()) + extra
+    return bounding_box(points[:, 0], points[:, 1], pad, canvas.shape[1], canvas.shape[0])
+
+
+def _draw_with_pil(canvas, strokes, run):
+    """Draw strokes one by one with ImageDraw on patches of the canvas
+
+    A patch covers the strokes' points grown by the widest line, and
+    coordinates are shifted into it by whole pixels, so every primitive
+    comes out exactly as if it had been drawn on the full canvas. Strokes
+    spread thinly over a large area (a few cubist polygons) get a patch
+    each instead of one patch over all of them.
+    """
+    box = strokes_box(canvas, strokes, run)
+    if box is None:
+        return None
+    first = int(strokes.starts[run.start])
+    last = int(strokes.starts[run.stop - 1] + strokes.counts[run.stop - 1])
+    points = strokes.points[first:last]
+    pad = int(strokes.widths[run].max()) + 1
+
+    if run.stop - run.start > 1:
+        offsets = (strokes.starts[run] - first).astype(np.intp)
+        low = np.minimum.reduceat(points, offsets) - pad
+        high = np.maximum.reduceat(points, offsets) + pad + 1
+        covered = int(np.prod(high - low, axis=1).sum())
+        if covered * 4 < (box[2] - box[0]) * (box[3] - box[1]):
+            for stroke in range(run.start, run.stop):
+                _draw_with_pil(canvas, strokes, slice(stroke, stroke + 1))
+            return box
+
+    x0, y0, x1, y1 = box
+    patch = Image.fromarray(canvas[y0:y1, x0:x1])
+    draw = ImageDraw.Draw(patch)
+    local = (points - np.array([x0, y0], dtype=np.int32)).ravel().tolist()
+    for kind, start, count, color, size in zip(strokes.kinds[run].tolist(),
+                                               (2 * (strokes.starts[run] - first)).tolist(),
+                                               (2 * strokes.counts[run]).tolist(),
+                                               strokes.colors[run].tolist(),
+                                               strokes.widths[run].tolist()):
+        xy = local[start:start + count]
+        if kind == LINE:
+            draw.line(xy, fill=tuple(color), width=size)
+        elif kind == POLYGON:
+            draw.polygon(xy, fill=tuple(color), outline=None)
+        elif kind == ELLIPSE:
+            draw.ellipse(xy, outline=tuple(color), width=size)
+        else:  # DISC
+            cx, cy = xy
+            draw.ellipse([cx - size, cy - size, cx + size, cy + size], fill=tuple(color))
+    canvas[y0:y1, x0:x1] = np.asarray(patch)
+    return box
+
+
+def rasterize(canvas, strokes, part):
+    """Draw the slice part of a StrokeList onto an (H, W, 3) uint8 canvas
+
+    The slice is cut into runs of strokes that share a drawing method:
+    width-1 lines go to draw_segments, discs to stamp_discs, and everything
+    else (wide lines, polygons, ellipse outlines) to ImageDraw. Runs are
+    drawn in order, so later strokes still cover earlier ones. Returns the
+    canvas box that was touched, or None.
+    """
+    if part.stop <= part.start:
+        return None
+    kinds = strokes.kinds[part]
+    method = np.where((kinds == LINE) & (strokes.widths[part] <= 1), 0,
+                      np.where(kinds == DISC, 1, 2))
+    changes = np.flatnonzero(method[1:] != method[:-1]) + 1
+    bounds = [0] + changes.tolist() + [len(method)]
+
+    box = None
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        run = slice(part.start + lo, part.start + hi)
+        if method[lo] == 0:
+            (start, end), colors = _line_segments(strokes, run)
+            if len(colors) == 0:
+                continue
+            touched = draw_segments(canvas, start[:, 0], start[:, 1], end[:, 0], end[:, 1], colors)
+        elif method[lo] == 1:
+            centres = strokes.points[strokes.starts[run]]
+            touched = stamp_discs(canvas, centres[:, 0], centres[:, 1],
+                                  strokes.widths[run], strokes.colors[run])
+        else:
+            touched = _draw_with_pil(canvas, strokes, run)
+        box = union_boxes(box, touched)
+    return box
@@ -0,0 +1,270 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+from raster import union_boxes
+
+
+# Frames per second a recording is sampled at (GIF delays are whole
+# hundredths of a second, and players slow down anything under 2)
+DEFAULT_FPS = 25
+
+# Sampled frames waiting for the encoder; when it falls behind, samples
+# are skipped and their changes go out with the next one
+DEFAULT_QUEUE = 8
+
+# Seconds the finished drawing stays on screen at the end of a recording
+END_HOLD = 2.0
+
+# GIF palette index left transparent, for the unchanged pixels of a delta frame
+_TRANSPARENT = 255
+
+# Bits per channel of the colour lookup table from RGB to palette index
+_LUT_BITS = 5
+
+RECORD_FORMATS = (".gif", ".mp4")
+
+
+def uniform_palette():
+    """A 6 x 7 x 6 colour cube (252 colours), for recordings with no source image"""
+    levels = [np.linspace(0, 255, count).round() for count in (6, 7, 6)]
+    red, green, blue = np.meshgrid(*levels, indexing="ij")
+    return np.stack([red.ravel(), green.ravel(), blue.ravel()], axis=1).astype(np.uint8)
+
+
+def build_palette(image, background, colors=254):
+    """Up to colors colours for image (a colour cube if None), plus the background exactly"""
+    if image is None:
+        palette = uniform_palette()
+    else:
+        quantized = image.convert("RGB").quantize(colors)
+        palette = np.array(quantized.getpalette()[:3 * colors], dtype=np.uint8).reshape(-1, 3)
+    return np.vstack([palette, np.asarray(background, dtype=np.uint8)])
+
+
+def palette_lut(palette):
+    """Nearest palette index for every RGB colour, cut to _LUT_BITS per channel"""
+    cells = 1 << _LUT_BITS
+    step = 256 // cells
+    centres = np.arange(cells) * step + step // 2
+    grid = np.stack(np.meshgrid(centres, centres, centres, indexing="ij"), axis=-1).reshape(-1, 3)
+    palette = palette.astype(np.int32)
+    lut = np.empty(len(grid), dtype=np.uint8)
+    for start in range(0, len(grid), 4096):
+        block = grid[start:start + 4096, None, :] - palette[None, :, :]
+        lut[start:start + 4096] = np.argmin((block * block).sum(axis=2), axis=1)
+    # Colours in the palette itself always map to their own index
+    exact = palette >> (8 - _LUT_BITS)
+    lut.reshape(cells, cells, cells)[exact[:, 0], exact[:, 1], exact[:, 2]] = np.arange(len(palette))
+    return lut.reshape(cells, cells, cells)
+
+
+class GifWriter:
+    """Writes a GIF one changed rectangle at a time, never holding the frames
+
+    Every colour goes through one palette, fixed when the writer is
+    created, so a frame is converted by a table lookup instead of being
+    quantized again. The writer keeps the palette indices of the current
+    picture; a frame is cropped to the pixels whose index actually changed
+    and the rest of the crop is left transparent, which the GIF draws over
+    the previous frame. A frame is written when the next one arrives,
+    because only then is its delay known.
+    """
+
+    def __init__(self, path, pixels, palette):
+        self.file = open(path, "wb")
+        self.lut = palette_lut(palette)
+        self.indices = self.to_indices(pixels)
+
+        header_image = Image.new("P", (pixels.shape[1], pixels.shape[0]))
+        colors = np.zeros((256, 3), dtype=np.uint8)
+        colors[:len(palette)] = palette
+        header_image.putpalette(colors.tobytes())
+        header, _ = GifImagePlugin.getheader(header_image, info={"loop": 0, "optimize": False})
+        self.file.write(b"".join(header))
+        # The first frame is the whole starting picture
+        self.pending = (0.0, (0, 0), Image.fromarray(self.indices))
+
+    def to_indices(self, pixels):
+        """Palette indices of an RGB array"""
+        cells = pixels >> (8 - _LUT_BITS)
+        return self.lut[cells[..., 0], cells[..., 1], cells[..., 2]]
+
+    def write(self, when, box, patch):
+        """Show patch at box from when seconds into the recording"""
+        x0, y0, x1, y1 = box
+        new = self.to_indices(patch)
+        old = self.indices[y0:y1, x0:x1]
+        changed = new != old
+        if not changed.any():
+            return
+        rows = np.flatnonzero(changed.any(axis=1))
+        columns = np.flatnonzero(changed.any(axis=0))
+        top, bottom = rows[0], rows[-1] + 1
+        left, right = columns[0], columns[-1] + 1
+        frame = np.where(changed[top:bottom, left:right], new[top:bottom, left:right], _TRANSPARENT)
+        old[...] = new
+        self._flush(when)
+        self.pending = (when, (x0 + left, y0 + top), Image.fromarray(frame.astype(np.uint8)))
+
+    def close(self, when):
+        """Write the last frame, shown until when, and finish the file"""
+        self._flush(when)
+        self.file.write(b";")
+        self.file.close()
+
+    def _flush(self, until):
+        """Write the pending frame, shown until until seconds"""
+        if self.pending is None:
+            return
+        start, offset, image = self.pending
+        delay = max(2, round(until * 100) - round(start * 100))
+        for chunk in GifImagePlugin.getdata(image, offset, duration=delay * 10, disposal=1,
+                                            transparency=_TRANSPARENT):
+            self.file.write(chunk)
+        self.pending = None
+
+
+class VideoWriter:
+    """Streams frames at a constant rate to an imageio writer (MP4 and the like)
+
+    A frame due at a later slot than the next one repeats the current
+    picture until then, so the video plays at the speed it was drawn.
+    """
+
+    def __init__(self, path, pixels, fps):
+        import imageio
+
+        self.fps = fps
+        self.canvas = np.array(pixels, dtype=np.uint8)
+        self.writer = imageio.get_writer(path, fps=fps, macro_block_size=2)
+        self.count = 0
+
+    def write(self, when, box, patch):
+        """Show patch at box from when seconds into the recording"""
+        self._fill(round(when * self.fps))
+        x0, y0, x1, y1 = box
+        self.canvas[y0:y1, x0:x1] = patch
+
+    def close(self, when):
+        """Hold the last picture until when and finish the file"""
+        self._fill(max(round(when * self.fps), self.count + 1))
+        self.writer.close()
+
+    def _fill(self, slot):
+        """Append the current picture up to (not including) frame slot"""
+        while self.count < slot:
+            self.writer.append_data(self.canvas)
+            self.count += 1
+
+
+def open_writer(path, pixels, fps, palette_image=None):
+    """A GifWriter for a .gif path, else a VideoWriter, starting from pixels
+
+    Both take write(when, box, patch) calls in time order and a final
+    close(when), and neither holds more than the current picture.
+    """
+    if os.path.splitext(path)[1].lower() == ".gif":
+        return GifWriter(path, pixels, build_palette(palette_image, pixels[0, 0]))
+    return VideoWriter(path, pixels, fps)
+
+
+class Recorder:
+    """Records a drawing as it appears, to a GIF or a video, in the background
+
+    capture() is handed the regions of the canvas that changed, as the GUI
+    gets them, and paints them onto the recorder's own copy of the canvas.
+    Frames are sampled by tick(), which the owner calls every frame_time
+    seconds (the GUI does from a Tk after() loop): each tick copies the
+    region changed since the last frame into a bounded queue. An encoder
+    thread takes frames off the queue and writes them out, so drawing
+    never waits for encoding: if the queue is full the frame is skipped
+    and its region carried into the next one. Memory is two canvases and
+    the queue, however long the recording.
+
+    Each frame is stamped with the slot of the fps grid it was sampled in,
+    so the recording has a fixed frame rate and plays at the speed the
+    drawing was made, however irregularly the canvas changed; a tick that
+    comes late lands in a later slot and the frames in between repeat the
+    picture. A .gif path gets delta frames through one palette built from
+    palette_image (the picture being drawn, say); any other extension goes
+    to imageio, which needs the imageio-ffmpeg plugin for .mp4.
+    """
+
+    def __init__(self, path, pixels, fps=DEFAULT_FPS, palette_image=None,
+                 max_queue=DEFAULT_QUEUE, clock=time.perf_counter):
+        self.path = path
+        self.frame_time = 1.0 / fps
+        self.clock = clock
+        self.canvas = np.array(pixels, dtype=np.uint8)
+        self.dirty = None
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.error = None
+
+        self.writer = open_writer(path, self.canvas, fps, palette_image)
+
+        self.started = clock()
+        self.slot = 0
+        self.thread = threading.Thread(target=self._encode, daemon=True)
+        self.thread.start()
+
+    def capture(self, box, patch):
+        """Note that box = (x0, y0, x1, y1) of the canvas now shows patch"""
+        x0, y0, x1, y1 = box
+        self.canvas[y0:y1, x0:x1] = patch
+        self.dirty = union_boxes(self.dirty, box)
+
+    def tick(self):
+        """Sample a frame of what changed since the last one; call every frame_time"""
+        self._sample(block=False)
+
+    def close(self):
+        """Record what is left, finish the file and return the number of frames skipped
+
+        Raises whatever stopped the encoder, if anything did.
+        """
+        self._sample(block=True)
+        self.frames.put(((self.slot + 1) * self.frame_time + END_HOLD, None, None))
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.dropped
+
+    def _sample(self, block):
+        """Queue the region changed since the last frame, at the current slot"""
+        if self.dirty is None:
+            return
+        slot = max(round((self.clock() - self.started) / self.frame_time), self.slot + 1)
+        x0, y0, x1, y1 = self.dirty
+        frame = (slot * self.frame_time, self.dirty, self.canvas[y0:y1, x0:x1].copy())
+        try:
+            self.frames.put(frame, block=block)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.dirty = None
+        self.slot = slot
+
+    def _encode(self):
+        """Encoder thread: write queued frames until the end marker"""
+        while True:
+            when, box, patch = self.frames.get()
+            if self.error is not None:
+                # Keep draining so capture() and close() never block
+                if box is None:
+                    return
+                continue
+            try:
+                if box is None:
+                    self.writer.close(when)
+                    return
+                self.writer.write(when, box, patch)
+            except Exception as error:
+                self.error = error
+                if box is None:
+                    return
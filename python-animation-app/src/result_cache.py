@@ -0,0 +1,203 @@
+import hashlib
+import os
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+
+from engine import ENGINE_VERSION
+from strokes import StrokeList
+
+
+# Where finished drawings are kept unless a directory is given
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "python-animation-app", "drawings")
+
+# Disk space the cache may use before the least recently used entries go
+DEFAULT_CACHE_BYTES = 512 << 20
+
+_SUFFIX = ".npz"
+
+# Share of its budget a cache is trimmed to once it outgrows it, so the
+# next directory walk is many stores away
+_EVICT_TO = 0.9
+
+
+def result_key(source_key, style, detail, seed, width, height, bg_color="white", backend="pil",
+               antialias=False, order="natural"):
+    """Cache key of a finished drawing, or None when it can't be reproduced
+
+    source_key is preprocess.content_key of the source pixels. Drawings
+    without a seed are random and never cached.
+    """
+    if seed is None:
+        return None
+    fields = (source_key, style, round(float(detail), 6), int(seed), int(width), int(height),
+              str(bg_color), backend, bool(antialias), order, ENGINE_VERSION)
+    return hashlib.sha256(repr(fields).encode()).hexdigest()
+
+
+def evict_lru(directory, max_bytes, suffix, keep_bytes=None):
+    """Remove the least recently modified files ending in suffix under
+    directory if they outgrow max_bytes, until the rest fit in keep_bytes
+    (max_bytes by default); returns the bytes left
+
+    Shared by the on-disk caches, which refresh an entry's modification
+    time on every hit. This walks the whole directory; stores go through
+    DiskBudget, which only calls it once the cache is over budget.
+    """
+    entries = []
+    total = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not name.endswith(suffix):
+                continue
+            path = os.path.join(root, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue  # removed by another process meanwhile
+            entries.append((info.st_mtime, info.st_size, path))
+            total += info.st_size
+    if total <= max_bytes:
+        return total
+
+    keep_bytes = max_bytes if keep_bytes is None else keep_bytes
+    entries.sort()
+    for _, size, path in entries:
+        if total <= keep_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+    return total
+
+
+class DiskBudget:
+    """Running total of the bytes an on-disk cache holds, evicting past max_bytes
+
+    The directory is walked once, at the first store, and each later
+    store just adds its size. Only when the total passes max_bytes is it
+    walked again (evict_lru), trimming the least recently used entries
+    down to _EVICT_TO of the budget, so a batch of n stores walks the
+    directory a handful of times rather than n. Stores made by other
+    processes are counted at that walk, so a cache shared between
+    processes can overshoot by what they stored since. Use disk_budget()
+    to get the one budget a process keeps per cache directory.
+    """
+
+    def __init__(self, directory, max_bytes, suffix):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.total = None
+        self.lock = threading.Lock()
+
+    def stored(self, size):
+        """Account for an entry of size bytes just written, evicting if over budget"""
+        with self.lock:
+            if self.total is None:
+                # First store: the walk counts the new entry too
+                self.total = evict_lru(self.directory, self.max_bytes, self.suffix,
+                                       int(self.max_bytes * _EVICT_TO))
+                return
+            self.total += size
+            if self.total > self.max_bytes:
+                self.total = evict_lru(self.directory, self.max_bytes, self.suffix,
+                                       int(self.max_bytes * _EVICT_TO))
+
+
+# DiskBudget of each (directory, max_bytes, suffix) in this process
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def disk_budget(directory, max_bytes, suffix):
+    """The process-wide DiskBudget of a cache directory"""
+    key = (os.path.abspath(directory), max_bytes, suffix)
+    with _budgets_lock:
+        budget = _budgets.get(key)
+        if budget is None:
+            budget = _budgets[key] = DiskBudget(directory, max_bytes, suffix)
+        return budget
+
+
+def engine_result_key(engine, style, detail):
+    """result_key of what engine drew (after render) from its source"""
+    return result_key(engine.source_key, style, detail, engine.seed, engine.width,
+                      engine.height, bg_color=engine.bg_color, backend=engine.rasterizer.name,
+                      antialias=engine.antialias, order=engine.order)
+
+
+class ResultCache:
+    """Content-addressed store of finished canvases on disk
+
+    Each entry is one compressed .npz holding the canvas, the step count
+    and optionally the stroke list, at <directory>/<key[:2]>/<key>.npz.
+    Entries are written to a temporary file and renamed into place, so
+    readers in other processes see either the whole entry or none; a
+    missing or unreadable entry is just a miss. Hits refresh the file's
+    modification time, and stores are counted against the directory's
+    DiskBudget, which removes the oldest entries once it outgrows
+    max_bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + _SUFFIX)
+
+    def get(self, key, with_strokes=False):
+        """Return (pixels, steps, strokes) for key, or None on a miss
+
+        strokes is None unless with_strokes is set and the entry has them.
+        """
+        if key is None:
+            return None
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                pixels = entry["pixels"]
+                steps = int(entry["steps"])
+                strokes = None
+                if with_strokes and "strokes_kinds" in entry.files:
+                    strokes = StrokeList.from_arrays(
+                        {name[len("strokes_"):]: entry[name]
+                         for name in entry.files if name.startswith("strokes_")})
+            os.utime(path)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+        return pixels, steps, strokes
+
+    def put(self, key, pixels, steps, strokes=None):
+        """Store a finished canvas (and optionally its StrokeList) under key"""
+        if key is None:
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {"pixels": np.asarray(pixels), "steps": np.array(steps)}
+        if strokes is not None:
+            arrays.update({"strokes_" + name: column
+                           for name, column in strokes.to_arrays().items()})
+
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(handle, "wb") as temp_file:
+                np.savez_compressed(temp_file, **arrays)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        disk_budget(self.directory, self.max_bytes, _SUFFIX).stored(size)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its budget"""
+        evict_lru(self.directory, self.max_bytes, _SUFFIX)
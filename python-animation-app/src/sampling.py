@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+
+def integral_image(img_array):
+    """Summed-area table of an image, one (H + 1, W + 1, C) plane per channel
+
+    Entry [y, x] holds the sum of img_array[:y, :x], so the sum over any
+    rectangle takes four lookups however large the rectangle is. Sums are
+    32-bit and wrap around on big images; box_means differences them as
+    uint32, which is exact modulo 2**32 and so covers any box of up to 16
+    million 8-bit pixels at half the memory of a float64 table.
+    """
+    table = cv2.integral(np.ascontiguousarray(img_array), sdepth=cv2.CV_32S)
+    if table.ndim == 2:
+        table = table[:, :, None]
+    return table.view(np.uint32)
+
+
+def box_means(table, x0, y0, x1, y1):
+    """Per-channel mean of img[y0:y1, x0:x1] for arrays of boxes
+
+    Boxes are clipped to the image; returns a (boxes, C) float array.
+    Empty boxes come back as zeros.
+    """
+    height, width = table.shape[0] - 1, table.shape[1] - 1
+    x0 = np.clip(x0, 0, width)
+    x1 = np.clip(x1, 0, width)
+    y0 = np.clip(y0, 0, height)
+    y1 = np.clip(y1, 0, height)
+    sums = table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+    area = ((x1 - x0) * (y1 - y0)).astype(np.float64)
+    return sums / np.maximum(area, 1)[:, None]
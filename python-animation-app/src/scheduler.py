@@ -0,0 +1,118 @@
+import math
+import time
+
+
+# Rate at which a progressive drawing is shown, in frames per second
+DEFAULT_FPS = 60
+
+# Strokes per second at the two ends of the speed slider (1 and 100)
+MIN_RATE = 10
+MAX_RATE = 1_000_000
+
+# Strokes rasterized before the scheduler has measured what they cost
+_FIRST_CHUNK = 64
+
+# How much of the running cost fit each new measurement keeps
+_COST_DECAY = 0.7
+
+
+def speed_to_rate(speed):
+    """Strokes per second for a speed slider value in [1, 100]
+
+    The scale is logarithmic, so each step of the slider speeds the
+    drawing up by the same factor whatever the style.
+    """
+    speed = min(max(speed, 1), 100)
+    return MIN_RATE * (MAX_RATE / MIN_RATE) ** ((speed - 1) / 99)
+
+
+class FrameScheduler:
+    """Paces progressive playback by wall-clock frame deadlines
+
+    Time is cut into frames of 1/fps seconds. In each frame the engine
+    rasterizes the strokes the schedule says are due by the frame's end
+    (strokes_per_second times the time since start(), less what has been
+    drawn), in chunks sized from the measured cost per stroke so the work
+    stops at the deadline. Rasterizing a chunk costs a fixed overhead
+    (a canvas-sized work area, say) plus a cost per stroke, fitted from
+    recent chunks, so a frame is filled by one large chunk rather than
+    many small ones. The frame is then presented and next_frame()
+    sleeps until the following deadline. Strokes that did not fit carry
+    over, so a slow machine or an expensive style shows a slower drawing
+    at the same frame rate instead of a stuttering one.
+
+    With strokes_per_second None the scheduler runs as fast as possible:
+    every frame draws until its deadline and never sleeps, and presenting
+    still happens only fps times a second.
+    """
+
+    def __init__(self, strokes_per_second=None, fps=DEFAULT_FPS,
+                 clock=time.perf_counter, sleep=time.sleep):
+        self.rate = strokes_per_second
+        self.frame_time = 1.0 / fps
+        self.clock = clock
+        self.sleep = sleep
+        # Decayed sums over (strokes, seconds) of recent chunks, for the fit
+        self.sums = [0.0] * 5
+        self.start()
+
+    def start(self):
+        """Begin the schedule now, with nothing drawn"""
+        self.started = self.clock()
+        self.deadline = self.started + self.frame_time
+        self.drawn = 0
+        self.frame_first = 0
+
+    def due(self):
+        """Strokes the schedule wants drawn before this frame ends (None: all)"""
+        if self.rate is None:
+            return None
+        return max(0, math.floor(self.rate * (self.deadline - self.started)) - self.drawn)
+
+    def cost(self):
+        """(overhead, per_stroke) seconds fitted to recent chunks, or None"""
+        weight, strokes, seconds, squares, products = self.sums
+        if strokes <= 0:
+            return None
+        spread = weight * squares - strokes * strokes
+        if spread > 1e-6 * weight * squares:
+            per_stroke = (weight * products - strokes * seconds) / spread
+            overhead = (seconds - per_stroke * strokes) / weight
+            if per_stroke > 0 and overhead >= 0:
+                return overhead, per_stroke
+        # Chunks all about the same size: no way to tell the two apart
+        return 0.0, seconds / strokes
+
+    def chunk(self, wanted):
+        """How many of wanted strokes to rasterize next; 0 once the frame is over
+
+        The first chunk of a frame always has at least one stroke, so
+        drawing moves on even when a single stroke overruns a frame.
+        """
+        if wanted <= 0:
+            return 0
+        remaining = self.deadline - self.clock()
+        first = self.drawn == self.frame_first
+        cost = self.cost()
+        if cost is None:
+            return min(wanted, _FIRST_CHUNK)
+        overhead, per_stroke = cost
+        count = min(wanted, int((remaining - overhead) / per_stroke)) if remaining > overhead else 0
+        return max(count, 1) if first else count
+
+    def record(self, count, seconds):
+        """Account for count strokes that took seconds to rasterize"""
+        self.drawn += count
+        if count > 0:
+            self.sums = [_COST_DECAY * total + sample for total, sample in
+                         zip(self.sums, (1.0, count, seconds, count * count, count * seconds))]
+
+    def next_frame(self):
+        """Wait for the current frame's deadline, then move on to the next frame"""
+        now = self.clock()
+        if self.rate is not None and now < self.deadline:
+            self.sleep(self.deadline - now)
+            now = self.deadline
+        # A frame that overran is dropped rather than rushed through
+        self.deadline = max(self.deadline + self.frame_time, now + self.frame_time / 2)
+        self.frame_first = self.drawn
@@ -0,0 +1,208 @@
+from array import array
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# Stroke kinds. LINE is an open polyline, POLYGON a filled polygon, DISC a
+# filled circle (one centre point; width holds the radius) and ELLIPSE an
+# outline inside the box given by its two points.
+LINE, POLYGON, DISC, ELLIPSE = range(4)
+
+
+@dataclass
+class StrokeList:
+    """Display list of strokes as parallel arrays, in drawing order
+
+    Styles describe a drawing as a StrokeList and a rasterizer replays any
+    slice of it, so the same strokes can be shown progressively, redrawn,
+    or handed to another renderer. Stroke i has kind kinds[i], colour
+    colors[i] (RGB), line width (or disc radius) widths[i], and the
+    counts[i] points starting at row starts[i] of points (int32 x, y).
+    Points of consecutive strokes follow one another in points.
+
+    Strokes are grouped into the units a style reveals one at a time (a
+    shading grid point, a contour, a polygon): steps[i] is the
+    non-decreasing step of stroke i and num_steps counts every step,
+    including those that produced no strokes.
+    """
+    kinds: np.ndarray
+    starts: np.ndarray
+    counts: np.ndarray
+    colors: np.ndarray
+    widths: np.ndarray
+    steps: np.ndarray
+    points: np.ndarray
+    num_steps: int
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def span(self, first_step, last_step):
+        """Slice of the strokes belonging to steps [first_step, last_step)"""
+        # Keys of the column's own type, or the whole column gets converted
+        keys = np.array([first_step, last_step], dtype=self.steps.dtype)
+        lo, hi = self.steps.searchsorted(keys)
+        return slice(int(lo), int(hi))
+
+    def to_arrays(self):
+        """The columns as a dict of arrays, e.g. for np.savez"""
+        return {"kinds": self.kinds, "starts": self.starts, "counts": self.counts,
+                "colors": self.colors, "widths": self.widths, "steps": self.steps,
+                "points": self.points, "num_steps": np.array(self.num_steps)}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Inverse of to_arrays"""
+        return cls(arrays["kinds"], arrays["starts"], arrays["counts"], arrays["colors"],
+                   arrays["widths"], arrays["steps"], arrays["points"], int(arrays["num_steps"]))
+
+    def take(self, order, steps=None):
+        """The strokes at indices order, in that order, with their points
+
+        steps replaces the step column of the result (it has to stay
+        non-decreasing); by default each stroke keeps its own step.
+        """
+        counts = self.counts[order]
+        starts = np.cumsum(counts, dtype=np.int64) - counts
+        source = np.repeat(self.starts[order] - starts, counts) + np.arange(int(counts.sum()))
+        return StrokeList(self.kinds[order], starts, counts, self.colors[order],
+                          self.widths[order], self.steps[order] if steps is None else steps,
+                          self.points[source], self.num_steps)
+
+    @classmethod
+    def concatenate(cls, lists):
+        """One list playing the given lists one after another
+
+        Steps and point offsets of each list are moved past those of the
+        lists before it.
+        """
+        step_base = np.cumsum([0] + [part.num_steps for part in lists])
+        point_base = np.cumsum([0] + [len(part.points) for part in lists])
+        return cls(np.concatenate([part.kinds for part in lists]).astype(np.uint8),
+                   np.concatenate([part.starts + base for part, base in zip(lists, point_base)]
+                                  ).astype(np.int64),
+                   np.concatenate([part.counts for part in lists]).astype(np.int32),
+                   np.concatenate([part.colors for part in lists]).reshape(-1, 3).astype(np.uint8),
+                   np.concatenate([part.widths for part in lists]).astype(np.int32),
+                   np.concatenate([part.steps + base for part, base in zip(lists, step_base)]
+                                  ).astype(np.int32),
+                   np.concatenate([part.points for part in lists]).reshape(-1, 2).astype(np.int32),
+                   int(step_base[-1]))
+
+    @classmethod
+    def segments(cls, x0, y0, x1, y1, colors, steps, num_steps, width=1):
+        """Straight two-point LINE strokes from parallel end point arrays"""
+        count = len(x0)
+        points = np.empty((count, 2, 2), dtype=np.int32)
+        points[:, 0, 0] = x0
+        points[:, 0, 1] = y0
+        points[:, 1, 0] = x1
+        points[:, 1, 1] = y1
+        return cls(np.full(count, LINE, dtype=np.uint8),
+                   np.arange(0, 2 * count, 2, dtype=np.int64),
+                   np.full(count, 2, dtype=np.int32),
+                   np.asarray(colors, dtype=np.uint8).reshape(count, 3),
+                   np.full(count, width, dtype=np.int32),
+                   np.asarray(steps, dtype=np.int32),
+                   points.reshape(-1, 2), num_steps)
+
+    @classmethod
+    def discs(cls, xs, ys, radii, colors, steps, num_steps):
+        """Filled DISC strokes from centre, radius and colour arrays"""
+        count = len(xs)
+        return cls(np.full(count, DISC, dtype=np.uint8),
+                   np.arange(count, dtype=np.int64),
+                   np.ones(count, dtype=np.int32),
+                   np.asarray(colors, dtype=np.uint8).reshape(count, 3),
+                   np.asarray(radii, dtype=np.int32),
+                   np.asarray(steps, dtype=np.int32),
+                   np.stack([xs, ys], axis=1).astype(np.int32), num_steps)
+
+
+class StrokeBuilder:
+    """Collects strokes one at a time for styles that decide them in a loop
+
+    Columns are kept in compact array.array buffers rather than per-stroke
+    Python objects and turned into a StrokeList by build().
+    """
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.starts = array("q")
+        self.counts = array("i")
+        self.colors = array("B")
+        self.widths = array("i")
+        self.steps = array("i")
+        self.points = array("i")
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, points, color, width=1, step=0):
+        """Append a stroke; points is a sequence of (x, y) pairs"""
+        self.kinds.append(kind)
+        self.starts.append(len(self.points) // 2)
+        self.counts.append(len(points))
+        self.colors.extend(color)
+        self.widths.append(width)
+        self.steps.append(step)
+        for x, y in points:
+            self.points.append(x)
+            self.points.append(y)
+
+    def build(self, num_steps):
+        """Freeze the collected strokes into a StrokeList"""
+        return StrokeList(np.frombuffer(self.kinds, dtype=np.uint8),
+                          np.frombuffer(self.starts, dtype=np.int64),
+                          np.frombuffer(self.counts, dtype=np.int32),
+                          np.frombuffer(self.colors, dtype=np.uint8).reshape(-1, 3),
+                          np.frombuffer(self.widths, dtype=np.int32),
+                          np.frombuffer(self.steps, dtype=np.int32),
+                          np.frombuffer(self.points, dtype=np.int32).reshape(-1, 2),
+                          num_steps)
+
+
+def contour_segments(contours, rng, passes=None, jitter=0, drop=0.0, color=(0, 0, 0)):
+    """Break OpenCV contours into segment strokes, one step per contour
+
+    Each contour is traced passes[i] times (once when passes is None) as an
+    open polyline. Every traced point is offset by a uniform integer jitter
+    in [-jitter, jitter] and each segment is independently left out with
+    probability drop, which is how the styles' 0-or-1 pixel "pressure"
+    variation looks on the canvas. All of it is done as whole-array
+    operations over the concatenated contour points.
+    """
+    lengths = np.array([len(c) for c in contours], dtype=np.intp)
+    if passes is None:
+        passes = np.ones(len(contours), dtype=np.intp)
+    if len(contours) == 0 or not (lengths * passes).any():
+        empty = np.empty(0, dtype=np.int32)
+        return StrokeList.segments(empty, empty, empty, empty, np.empty((0, 3), np.uint8),
+                                   empty, len(contours))
+
+    points = np.concatenate([c.reshape(-1, 2) for c in contours]).astype(np.int32)
+    contour_start = np.cumsum(lengths) - lengths
+
+    # One stroke per (contour, pass); lay every stroke's points end to end
+    stroke_contour = np.repeat(np.arange(len(contours)), passes)
+    stroke_length = lengths[stroke_contour]
+    stroke_start = np.cumsum(stroke_length) - stroke_length
+    total = int(stroke_length.sum())
+    point_stroke = np.repeat(np.arange(len(stroke_contour)), stroke_length)
+    source = (np.arange(total) - stroke_start[point_stroke] +
+              contour_start[stroke_contour][point_stroke])
+    traced = points[source]
+    if jitter:
+        traced += rng.integers(-jitter, jitter + 1, size=traced.shape, dtype=np.int32)
+
+    # Consecutive points of the same stroke form a segment
+    joined = np.flatnonzero(point_stroke[:-1] == point_stroke[1:])
+    if drop:
+        joined = joined[rng.random(len(joined)) >= drop]
+
+    colors = np.empty((len(joined), 3), dtype=np.uint8)
+    colors[:] = color
+    return StrokeList.segments(traced[joined, 0], traced[joined, 1],
+                               traced[joined + 1, 0], traced[joined + 1, 1],
+                               colors, stroke_contour[point_stroke[joined]], len(contours))
@@ -0,0 +1,371 @@
+import os
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from engine import DrawingEngine
+
+
+# Edge length of a rendered tile, and the extra source context drawn around it
+TILE_SIZE = 1024
+TILE_OVERLAP = 64
+
+# Rows read from the source, and written to the output, at a time
+_STRIP_ROWS = 256
+
+# Modes Pillow can decode into a memory map: bytes per pixel, and the mode
+# and rawmode its mapped rows read back as (LA is held as L, L, L, A)
+_MAPPED_MODES = {
+    "L": (1, "L", "L"),
+    "P": (1, "P", "P"),
+    "RGB": (4, "RGB", "RGBX"),
+    "RGBA": (4, "RGBA", "RGBA"),
+    "LA": (4, "RGBA", "RGBA"),
+    "CMYK": (4, "CMYK", "CMYK"),
+}
+
+# Largest source, in pixels, decoded whole when its mode can't be memory-mapped
+_WHOLE_DECODE_PIXELS = 1 << 26
+
+# Output formats written a strip at a time
+TILE_FORMATS = (".png", ".tif", ".tiff", ".ppm")
+
+# zlib level of PNG output, Pillow's default
+_PNG_COMPRESSION = 6
+
+
+def tile_boxes(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Split a width x height canvas into (core, padded) tile boxes
+
+    Core boxes tile the canvas exactly; each padded box grows its core by
+    overlap pixels on every side (clipped to the canvas). A tile is drawn
+    over its padded box and only its core is kept, so the strokes, blurs
+    and edge maps next to a seam see the same neighbourhood they would in a
+    single full-size render.
+    """
+    boxes = []
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            x1 = min(x0 + tile_size, width)
+            y1 = min(y0 + tile_size, height)
+            padded = (max(0, x0 - overlap), max(0, y0 - overlap),
+                      min(width, x1 + overlap), min(height, y1 + overlap))
+            boxes.append(((x0, y0, x1, y1), padded))
+    return boxes
+
+
+class StripReader:
+    """An image read a band of rows at a time
+
+    Sources stored as plain rows (PPM/PGM, BMP, uncompressed TIFF) are read
+    straight from the file, one strip at a time, so reading never holds
+    more than a strip. Pillow can only decode compressed formats (PNG,
+    JPEG, compressed TIFF) in one go, so those are decoded once into a
+    memory-mapped scratch file (in scratch, or the system temp directory)
+    and handed out in strips from there; the decoded pixels live on disk,
+    not in memory. A compressed source in a mode that can't be mapped is
+    decoded whole if it is small, and refused with a ValueError if not.
+    Strips are RGB, or L for greyscale sources.
+    """
+
+    def __init__(self, path, scratch=None):
+        self.path = path
+        self.scratch = scratch
+        self.image = Image.open(path)
+        self.size = self.image.size
+        self.mode = "L" if self.image.mode == "L" else "RGB"
+        self.layout = _raw_layout(self.image)
+        self.spill_path = None
+        self.decoded = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.image.close()
+        self.decoded = None
+        if self.spill_path is not None:
+            os.remove(self.spill_path)
+            self.spill_path = None
+
+    def strips(self, rows=_STRIP_ROWS):
+        """Yield (top, array) for each band of rows down the image"""
+        width, height = self.size
+        if self.layout is None:
+            self._decode()
+            for top in range(0, height, rows):
+                bottom = min(top + rows, height)
+                yield top, self._decoded_rows(top, bottom)
+            return
+
+        with open(self.path, "rb") as source_file:
+            for top in range(0, height, rows):
+                bottom = min(top + rows, height)
+                pieces = [self._read(source_file, band, max(top, band[0]), min(bottom, band[1]))
+                          for band in self.layout if band[0] < bottom and band[1] > top]
+                yield top, pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+
+    def _read(self, source_file, band, top, bottom):
+        """Rows top to bottom of the image, from one band of the file"""
+        band_top, band_bottom, offset, stride, rawmode, orientation = band
+        # Bottom-up files (BMP) store the last row first
+        first = top - band_top if orientation > 0 else band_bottom - bottom
+        source_file.seek(offset + first * stride)
+        data = source_file.read((bottom - top) * stride)
+        strip = Image.frombuffer(self.image.mode, (self.size[0], bottom - top), data, "raw",
+                                 rawmode, stride, orientation)
+        if strip.mode != self.mode:
+            strip = strip.convert(self.mode)
+        return np.asarray(strip)
+
+    def _decode(self):
+        """Decode a compressed source once, into a memory-mapped scratch file if possible"""
+        if self.decoded is not None:
+            return
+        width, height = self.size
+        mode = self.image.mode
+        if mode in _MAPPED_MODES:
+            pixel_bytes = _MAPPED_MODES[mode][0]
+            handle, self.spill_path = tempfile.mkstemp(prefix="strips-", suffix=".raw",
+                                                       dir=self.scratch)
+            os.close(handle)
+            rows = np.memmap(self.spill_path, dtype=np.uint8, mode="w+",
+                             shape=(height, width * pixel_bytes))
+            # Pillow decodes straight into a core laid over the mapped rows
+            core = Image.core.map_buffer(rows, self.size, "raw", 0,
+                                         (mode, width * pixel_bytes, 1))
+            self.image.im = core
+            self.image.load()
+            if self.image.im is core:
+                self.decoded = rows
+                return
+        elif width * height > _WHOLE_DECODE_PIXELS:
+            raise ValueError(f"{self.path}: can't read a {width}x{height} {mode} image "
+                             "in strips; convert it to RGB or greyscale first")
+        # Decoded whole: a small source, or a loader that replaced the mapped core
+        self.image.load()
+        self.decoded = self.image if mode == self.mode else self.image.convert(self.mode)
+
+    def _decoded_rows(self, top, bottom):
+        """Rows top to bottom of the decoded source, in the strip mode"""
+        width = self.size[0]
+        if isinstance(self.decoded, Image.Image):
+            return np.asarray(self.decoded.crop((0, top, width, bottom)))
+        pixel_bytes, mode, rawmode = _MAPPED_MODES[self.image.mode]
+        strip = Image.frombuffer(mode, (width, bottom - top), self.decoded[top:bottom],
+                                 "raw", rawmode, width * pixel_bytes, 1)
+        if strip.mode == "P":
+            palette_mode = self.image.palette.mode
+            strip.putpalette(self.image.getpalette(palette_mode), palette_mode)
+        if strip.mode != self.mode:
+            strip = strip.convert(self.mode)
+        return np.asarray(strip)
+
+
+def _raw_layout(img):
+    """The bands of rows an image is stored in as plain rows, or None if it isn't
+
+    Each band is (top, bottom, file offset, row stride, rawmode,
+    orientation), and together they cover the image top to bottom.
+    """
+    if img.mode not in ("L", "RGB", "RGBA"):
+        return None
+    bands = []
+    for tile in sorted(img.tile, key=lambda tile: tile[1][1]):
+        codec, (x0, y0, x1, y1), offset, args = tuple(tile)[:4]
+        if codec != "raw" or (x0, x1) != (0, img.width) or y0 != (bands[-1][1] if bands else 0):
+            return None
+        if isinstance(args, str):
+            args = (args,)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if not stride:
+            stride = len(Image.new(img.mode, (img.width, 1)).tobytes("raw", rawmode))
+        bands.append((y0, y1, offset, stride, rawmode, orientation))
+    if not bands or bands[-1][1] != img.height:
+        return None
+    return bands
+
+
+def write_strips(path, width, height, strips):
+    """Write RGB strips, (rows, width, 3) arrays from the top down, as a PNG, TIFF or PPM
+
+    Only the strip in hand is held, whatever the size of the image.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in TILE_FORMATS:
+        raise ValueError(f"can't write {extension or path} a strip at a time; "
+                         f"use one of {', '.join(TILE_FORMATS)}")
+    with open(path, "wb") as output:
+        if extension == ".png":
+            _write_png(output, width, height, strips)
+        elif extension == ".ppm":
+            output.write(f"P6\n{width} {height}\n255\n".encode("ascii"))
+            for strip in strips:
+                output.write(np.ascontiguousarray(strip).data)
+        else:
+            _write_tiff(output, width, height, strips)
+
+
+def _write_png(output, width, height, strips):
+    """Stream an 8-bit RGB PNG, each row stored as its difference from the one above"""
+    def chunk(kind, data):
+        output.write(struct.pack(">I", len(data)) + kind + data +
+                     struct.pack(">I", zlib.crc32(kind + data)))
+
+    output.write(b"\x89PNG\r\n\x1a\n")
+    chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    compressor = zlib.compressobj(_PNG_COMPRESSION)
+    above = np.zeros((1, width * 3), dtype=np.uint8)
+    for strip in strips:
+        rows = np.asarray(strip, dtype=np.uint8).reshape(len(strip), width * 3)
+        filtered = np.empty((len(rows), width * 3 + 1), dtype=np.uint8)
+        filtered[:, 0] = 2  # the "Up" filter; uint8 subtraction wraps as PNG expects
+        np.subtract(rows, np.concatenate([above, rows[:-1]]), out=filtered[:, 1:])
+        above = rows[-1:].copy()
+        data = compressor.compress(filtered.data)
+        if data:
+            chunk(b"IDAT", data)
+    chunk(b"IDAT", compressor.flush())
+    chunk(b"IEND", b"")
+
+
+def _write_tiff(output, width, height, strips):
+    """Stream an uncompressed little-endian RGB TIFF, _STRIP_ROWS rows per TIFF strip"""
+    row_bytes = width * 3
+    if row_bytes * height >= 1 << 32:
+        raise ValueError("image too large for a TIFF; write a .png instead")
+    count = -(-height // _STRIP_ROWS)
+    entries = 10
+    # Header, then the directory, then its out-of-line values, then the pixels
+    ifd = 8
+    bits = ifd + 2 + entries * 12 + 4
+    offsets = bits + 6
+    byte_counts = offsets + 4 * count
+    pixels = byte_counts + 4 * count
+    strip_offsets = [pixels + i * _STRIP_ROWS * row_bytes for i in range(count)]
+    strip_bytes = [min(_STRIP_ROWS, height - i * _STRIP_ROWS) * row_bytes for i in range(count)]
+
+    def entry(tag, kind, number, value):
+        """A directory entry; kind 3 is SHORT and 4 LONG, value inline or an offset"""
+        if kind == 3 and number == 1:
+            return struct.pack("<HHIHxx", tag, kind, number, value)
+        return struct.pack("<HHII", tag, kind, number, value)
+
+    header = [b"II*\0", struct.pack("<I", ifd), struct.pack("<H", entries),
+              entry(256, 4, 1, width),
+              entry(257, 4, 1, height),
+              entry(258, 3, 3, bits),
+              entry(259, 3, 1, 1),  # no compression
+              entry(262, 3, 1, 2),  # RGB
+              entry(273, 4, count, offsets if count > 1 else strip_offsets[0]),
+              entry(277, 3, 1, 3),
+              entry(278, 4, 1, _STRIP_ROWS),
+              entry(279, 4, count, byte_counts if count > 1 else strip_bytes[0]),
+              entry(284, 3, 1, 1),  # chunky
+              struct.pack("<I", 0),
+              struct.pack("<3H", 8, 8, 8),
+              struct.pack(f"<{count}I", *strip_offsets),
+              struct.pack(f"<{count}I", *strip_bytes)]
+    output.write(b"".join(header))
+    for strip in strips:
+        output.write(np.ascontiguousarray(strip, dtype=np.uint8).data)
+
+
+def tile_seed(seed, index):
+    """Independent, repeatable seed for one tile (None stays random)"""
+    if seed is None:
+        return None
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0])
+
+
+def render_tile(task):
+    """Draw one tile and write its core into the shared canvas; runs in a worker
+
+    Source and canvas are .npy files opened as memory maps, so a worker
+    only ever holds its own padded tile in memory.
+    """
+    source = np.load(task["source"], mmap_mode="r")
+    canvas = np.load(task["canvas"], mmap_mode="r+")
+    x0, y0, x1, y1 = task["padded"]
+    cx0, cy0, cx1, cy1 = task["core"]
+
+    tile = Image.fromarray(np.ascontiguousarray(source[y0:y1, x0:x1]))
+    engine = DrawingEngine(x1 - x0, y1 - y0, bg_color=task["bg_color"], seed=task["seed"],
+                           backend=task["backend"], antialias=task["antialias"],
+                           order=task["order"])
+    steps = engine.render(tile, task["style"], task["detail"])
+
+    canvas[cy0:cy1, cx0:cx1] = engine.pixels[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+    canvas.flush()
+    return steps
+
+
+def render_tiled(source_path, output_path, style, detail, seed=None,
+                 tile_size=TILE_SIZE, overlap=TILE_OVERLAP, executor=None,
+                 workers=None, bg_color="white", backend="pil", antialias=False,
+                 order="natural"):
+    """Draw a large image at full resolution, one tile per worker task
+
+    The source is spilled a strip at a time to a memory-mapped array in a
+    temporary directory, and the canvas is another one. Tiles are rendered
+    across a process pool (executor, or a new one with workers processes)
+    and write their cores straight into the canvas map, and the drawing is
+    encoded to output_path (PNG, TIFF or PPM) a strip at a time, so working
+    memory grows with the tile size and worker count rather than the image
+    size; a compressed source (PNG, JPEG, compressed TIFF) is decoded into
+    a scratch memory map first (see StripReader). Tile seeds derive from
+    seed, so output does not depend on the worker count. Returns the total
+    step count over all tiles.
+    """
+    if os.path.splitext(output_path)[1].lower() not in TILE_FORMATS:
+        raise ValueError(f"tiled output must be one of {', '.join(TILE_FORMATS)}")
+    with tempfile.TemporaryDirectory(prefix="tiles-") as scratch:
+        source_file = os.path.join(scratch, "source.npy")
+        canvas_file = os.path.join(scratch, "canvas.npy")
+
+        with StripReader(source_path, scratch) as reader:
+            width, height = reader.size
+            channels = () if reader.mode == "L" else (3,)
+            source = np.lib.format.open_memmap(source_file, mode="w+", dtype=np.uint8,
+                                               shape=(height, width) + channels)
+            for top, strip in reader.strips(_STRIP_ROWS):
+                source[top:top + len(strip)] = strip
+            source.flush()
+            del source
+
+        canvas = np.lib.format.open_memmap(canvas_file, mode="w+", dtype=np.uint8,
+                                           shape=(height, width, 3))
+        del canvas
+
+        tasks = [{
+            "source": source_file,
+            "canvas": canvas_file,
+            "core": core,
+            "padded": padded,
+            "style": style,
+            "detail": detail,
+            "seed": tile_seed(seed, index),
+            "bg_color": bg_color,
+            "backend": backend,
+            "antialias": antialias,
+            "order": order,
+        } for index, (core, padded) in enumerate(tile_boxes(width, height, tile_size, overlap))]
+
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                total_steps = sum(pool.map(render_tile, tasks))
+        else:
+            total_steps = sum(executor.map(render_tile, tasks))
+
+        canvas = np.load(canvas_file, mmap_mode="r")
+        write_strips(output_path, width, height,
+                     (canvas[top:top + _STRIP_ROWS] for top in range(0, height, _STRIP_ROWS)))
+        del canvas
+    return total_steps
@@ -0,0 +1,222 @@
+import numpy as np
+
+from effects import DEFAULT_FPS, effect_named, frame_count
+
+
+# Clips in a leaf of the interval tree; below this a node's lists are scanned outright
+_LEAF_SIZE = 16
+
+
+class Clip:
+    """One image on the timeline, a view onto a row of Timeline's columns
+
+    The clip shows image from start to end, on layer (higher layers are
+    drawn over lower ones). Its effect plays over the first duration
+    seconds and its last frame holds until end, like an Animator step's
+    delay. position is the top-left corner of the box the image is fitted
+    into and size the box, both in frame pixels; None centres the image
+    and fits it to the whole frame.
+    """
+
+    __slots__ = ("index", "image", "start", "end", "duration", "layer", "effect", "position",
+                 "size")
+
+    def __init__(self, index, image, start, end, duration, layer, effect, position, size):
+        self.index = index
+        self.image = image
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.layer = layer
+        self.effect = effect
+        self.position = position
+        self.size = size
+
+    def __repr__(self):
+        return (f"Clip({self.index}, {self.image!r}, {self.start:g}-{self.end:g}s, "
+                f"layer {self.layer})")
+
+    def frame(self, t, fps=DEFAULT_FPS):
+        """(effect frame, effect frame count) of the clip at time t
+
+        The effect frame is the one started at or before t, and the last
+        one from the end of the effect on.
+        """
+        count = frame_count(self.duration, fps)
+        return min(max(int(np.floor((t - self.start) * fps)), 0), count - 1), count
+
+    def params(self, t, fps=DEFAULT_FPS):
+        """The clip's effect parameters at time t, computed directly"""
+        return self.effect.at(*self.frame(t, fps))
+
+
+class _Node:
+    """A node of the centred interval tree
+
+    Holds the clips whose interval contains centre, as ids sorted by start
+    (with their starts) and by end (with their ends); clips entirely before
+    centre are under left and those entirely after under right. A leaf
+    (centre None) holds its few clips sorted by start, with their ends in
+    the same order, and is scanned.
+    """
+
+    __slots__ = ("centre", "by_start", "starts", "by_end", "ends", "left", "right")
+
+
+class Timeline:
+    """Clips laid out in time, indexed for "what is showing at t" queries
+
+    Clips live in parallel NumPy columns (start, end, duration, layer,
+    position and size) with images and effects in side lists, and Clip
+    objects are made only when asked for. A centred interval tree over the
+    [start, end) intervals answers active() in O(log n + k) for k clips
+    showing, and overlapping() adds a binary search over the sorted starts
+    for the same bound, so rendering or seeking to any time needs no replay
+    from the beginning. The index is rebuilt on the first query after clips
+    are added.
+    """
+
+    def __init__(self):
+        self.images = []
+        self.effects = []
+        self.columns = {name: [] for name in ("start", "end", "duration", "layer",
+                                              "x", "y", "width", "height")}
+        self.arrays = None
+        self.root = None
+        self.order = None
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, index):
+        arrays = self._index()
+        position = size = None
+        if arrays["width"][index] >= 0:
+            position = (int(arrays["x"][index]), int(arrays["y"][index]))
+            size = (int(arrays["width"][index]), int(arrays["height"][index]))
+        return Clip(int(index), self.images[index], float(arrays["start"][index]),
+                    float(arrays["end"][index]), float(arrays["duration"][index]),
+                    int(arrays["layer"][index]), self.effects[index], position, size)
+
+    @property
+    def end(self):
+        """When the last clip ends"""
+        return float(self._index()["end"].max()) if len(self) else 0.0
+
+    def add(self, image, duration, delay=0.0, effect=None, start=None, layer=0, position=None,
+            size=None):
+        """Add a clip and return its index
+
+        With start None the clip follows the one added before it, after
+        that clip's delay: the way Animator steps play one after another.
+        """
+        if start is None:
+            start = self.columns["end"][-1] if self.images else 0.0
+        duration = float(duration or 0)
+        self.images.append(image)
+        self.effects.append(effect_named(effect))
+        values = {"start": float(start), "end": float(start) + duration + float(delay or 0),
+                  "duration": duration, "layer": layer}
+        values["x"], values["y"] = position if position is not None else (-1, -1)
+        values["width"], values["height"] = size if size is not None else (-1, -1)
+        for name, value in values.items():
+            self.columns[name].append(value)
+        self.arrays = None
+        return len(self.images) - 1
+
+    def add_model(self, image_data, config, start=None, layer=0):
+        """Add a clip for a models.ImageData shown with a models.AnimationConfig"""
+        return self.add(image_data.file_path, config.duration, config.delay,
+                        "+".join(config.effects), start=start, layer=layer,
+                        position=image_data.position, size=image_data.size)
+
+    def active(self, t):
+        """Ids of the clips showing at time t, bottom layer first"""
+        ids = self._stab(t)
+        return ids[self.order[ids].argsort(kind="stable")]
+
+    def overlapping(self, start, end):
+        """Ids of the clips showing at any time in [start, end), bottom layer first"""
+        arrays = self._index()
+        ids = self._stab(start)
+        # Plus the clips that begin inside the range (and are ever shown)
+        first = np.searchsorted(arrays["sorted_starts"], start, side="right")
+        last = np.searchsorted(arrays["sorted_starts"], end, side="left")
+        starting = arrays["start_order"][first:last]
+        starting = starting[arrays["end"][starting] > arrays["start"][starting]]
+        ids = np.concatenate([ids, starting])
+        return ids[self.order[ids].argsort(kind="stable")]
+
+    def started(self, t):
+        """Ids of the clips starting at or before t, in order of start"""
+        arrays = self._index()
+        return arrays["start_order"][:np.searchsorted(arrays["sorted_starts"], t, side="right")]
+
+    def starting_order(self):
+        """Ids of all the clips in order of start"""
+        return self._index()["start_order"]
+
+    def at(self, t):
+        """The Clips showing at time t, bottom layer first"""
+        return [self[index] for index in self.active(t)]
+
+    def _stab(self, t):
+        """Ids of the clips with start <= t < end, in no particular order"""
+        self._index()
+        found = []
+        node = self.root
+        while node is not None:
+            if node.centre is None:
+                head = np.searchsorted(node.starts, t, side="right")
+                found.append(node.by_start[:head][node.ends[:head] > t])
+                break
+            if t < node.centre:
+                found.append(node.by_start[:np.searchsorted(node.starts, t, side="right")])
+                node = node.left
+            else:
+                found.append(node.by_end[np.searchsorted(node.ends, t, side="right"):])
+                node = node.right
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+    def _index(self):
+        """The columns as arrays, with the interval tree built over them"""
+        if self.arrays is not None:
+            return self.arrays
+        arrays = {name: np.array(values, dtype=np.int32 if name not in
+                                 ("start", "end", "duration") else np.float64)
+                  for name, values in self.columns.items()}
+        arrays["start_order"] = np.argsort(arrays["start"], kind="stable")
+        arrays["sorted_starts"] = arrays["start"][arrays["start_order"]]
+        # Drawing order: by layer, then in the order clips were added
+        ranks = np.lexsort((np.arange(len(self)), arrays["layer"]))
+        self.order = np.empty(len(self), dtype=np.intp)
+        self.order[ranks] = np.arange(len(self))
+        self.arrays = arrays
+        self.root = self._build(np.arange(len(self)))
+        return arrays
+
+    def _build(self, ids):
+        """Interval tree node over clips ids (None if there are none)"""
+        if len(ids) == 0:
+            return None
+        starts = self.arrays["start"][ids]
+        ends = self.arrays["end"][ids]
+        node = _Node()
+        node.centre = float(np.median(np.concatenate([starts, ends])))
+        before = ends <= node.centre
+        if len(ids) <= _LEAF_SIZE or before.all():
+            # Few clips, or (with empty intervals) no split that separates them
+            by_start = np.argsort(starts, kind="stable")
+            node.centre = node.by_end = node.left = node.right = None
+            node.by_start, node.starts, node.ends = ids[by_start], starts[by_start], ends[by_start]
+            return node
+        after = starts > node.centre
+        here = ~before & ~after
+        inside = ids[here]
+        by_start = np.argsort(starts[here], kind="stable")
+        by_end = np.argsort(ends[here], kind="stable")
+        node.by_start, node.starts = inside[by_start], starts[here][by_start]
+        node.by_end, node.ends = inside[by_end], ends[here][by_end]
+        node.left = self._build(ids[before])
+        node.right = self._build(ids[after])
+        return node
@@ -0,0 +1,82 @@
+from collections import deque
+from dataclasses import dataclass, field
+import threading
+
+from PIL import Image
+
+from raster import union_boxes
+
+
+@dataclass
+class UpdateBatch:
+    """Everything the UI has to apply since its last poll"""
+    progress: float = None
+    status: str = None
+    frame: tuple = None  # (box, image patch) or None
+    events: list = field(default_factory=list)
+
+
+class RenderUpdates:
+    """Bounded, merging mailbox between a render thread and the Tk main loop
+
+    The render thread publishes progress, status text, discrete events and
+    changed canvas regions; the Tk main loop drains them from a single
+    after() poller and is the only thread that touches widgets. Nothing in
+    here grows with render length: progress and status keep only their
+    latest value, events are capped, and changed regions are merged into one
+    box. A frame (a snapshot of the merged box) is only cut when the UI has
+    shown the previous one, so when the UI falls behind intermediate frames
+    are never produced at all rather than queued up.
+    """
+
+    def __init__(self, max_events=16):
+        self.lock = threading.Lock()
+        self.progress = None
+        self.status = None
+        self.events = deque(maxlen=max_events)
+        self.dirty = None
+        self.frame = None
+        self.frame_wanted = True
+
+    def publish(self, progress=None, status=None, event=None):
+        """Record new progress (0-100), status text and/or an event name"""
+        with self.lock:
+            if progress is not None:
+                self.progress = progress
+            if status is not None:
+                self.status = status
+            if event is not None:
+                self.events.append(event)
+
+    def offer_frame(self, pixels, box, force=False):
+        """Note that box of the pixels canvas changed; snapshot it if the UI is ready
+
+        Must be called from the thread that draws on pixels. force cuts a
+        frame even if the previous one has not been shown yet, e.g. for the
+        final state of a drawing; the unshown frame is then replaced.
+        """
+        with self.lock:
+            self.dirty = union_boxes(self.dirty, box)
+            if self.dirty is None or not (self.frame_wanted or force):
+                return
+            if self.frame is not None:
+                # The unshown frame is stale; cut one covering both instead
+                self.dirty = union_boxes(self.dirty, self.frame[0])
+            region, self.dirty = self.dirty, None
+            self.frame_wanted = False
+
+        x0, y0, x1, y1 = region
+        patch = Image.fromarray(pixels[y0:y1, x0:x1])
+        with self.lock:
+            self.frame = (region, patch)
+
+    def drain(self):
+        """Take everything published since the last drain (UI thread)"""
+        with self.lock:
+            batch = UpdateBatch(self.progress, self.status, self.frame, list(self.events))
+            self.progress = None
+            self.status = None
+            self.frame = None
+            self.events.clear()
+            self.frame_wanted = True
+        return batch
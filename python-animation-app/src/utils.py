@@ -1,15 +1,25 @@
-def load_image(image_path):
-    from PIL import Image
-    try:
-        image = Image.open(image_path)
-        return image
-    except Exception as e:
-        print(f"Error loading image: {e}")
-        return None
+def load_image(image_path, width, height, cache=None):
+    """The image fitted to width x height, decoded small (see ingest.load_source)
+
+    Errors opening or decoding the file are raised, as from load_source.
+    """
+    from ingest import load_source
+    return load_source(image_path, width, height, cache=cache)
 
-def save_animation(animation, output_path):
+def save_animation(animation, output_path, fps=30):
+    """Stream frames (PIL images or arrays, any iterable) to a .gif or video file"""
+    import numpy as np
+    from recorder import open_writer
     try:
-        animation.save(output_path, save_all=True, append_images=animation[1:], loop=0)
+        writer = None
+        count = 0
+        for count, frame in enumerate(animation, 1):
+            frame = np.asarray(frame.convert("RGB") if hasattr(frame, "convert") else frame)
+            if writer is None:
+                writer = open_writer(output_path, frame, fps)
+            writer.write((count - 1) / fps, (0, 0, frame.shape[1], frame.shape[0]), frame)
+        if writer is not None:
+            writer.close(count / fps)
         print(f"Animation saved to {output_path}")
     except Exception as e:
         print(f"Error saving animation: {e}")
@@ -19,8 +29,8 @@ def get_file_extension(file_path):
     return os.path.splitext(file_path)[1]
 
 def validate_image_file(file_path):
-    valid_extensions = ['.png', '.jpg', '.jpeg', '.gif']
-    return get_file_extension(file_path) in valid_extensions
+    valid_extensions = ['.png', '.jpg', '.jpeg', '.gif', '.bmp']
+    return get_file_extension(file_path).lower() in valid_extensions
 
 def ensure_directory_exists(directory):
     import os
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from backends import benchmark_image
+from checkpoint import Checkpoint, Checkpointer
+from engine import STYLES, DrawingEngine
+from scheduler import FrameScheduler
+
+
+WIDTH, HEIGHT = 160, 120
+
+
+class TickClock:
+    """A clock that moves on a millisecond every time it is read, so
+    progressive playback is chunked the same way on every run"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.001
+        return self.now
+
+
+def render(path, style, order, progressive, stop_after=None, resume=None):
+    """A seeded render that stops after stop_after should_continue polls; returns
+    (engine, polls made)"""
+    polls = [0]
+
+    def should_continue():
+        polls[0] += 1
+        return stop_after is None or polls[0] < stop_after
+
+    engine = DrawingEngine(WIDTH, HEIGHT, seed=5, order=order, should_continue=should_continue,
+                           on_progress=(lambda current, total: None) if progressive else None,
+                           scheduler=FrameScheduler(clock=TickClock(), sleep=lambda seconds: None),
+                           checkpointer=Checkpointer(path, interval=None))
+    engine.render(benchmark_image(WIDTH, HEIGHT, seed=4), style, 0.5, resume=resume)
+    return engine, polls[0]
+
+
+@pytest.mark.parametrize("progressive", [False, True], ids=["headless", "progressive"])
+@pytest.mark.parametrize("order", ["natural", "coarse-to-fine"])
+@pytest.mark.parametrize("style", STYLES)
+def test_resume_after_stop_matches_uninterrupted(tmp_path, style, order, progressive):
+    path = str(tmp_path / "drawing.npz")
+    whole, polls = render(path, style, order, progressive)
+    assert not os.path.exists(path)
+
+    for fraction in (0.3, 0.7):
+        stopped, _ = render(path, style, order, progressive, stop_after=max(2, int(polls * fraction)))
+        checkpoint = Checkpoint.load(path)
+        assert checkpoint is not None
+        assert (stopped.pixels != whole.pixels).any()
+
+        resumed, _ = render(path, style, order, progressive, resume=checkpoint)
+        assert resumed.resumed
+        np.testing.assert_array_equal(resumed.pixels, whole.pixels)
+        assert not os.path.exists(path)
+
+
+def test_checkpoint_of_other_settings_is_ignored(tmp_path):
+    path = str(tmp_path / "drawing.npz")
+    whole, polls = render(path, "sketch", "natural", False)
+    render(path, "sketch", "natural", False, stop_after=max(2, polls // 2))
+    checkpoint = Checkpoint.load(path)
+
+    other, _ = render(path, "contour", "natural", False, resume=checkpoint)
+    fresh, _ = render(path, "contour", "natural", False)
+    assert not other.resumed
+    np.testing.assert_array_equal(other.pixels, fresh.pixels)
+
+
+def test_unreadable_checkpoint_loads_as_none(tmp_path):
+    path = tmp_path / "drawing.npz"
+    assert Checkpoint.load(str(path)) is None
+    path.write_bytes(b"not a checkpoint")
+    assert Checkpoint.load(str(path)) is None
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from history import CanvasHistory
+
+
+WIDTH, HEIGHT = 150, 100
+
+
+def scribble(history, rng, count):
+    """Record count random patches, some repeating earlier pixels, labelled 1 on
+
+    Returns the canvas after each snapshot, the first being the blank one
+    (label 0).
+    """
+    canvas = history.restore(0)
+    truth = [canvas.copy()]
+    for step in range(count):
+        x0, y0 = rng.integers(0, WIDTH - 1), rng.integers(0, HEIGHT - 1)
+        x1, y1 = rng.integers(x0 + 1, WIDTH + 1), rng.integers(y0 + 1, HEIGHT + 1)
+        if rng.random() < 0.2:
+            patch = np.full((y1 - y0, x1 - x0, 3), 255, dtype=np.uint8)  # erased to blank
+        else:
+            patch = rng.integers(0, 4, size=(y1 - y0, x1 - x0, 3), dtype=np.uint8) * 60
+        canvas[y0:y1, x0:x1] = patch
+        if history.record((x0, y0, x1, y1), patch.copy(), step + 1):
+            truth.append(canvas.copy())
+    return truth
+
+
+@pytest.mark.parametrize("compress", [False, True], ids=["raw", "compressed"])
+def test_restore_in_random_order_matches_snapshots(compress):
+    rng = np.random.default_rng(7)
+    history = CanvasHistory(np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8), tile=16,
+                            compress=compress)
+    truth = scribble(history, rng, 60)
+    assert len(history) == len(truth)
+    for index in rng.permutation(np.repeat(np.arange(len(truth)), 2)):
+        np.testing.assert_array_equal(history.restore(index), truth[index])
+
+
+def test_unchanged_record_takes_no_snapshot():
+    history = CanvasHistory(np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8), tile=16)
+    assert not history.record((10, 10, 40, 30), np.full((20, 30, 3), 255, dtype=np.uint8))
+    assert len(history) == 1
+
+
+def test_thinning_keeps_the_snapshots_it_lists():
+    rng = np.random.default_rng(8)
+    history = CanvasHistory(np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8), tile=16)
+    truth = scribble(history, rng, 60)
+    labels = list(history.labels)
+    history.max_bytes = history.nbytes // 3
+    history.record((0, 0, 5, 5), np.zeros((5, 5, 3), dtype=np.uint8), "last")
+    assert history.nbytes <= history.max_bytes
+    assert len(history) < len(truth)
+    for index in rng.permutation(len(history) - 1):
+        label = history.labels[index]
+        np.testing.assert_array_equal(history.restore(index), truth[labels.index(label)])
+
+
+def test_truncate_continues_from_the_snapshot():
+    rng = np.random.default_rng(9)
+    history = CanvasHistory(np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8), tile=16)
+    truth = scribble(history, rng, 20)
+    middle = len(truth) // 2
+    history.truncate(middle)
+    assert len(history) == middle + 1
+
+    patch = np.full((15, 15, 3), 7, dtype=np.uint8)
+    assert history.record((5, 5, 20, 20), patch)
+    expected = truth[middle].copy()
+    expected[5:20, 5:20] = 7
+    np.testing.assert_array_equal(history.restore(middle + 1), expected)
+    np.testing.assert_array_equal(history.restore(middle), truth[middle])
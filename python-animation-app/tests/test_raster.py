@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from backends import benchmark_image
+from engine import STYLES, DrawingEngine
+from raster import draw_segments, stamp_discs
+from strokes import DISC, ELLIPSE, LINE, POLYGON, StrokeBuilder, StrokeList
+
+
+WIDTH, HEIGHT = 160, 120
+
+
+def draw_reference(strokes, width, height, bg_color="white"):
+    """strokes drawn one at a time with plain ImageDraw calls"""
+    image = Image.new("RGB", (width, height), bg_color)
+    draw = ImageDraw.Draw(image)
+    for i in range(len(strokes)):
+        start, count = int(strokes.starts[i]), int(strokes.counts[i])
+        xy = [tuple(point) for point in strokes.points[start:start + count].tolist()]
+        color, size = tuple(strokes.colors[i].tolist()), int(strokes.widths[i])
+        kind = strokes.kinds[i]
+        if kind == LINE:
+            if size <= 1:
+                # A width-1 polyline is its segments drawn one by one
+                for segment in zip(xy[:-1], xy[1:]):
+                    draw.line(segment, fill=color, width=size)
+            else:
+                draw.line(xy, fill=color, width=size)
+        elif kind == POLYGON:
+            draw.polygon(xy, fill=color, outline=None)
+        elif kind == ELLIPSE:
+            draw.ellipse(xy, outline=color, width=size)
+        else:
+            (cx, cy), = xy
+            draw.ellipse([cx - size, cy - size, cx + size, cy + size], fill=color)
+    return np.asarray(image)
+
+
+@pytest.mark.parametrize("style", STYLES)
+def test_render_matches_imagedraw(style):
+    engine = DrawingEngine(WIDTH, HEIGHT, seed=11)
+    engine.render(benchmark_image(WIDTH, HEIGHT, seed=3), style, 0.5)
+    strokes = engine.strokes()
+    assert strokes is not None and len(strokes)
+    np.testing.assert_array_equal(engine.pixels, draw_reference(strokes, WIDTH, HEIGHT))
+
+
+def test_draw_segments_matches_imagedraw():
+    rng = np.random.default_rng(1)
+    count = 500
+    # Short and long segments, some reaching off the canvas
+    x0, x1 = rng.integers(-20, WIDTH + 20, size=(2, count))
+    y0, y1 = rng.integers(-20, HEIGHT + 20, size=(2, count))
+    short = rng.random(count) < 0.5
+    x1[short] = x0[short] + rng.integers(-5, 6, size=short.sum())
+    y1[short] = y0[short] + rng.integers(-5, 6, size=short.sum())
+    colors = rng.integers(0, 256, size=(count, 3), dtype=np.uint8)
+
+    canvas = np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8)
+    draw_segments(canvas, x0, y0, x1, y1, colors)
+    strokes = StrokeList.segments(x0, y0, x1, y1, colors, np.arange(count), count)
+    np.testing.assert_array_equal(canvas, draw_reference(strokes, WIDTH, HEIGHT))
+
+
+def test_stamp_discs_matches_imagedraw():
+    rng = np.random.default_rng(2)
+    count = 400
+    xs = rng.integers(-5, WIDTH + 5, size=count)
+    ys = rng.integers(-5, HEIGHT + 5, size=count)
+    radii = rng.integers(0, 7, size=count)
+    colors = rng.integers(0, 256, size=(count, 3), dtype=np.uint8)
+
+    canvas = np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8)
+    stamp_discs(canvas, xs, ys, radii, colors)
+    strokes = StrokeList.discs(xs, ys, radii, colors, np.arange(count), count)
+    np.testing.assert_array_equal(canvas, draw_reference(strokes, WIDTH, HEIGHT))
+
+
+def test_builder_matches_stroke_list():
+    rng = np.random.default_rng(3)
+    builder = StrokeBuilder()
+    x0, y0, x1, y1 = rng.integers(0, 100, size=(4, 50))
+    colors = rng.integers(0, 256, size=(50, 3), dtype=np.uint8)
+    for i in range(50):
+        builder.add(LINE, [(x0[i], y0[i]), (x1[i], y1[i])], colors[i].tolist(), step=i // 5)
+    built = builder.build(10)
+    expected = StrokeList.segments(x0, y0, x1, y1, colors, np.arange(50) // 5, 10)
+    for name, column in expected.to_arrays().items():
+        np.testing.assert_array_equal(built.to_arrays()[name], column)
+    assert built.span(2, 4) == slice(10, 20)
+
+
+def test_take_and_concatenate_keep_points():
+    builder = StrokeBuilder()
+    builder.add(POLYGON, [(0, 0), (5, 0), (5, 5)], (1, 2, 3), step=0)
+    builder.add(DISC, [(7, 8)], (4, 5, 6), width=3, step=1)
+    builder.add(LINE, [(1, 1), (2, 2), (3, 1), (4, 4)], (7, 8, 9), step=1)
+    strokes = builder.build(2)
+
+    taken = strokes.take(np.array([2, 0]), steps=np.array([0, 1]))
+    assert taken.kinds.tolist() == [LINE, POLYGON]
+    assert taken.points.tolist() == [[1, 1], [2, 2], [3, 1], [4, 4], [0, 0], [5, 0], [5, 5]]
+
+    both = StrokeList.concatenate([strokes, taken])
+    assert both.num_steps == 4
+    assert both.steps.tolist() == [0, 1, 1, 2, 3]
+    last = both.starts[-1]
+    assert both.points[last:last + both.counts[-1]].tolist() == [[0, 0], [5, 0], [5, 5]]
+    round_trip = StrokeList.from_arrays(both.to_arrays())
+    np.testing.assert_array_equal(round_trip.points, both.points)
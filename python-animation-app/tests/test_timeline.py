@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from timeline import Timeline
+
+
+def random_timeline(rng, count):
+    """count clips at random times and layers, some empty and some sharing ends;
+    returns the timeline and (start, end, layer) columns"""
+    timeline = Timeline()
+    starts = rng.integers(0, 200, size=count) / 4
+    lengths = rng.integers(0, 40, size=count) / 4
+    lengths[rng.random(count) < 0.1] = 0
+    layers = rng.integers(0, 4, size=count)
+    for start, length, layer in zip(starts, lengths, layers):
+        timeline.add("image.png", length, start=start, layer=int(layer))
+    return timeline, starts, starts + lengths, layers
+
+
+def drawing_order(ids, layers):
+    """ids sorted by layer, then in the order they were added"""
+    return sorted(ids, key=lambda index: (layers[index], index))
+
+
+@pytest.mark.parametrize("count", [1, 10, 100, 2000])
+def test_active_matches_brute_force(count):
+    rng = np.random.default_rng(count)
+    timeline, starts, ends, layers = random_timeline(rng, count)
+    # Times on clip boundaries, between them and outside every clip
+    times = np.concatenate([starts, ends, rng.uniform(-5, 65, size=200)])
+    for t in times:
+        expected = np.flatnonzero((starts <= t) & (t < ends))
+        assert timeline.active(t).tolist() == drawing_order(expected, layers)
+
+
+@pytest.mark.parametrize("count", [10, 2000])
+def test_overlapping_matches_brute_force(count):
+    rng = np.random.default_rng(count + 1)
+    timeline, starts, ends, layers = random_timeline(rng, count)
+    for _ in range(200):
+        first, last = np.sort(rng.uniform(-5, 65, size=2))
+        expected = np.flatnonzero((starts < last) & (ends > first) & (ends > starts))
+        assert timeline.overlapping(first, last).tolist() == drawing_order(expected, layers)
+
+
+def test_clips_added_after_a_query_are_indexed():
+    timeline = Timeline()
+    first = timeline.add("a.png", 2.0, delay=1.0)
+    assert timeline.active(2.5).tolist() == [first]
+    second = timeline.add("b.png", 1.0)
+    assert timeline.active(2.5).tolist() == [first]
+    assert timeline.active(3.5).tolist() == [second]
+    assert timeline.end == 4.0
+    assert timeline.started(3.0).tolist() == [first, second]